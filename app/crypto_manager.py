@@ -4,14 +4,25 @@ from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.x509 import NameOID, CertificateBuilder, random_serial_number
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
+from cryptography.exceptions import InvalidSignature
+from collections import OrderedDict
 from datetime import datetime, timedelta
+import hashlib
 import os
+import threading
 
 CERTS_DIR = os.path.join(os.path.dirname(__file__), '..', 'storage')
 PRIVATE_KEY_FILE = os.path.join(CERTS_DIR, 'private_key.pem')
 CERT_FILE = os.path.join(CERTS_DIR, 'certificate.pem')
+PEER_KEY_CACHE_SIZE = 128  # Nombre de clés publiques de pairs gardées désérialisées
+KEY_FINGERPRINT_SIZE = 8  # Octets de l'empreinte de clé publique annoncée dans la balise de présence
 
 class CryptoManager:
+    # Cache des clés désérialisées : évite de relire/parser les PEM à chaque message
+    _cache_lock = threading.Lock()
+    _private_key = None
+    _peer_keys = OrderedDict()  # sha256(PEM) -> clé publique, ordre LRU
+
     @staticmethod
     def generate_key_and_cert(common_name: str = "User"):
         # Génère une clé privée RSA et un certificat autosigné
@@ -39,6 +50,7 @@ class CryptoManager:
             ))
         with open(CERT_FILE, 'wb') as f:
             f.write(cert.public_bytes(serialization.Encoding.PEM))
+        CryptoManager.invalidate_key_cache()
         return private_key, cert
 
     @staticmethod
@@ -46,6 +58,51 @@ class CryptoManager:
         with open(PRIVATE_KEY_FILE, 'rb') as f:
             return serialization.load_pem_private_key(f.read(), password=None, backend=default_backend())
 
+    @staticmethod
+    def get_private_key():
+        """Retourne la clé privée, lue depuis le disque une seule fois."""
+        with CryptoManager._cache_lock:
+            if CryptoManager._private_key is None:
+                CryptoManager._private_key = CryptoManager.load_private_key()
+            return CryptoManager._private_key
+
+    @staticmethod
+    def get_peer_public_key(cert_pem: bytes):
+        """Retourne la clé publique d'un certificat PEM, mémorisée par empreinte du PEM (LRU)."""
+        digest = hashlib.sha256(cert_pem).digest()
+        with CryptoManager._cache_lock:
+            public_key = CryptoManager._peer_keys.get(digest)
+            if public_key is not None:
+                CryptoManager._peer_keys.move_to_end(digest)
+                return public_key
+        public_key = x509.load_pem_x509_certificate(cert_pem, default_backend()).public_key()
+        with CryptoManager._cache_lock:
+            CryptoManager._peer_keys[digest] = public_key
+            if len(CryptoManager._peer_keys) > PEER_KEY_CACHE_SIZE:
+                CryptoManager._peer_keys.popitem(last=False)
+        return public_key
+
+    @staticmethod
+    def key_fingerprint(cert_pem: bytes) -> bytes:
+        """Empreinte courte de la clé publique d'un certificat : sha256(clé publique DER)[:8]."""
+        der = CryptoManager.get_peer_public_key(cert_pem).public_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        return hashlib.sha256(der).digest()[:KEY_FINGERPRINT_SIZE]
+
+    @staticmethod
+    def certificate_serial(cert_pem: bytes) -> str:
+        """Numéro de série d'un certificat PEM (en décimal, comme dans la liste de révocation)."""
+        return str(x509.load_pem_x509_certificate(cert_pem, default_backend()).serial_number)
+
+    @staticmethod
+    def invalidate_key_cache():
+        """Vide le cache des clés (après rotation ou régénération du certificat)."""
+        with CryptoManager._cache_lock:
+            CryptoManager._private_key = None
+            CryptoManager._peer_keys.clear()
+
     @staticmethod
     def load_certificate():
         with open(CERT_FILE, 'rb') as f:
@@ -64,8 +121,7 @@ class CryptoManager:
 
     @staticmethod
     def encrypt_with_cert(cert_pem: bytes, data: bytes) -> bytes:
-        cert = x509.load_pem_x509_certificate(cert_pem, default_backend())
-        public_key = cert.public_key()
+        public_key = CryptoManager.get_peer_public_key(cert_pem)
         return public_key.encrypt(
             data,
             padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None)
@@ -73,12 +129,35 @@ class CryptoManager:
 
     @staticmethod
     def decrypt_with_private_key(data: bytes) -> bytes:
-        private_key = CryptoManager.load_private_key()
+        private_key = CryptoManager.get_private_key()
         return private_key.decrypt(
             data,
             padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None)
         )
 
+    @staticmethod
+    def sign(data: bytes) -> bytes:
+        """Signature RSA-PSS (SHA-256) avec la clé privée locale."""
+        return CryptoManager.get_private_key().sign(
+            data,
+            padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH),
+            hashes.SHA256()
+        )
+
+    @staticmethod
+    def verify_with_cert(cert_pem: bytes, signature: bytes, data: bytes) -> bool:
+        """Vérifie une signature produite par `sign` avec la clé du certificat PEM."""
+        try:
+            CryptoManager.get_peer_public_key(cert_pem).verify(
+                signature,
+                data,
+                padding.PSS(mgf=padding.MGF1(hashes.SHA256()), salt_length=padding.PSS.MAX_LENGTH),
+                hashes.SHA256()
+            )
+            return True
+        except InvalidSignature:
+            return False
+
     @staticmethod
     def encrypt_aes(key: bytes, plaintext: bytes) -> tuple:
         from os import urandom
@@ -1,6 +1,7 @@
-import socket
 import threading
-import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional
 from PyQt5.QtCore import QObject, pyqtSignal
 from cryptography.hazmat.primitives import serialization
@@ -10,10 +11,22 @@ from network.discoveryend import NetworkDiscovery
 from network.communication import PeerCommunicator
 from network.group_manager import GroupManager
 from network.message_manager import MessageManager
+from network.connection_pool import ConnectionPool
+from network.coalescer import SendCoalescer
+from database.message_store import MessageStore, PAGE_SIZE, SEARCH_ALL
+from network.async_engine import AsyncNetworkEngine
+from network.worker_pool import BoundedWorkerPool
+from network.local_address import get_local_address_service
+from config.network import TCP_HANDLER_WORKERS, TCP_HANDLER_QUEUE, GROUP_RELAY_THRESHOLD, SEND_COALESCE_WINDOW
 from security.key_manager import KeyManager
+from security.key_store import get_key_store
 from utils.logger import Logger, LogLevel
 from app.crypto_manager import CryptoManager
 
+ENGINE_THREADS = "threads"  # Un thread par tâche réseau et par connexion entrante
+ENGINE_ASYNCIO = "asyncio"  # Une seule boucle d'événements (voir network/async_engine.py)
+SEND_WORKERS = 4  # Threads des envois demandés par l'interface (send_message_async)
+
 class NetworkManager(QObject):
     """
     Module d'intégration qui coordonne tous les modules réseau.
@@ -26,11 +39,17 @@ class NetworkManager(QObject):
     message_received = pyqtSignal(str, str)  # sender_ip, message
     group_message_received = pyqtSignal(str, str, str)  # group_name, sender_ip, message
     connection_status_changed = pyqtSignal(bool)  # connected
+    message_queued = pyqtSignal(str, str, str, str)  # message_id, type ('contact' ou 'group'), ip ou nom du groupe, message
+    message_sent = pyqtSignal(str)  # message_id
+    message_failed = pyqtSignal(str, str)  # message_id, erreur
     log_message = pyqtSignal(str)  # log message
     
-    def __init__(self, username: str = "User"):
+    def __init__(self, username: str = "User", engine: str = ENGINE_THREADS):
         super().__init__()
+        if engine not in (ENGINE_THREADS, ENGINE_ASYNCIO):
+            raise ValueError(f"Moteur réseau inconnu : {engine}")
         self.username = username
+        self.engine = engine
         self.logger = Logger()
         self.logger.add_callback(self._on_log_message)
         
@@ -42,43 +61,96 @@ class NetworkManager(QObject):
         self.is_running = False
         self.known_peers = {}  # ip -> {nom, ip, status}
         
+        # Envois demandés par l'interface, exécutés hors du thread graphique ;
+        # une file par conversation garde l'ordre des messages
+        self.send_executor = ThreadPoolExecutor(max_workers=SEND_WORKERS, thread_name_prefix="ui-send")
+        self._send_queues: Dict[tuple, deque] = {}
+        self._send_queues_lock = threading.Lock()
+        
     def _init_modules(self):
         """Initialise tous les modules réseau"""
         try:
             # Logger
             self.logger.info("Initialisation des modules réseau", "NETWORK_MANAGER")
             
+            # Adresse locale partagée (cache invalidé sur changement d'interface)
+            self.local_address = get_local_address_service()
+            self.local_address.log = self.logger.info
+            
             # Découverte réseau
             self.discovery = NetworkDiscovery(
                 username=self.username,
                 on_peer_discovered=self._on_peer_discovered,
-                on_peer_lost=self._on_peer_lost
+                on_peer_lost=self._on_peer_lost,
+                on_peer_key=self._on_peer_key
             )
             
+            # Clés publiques des pairs, partagées par le gestionnaire de clés et celui des messages
+            self.key_store = get_key_store()
+            self.key_store.log = self.logger.info
+            
             # Gestionnaire de clés
-            self.key_manager = KeyManager()
+            self.key_manager = KeyManager(key_store=self.key_store)
+            
+            # Pool de connexions TCP persistantes partagé par tous les chemins d'envoi,
+            # précédé du regroupement des envois rapprochés vers un même pair
+            self.connection_pool = SendCoalescer(
+                ConnectionPool(log_func=self.logger.info),
+                window=SEND_COALESCE_WINDOW,
+                log_func=self.logger.info
+            )
+            
+            # Historique des messages (SQLite), partagé par les messages directs et de groupe
+            self.message_store = MessageStore()
             
             # Gestionnaire de messages
             self.message_manager = MessageManager(
                 get_local_ip_func=self._get_local_ip,
-                log_func=self.logger.info
+                log_func=self.logger.info,
+                connection_pool=self.connection_pool,
+                message_store=self.message_store,
+                key_store=self.key_store,
+                is_key_revoked_func=self.key_manager.is_key_revoked,
+                is_peer_revoked_func=self.key_manager.is_peer_revoked
             )
             
             # Gestionnaire de groupes
             self.group_manager = GroupManager(
                 get_local_ip_func=self._get_local_ip,
                 key_exchange_func=self.message_manager.echanger_cles_publiques,
-                log_func=self.logger.info
+                log_func=self.logger.info,
+                connection_pool=self.connection_pool,
+                message_store=self.message_store,
+                get_public_key_func=self.message_manager.get_public_key,
+                relay_threshold=GROUP_RELAY_THRESHOLD,
+                key_prefetch_func=self.message_manager.key_prefetcher.prefetch
             )
             
             # Communicateur pour les messages directs et de groupe
             self.communicator = PeerCommunicator(
                 get_local_ip_func=self._get_local_ip,
                 key_exchange_func=self.message_manager.echanger_cles_publiques,
-                on_key_received_func=self.message_manager.add_public_key,
-                log_func=self.logger.info
+                on_key_received_func=self._on_key_received,
+                log_func=self.logger.info,
+                connection_pool=self.connection_pool,
+                worker_pool=BoundedWorkerPool(
+                    max_workers=TCP_HANDLER_WORKERS,
+                    max_queue=TCP_HANDLER_QUEUE,
+                    name="tcp-handler",
+                    log_func=self.logger.info
+                ),
+                is_peer_revoked_func=self.key_manager.is_peer_revoked
             )
             
+            # Moteur asyncio optionnel : héberge la découverte et le serveur TCP
+            self.async_engine = None
+            if self.engine == ENGINE_ASYNCIO:
+                self.async_engine = AsyncNetworkEngine(
+                    discovery=self.discovery,
+                    communicator=self.communicator,
+                    log_func=self.logger.info
+                )
+            
             # Initialisation de la cryptographie
             self._init_crypto()
             
@@ -103,6 +175,8 @@ class NetworkManager(QObject):
             
             # Passer la clé publique au communicateur également
             self.communicator.set_local_public_key(public_key_pem.decode())
+            # Empreinte annoncée dans les balises : les pairs valident leur clé en cache sans échange
+            self.discovery.set_key_fingerprint(CryptoManager.key_fingerprint(public_key_pem))
 
             self.logger.info("Cryptographie initialisée", "NETWORK_MANAGER")
             
@@ -115,15 +189,17 @@ class NetworkManager(QObject):
         # Connecter les signaux du communicateur
         self.communicator.on_message_received = self._on_message_received
         self.communicator.on_group_message_received = self._on_group_message_received
+        self.communicator.on_session_key_received = self._on_session_key_received
+        self.communicator.on_group_key_received = self.group_manager.traiter_cle_groupe
+        self.communicator.on_group_envelope_received = self._on_group_envelope_received
+        self.communicator.on_group_join_received = self._on_group_join_received
+        self.communicator.on_group_relay_received = self._on_group_relay_received
+        # Messages directs mis en attente puis remis au retour du pair
+        self.message_manager.outbox.on_delivered = self._on_outbox_delivered
     
     def _get_local_ip(self) -> str:
-        """Récupère l'IP locale"""
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-                s.connect(("8.8.8.8", 80))
-                return s.getsockname()[0]
-        except Exception:
-            return "127.0.0.1"
+        """Récupère l'IP locale (service partagé, mise en cache)"""
+        return self.local_address.get()
     
     def _on_log_message(self, log_entry: str):
         """Callback pour les messages de log"""
@@ -140,9 +216,23 @@ class NetworkManager(QObject):
         print(f"[DEBUG] NetworkManager: known_peers après ajout: {self.known_peers}")
         self.peer_discovered.emit(ip, nom)
         self.logger.info(f"Pair découvert: {nom} ({ip})", "NETWORK_MANAGER")
+        # Échange de clés anticipé : le premier message vers ce pair partira sans attendre
+        self.message_manager.key_prefetcher.prefetch(ip)
+        # Renvoyer sans attendre les messages mis en attente pendant son absence
+        self.message_manager.outbox.notify_peer_online(ip)
+    
+    def _on_peer_key(self, ip: str, fingerprint: bytes):
+        """Callback pour chaque balise qui annonce l'empreinte de clé du pair"""
+        if self.key_manager.is_peer_revoked(ip, fingerprint):
+            return  # Certificat révoqué, éventuellement annoncé depuis une nouvelle adresse
+        if self.message_manager.invalider_cle_perimee(ip, fingerprint):
+            # Pair déjà connu qui a changé de clé : échange anticipé avant le prochain envoi
+            self.message_manager.key_prefetcher.prefetch(ip)
     
     def _on_peer_lost(self, ip: str):
         """Callback quand un pair est perdu, venant du module de découverte."""
+        self.connection_pool.close_peer(ip)
+        self.message_manager.reset_sessions(ip)
         if ip in self.known_peers:
             self.logger.info(f"Pair perdu: {self.known_peers[ip].get('nom', ip)} ({ip})", "NETWORK_MANAGER")
             del self.known_peers[ip]
@@ -150,7 +240,7 @@ class NetworkManager(QObject):
         else:
             self.logger.warning(f"Tentative de suppression d'un pair inconnu: {ip}", "NETWORK_MANAGER")
     
-    def _on_message_received(self, sender_ip: str, message: str):
+    def _on_message_received(self, sender_ip: str, message: bytes):
         """Callback quand un message direct est reçu du PeerCommunicator."""
         self.logger.info(f"Message brut reçu de {sender_ip}. Tentative de déchiffrement.", "NETWORK_MANAGER")
         
@@ -164,52 +254,75 @@ class NetworkManager(QObject):
         else:
             self.logger.warning(f"Le message de {sender_ip} n'a pas pu être déchiffré ou traité.", "NETWORK_MANAGER")
     
+    def _on_key_received(self, sender_ip: str, key_pem: str):
+        """Callback quand un pair présente sa clé publique (échange de clés) ; refusée si révoquée"""
+        self.message_manager.add_public_key(sender_ip, key_pem)
+    
+    def _on_session_key_received(self, sender_ip: str, data: bytes):
+        """Callback quand un pair annonce une clé de session"""
+        self.message_manager.traiter_cle_session(data, sender_ip)
+    
     def _on_group_message_received(self, group_name: str, sender_ip: str, message: str):
         """Callback quand un message de groupe est reçu"""
+        # Enregistrer le message (et le groupe s'il est inconnu) avant de prévenir l'interface
+        self.group_manager.traiter_message_groupe(f"GROUPMSG:{group_name}:{message}", sender_ip)
         self.group_message_received.emit(group_name, sender_ip, message)
         self.logger.info(f"Message de groupe '{group_name}' de {sender_ip}: {message}", "NETWORK_MANAGER")
     
+    def _on_group_envelope_received(self, sender_ip: str, data: bytes):
+        """Callback quand un message de groupe chiffré est reçu"""
+        result = self.group_manager.traiter_message_groupe_chiffre(data, sender_ip)
+        if result:
+            group_name, message = result
+            self.group_message_received.emit(group_name, sender_ip, message)
+            self.logger.info(f"Message de groupe '{group_name}' de {sender_ip}: {message}", "NETWORK_MANAGER")
+    
+    def _on_group_relay_received(self, sender_ip: str, data: bytes):
+        """Callback quand un message de groupe relayé est reçu (l'expéditeur affiché est l'émetteur d'origine)"""
+        result = self.group_manager.traiter_relais_groupe(data, sender_ip)
+        if result:
+            group_name, origin_ip, message = result
+            self.group_message_received.emit(group_name, origin_ip, message)
+            self.logger.info(f"Message de groupe '{group_name}' de {origin_ip} relayé par {sender_ip}: {message}",
+                             "NETWORK_MANAGER")
+    
+    def _on_group_join_received(self, sender_ip: str, data: str):
+        """Callback quand un pair nous ajoute à un groupe (la clé de groupe suit sur la même connexion)"""
+        self.group_manager.traiter_join_groupe(f"JOINGROUP:{data}", sender_ip)
+    
     def start(self) -> bool:
         """Démarre tous les services réseau"""
         try:
             self.logger.info("Démarrage des services réseau", "NETWORK_MANAGER")
             print("[DEBUG] Démarrage des services réseau...")
             
-            # Démarrer la découverte
-            print("[DEBUG] Démarrage de la découverte réseau...")
-            self.discovery.start()
-            
-            # Démarrer le communicateur
-            print("[DEBUG] Démarrage du communicateur...")
-            self.communicator.start()
-            
-            # Démarrer le thread de nettoyage
-            self._start_cleanup_thread()
-            
             self.is_running = True
+            self.local_address.start_monitoring()
+            self.message_manager.outbox.start()
+            if self.async_engine:
+                # Découverte et serveur TCP dans une seule boucle d'événements
+                print("[DEBUG] Démarrage du moteur réseau asyncio...")
+                self.async_engine.start()
+            else:
+                # Démarrer la découverte (et l'expiration des pairs inactifs)
+                print("[DEBUG] Démarrage de la découverte réseau...")
+                self.discovery.start()
+                
+                # Démarrer le communicateur
+                print("[DEBUG] Démarrage du communicateur...")
+                self.communicator.start()
+            
             self.connection_status_changed.emit(True)
             self.logger.info("Services réseau démarrés", "NETWORK_MANAGER")
             print("[DEBUG] Services réseau démarrés avec succès")
             return True
             
         except Exception as e:
+            self.is_running = False
             self.logger.error(f"Erreur lors du démarrage des services: {e}", "NETWORK_MANAGER")
             print(f"[DEBUG] Erreur lors du démarrage: {e}")
             return False
     
-    def _start_cleanup_thread(self):
-        """Démarre le thread de nettoyage des pairs inactifs"""
-        def cleanup_loop():
-            while self.is_running:
-                try:
-                    time.sleep(10)  # Nettoyer toutes les 10 secondes
-                    if hasattr(self.discovery, 'cleanup_inactive_peers'):
-                        self.discovery.cleanup_inactive_peers()
-                except Exception as e:
-                    print(f"[DEBUG] Erreur nettoyage: {e}")
-        
-        threading.Thread(target=cleanup_loop, daemon=True).start()
-    
     def stop(self):
         """Arrête tous les services réseau"""
         try:
@@ -217,10 +330,22 @@ class NetworkManager(QObject):
             
             # Arrêter la découverte
             self.discovery.stop()
+            self.local_address.stop_monitoring()
+            if self.async_engine:
+                self.async_engine.stop()
             
-            # Arrêter le communicateur
+            # Arrêter le communicateur (ferme aussi les connexions persistantes)
             self.communicator.stop()
             
+            # Annuler les renvois de groupe en attente et écrire le journal des groupes sur disque
+            self.group_manager.close()
+            # Les messages directs non remis restent dans le journal de la file d'attente
+            self.message_manager.outbox.stop()
+            self.message_manager.key_prefetcher.close()
+            # Écrire les clés publiques reçues depuis la dernière sauvegarde
+            self.key_store.flush()
+            self.send_executor.shutdown(wait=False)
+            
             self.is_running = False
             self.connection_status_changed.emit(False)
             self.logger.info("Services réseau arrêtés", "NETWORK_MANAGER")
@@ -238,10 +363,80 @@ class NetworkManager(QObject):
         """Envoie un message direct"""
         return self.message_manager.envoyer_message(target_ip, message)
     
-    def send_group_message(self, group_name: str, message: str) -> bool:
-        """Envoie un message de groupe"""
+    def send_group_message(self, group_name: str, message: str) -> Optional[Dict[str, bool]]:
+        """
+        Envoie un message de groupe.
+        Retourne le résultat de l'envoi par membre, ou None si le groupe n'existe pas.
+        """
         return self.group_manager.envoyer_message_dans_groupe(group_name, message)
     
+    def send_message_async(self, target_ip: str, message: str) -> str:
+        """
+        Envoie un message direct en arrière-plan et retourne son identifiant.
+        L'avancement est signalé par message_queued, puis message_sent (remis au pair,
+        éventuellement plus tard s'il était injoignable) ou message_failed.
+        """
+        message_id = uuid.uuid4().hex
+        self.message_queued.emit(message_id, 'contact', target_ip, message)
+        self._submit_send(('contact', target_ip), self._send_direct_job, message_id, target_ip, message)
+        return message_id
+    
+    def send_group_message_async(self, group_name: str, message: str) -> str:
+        """Envoie un message de groupe en arrière-plan (mêmes signaux que send_message_async)."""
+        message_id = uuid.uuid4().hex
+        self.message_queued.emit(message_id, 'group', group_name, message)
+        self._submit_send(('group', group_name), self._send_group_job, message_id, group_name, message)
+        return message_id
+    
+    def _submit_send(self, key: tuple, job, *args):
+        """Confie un envoi au pool ; les envois d'une même conversation s'exécutent dans l'ordre."""
+        with self._send_queues_lock:
+            queue = self._send_queues.get(key)
+            if queue is not None:
+                queue.append((job, args))
+                return
+            self._send_queues[key] = deque([(job, args)])
+        self.send_executor.submit(self._drain_send_queue, key)
+    
+    def _drain_send_queue(self, key: tuple):
+        while True:
+            with self._send_queues_lock:
+                queue = self._send_queues[key]
+                if not queue:
+                    del self._send_queues[key]
+                    return
+                job, args = queue.popleft()
+            job(*args)
+    
+    def _send_direct_job(self, message_id: str, target_ip: str, message: str):
+        try:
+            if self.message_manager.envoyer_message_suivi(target_ip, message, message_id):
+                self.message_sent.emit(message_id)
+            # Sinon le message est dans la file d'attente : message_sent sera émis à sa remise
+        except Exception as e:
+            self.logger.error(f"Erreur lors de l'envoi du message {message_id}: {e}", "NETWORK_MANAGER")
+            self.message_failed.emit(message_id, str(e))
+    
+    def _send_group_job(self, message_id: str, group_name: str, message: str):
+        def on_remise(remis: bool):
+            if remis:
+                self.message_sent.emit(message_id)
+            else:
+                self.message_failed.emit(message_id, f"Aucun membre du groupe '{group_name}' joignable")
+
+        try:
+            # message_sent dès qu'un membre a reçu le message, éventuellement lors d'une nouvelle
+            # tentative en arrière-plan ; message_failed si tous les envois ont été abandonnés
+            if self.group_manager.envoyer_message_dans_groupe(group_name, message, on_remise) is None:
+                self.message_failed.emit(message_id, f"Groupe '{group_name}' introuvable")
+        except Exception as e:
+            self.logger.error(f"Erreur lors de l'envoi du message {message_id}: {e}", "NETWORK_MANAGER")
+            self.message_failed.emit(message_id, str(e))
+    
+    def _on_outbox_delivered(self, message_ids: List[str]):
+        for message_id in message_ids:
+            self.message_sent.emit(message_id)
+    
     def create_group(self, group_name: str, member_ips: List[str]) -> bool:
         """Crée un nouveau groupe"""
         return self.group_manager.creer_groupe(group_name, member_ips)
@@ -255,10 +450,12 @@ class NetworkManager(QObject):
         S'assure qu'un échange de clés est effectué avec l'IP donnée si ce n'est pas déjà fait.
         S'exécute dans un thread d'arrière-plan pour ne pas bloquer l'interface graphique.
         """
-        if hasattr(self.message_manager, 'has_public_key') and not self.message_manager.has_public_key(ip):
+        if self.message_manager.key_prefetcher.prefetch(ip):
             self.logger.info(f"Lancement de l'échange de clés avec {ip} en arrière-plan.", "NETWORK_MANAGER")
-            thread = threading.Thread(target=self.message_manager.echanger_cles_publiques, args=(ip,), daemon=True)
-            thread.start()
+    
+    def is_peer_ready(self, ip: str) -> bool:
+        """Vrai si la clé publique du pair est connue : un envoi vers lui partira sans échange de clés"""
+        return self.message_manager.key_prefetcher.is_ready(ip)
     
     def get_peer_public_key(self, ip: str) -> Optional[str]:
         """Retourne la clé publique d'un pair spécifique"""
@@ -274,6 +471,21 @@ class NetworkManager(QObject):
         """Retourne les messages d'un groupe"""
         return self.group_manager.get_messages_groupe(group_name)
     
+    def get_conversation_page(self, ip: str, limit: int = PAGE_SIZE, before_id: Optional[int] = None) -> List:
+        """Retourne une page de la conversation avec un pair (ordre chronologique)"""
+        return self.message_manager.get_conversation_page(ip, limit=limit, before_id=before_id)
+    
+    def get_group_page(self, group_name: str, limit: int = PAGE_SIZE, before_id: Optional[int] = None) -> List:
+        """Retourne une page des messages d'un groupe (ordre chronologique)"""
+        return self.group_manager.get_page_groupe(group_name, limit=limit, before_id=before_id)
+    
+    def search_messages(self, query: str, scope: str = SEARCH_ALL, limit: int = PAGE_SIZE, offset: int = 0) -> List:
+        """
+        Recherche plein texte dans l'historique (messages directs et/ou de groupe).
+        Retourne des SearchResult classés par pertinence ; chaque mot est cherché comme préfixe.
+        """
+        return self.message_store.search(query, scope=scope, limit=limit, offset=offset)
+    
     def get_public_keys(self) -> Dict:
         """Retourne toutes les clés publiques"""
         return self.message_manager.get_public_keys()
@@ -307,8 +519,21 @@ class NetworkManager(QObject):
             cert = CryptoManager.load_certificate()
             public_key_pem = cert.public_bytes(encoding=serialization.Encoding.PEM)
             self.message_manager.set_ma_cle_publique(public_key_pem.decode())
+            self.communicator.set_local_public_key(public_key_pem.decode())
+            # Repartir de sessions d'envoi neuves ; les sessions reçues restent valides
+            self.message_manager.reset_sessions()
+            # Les pairs voient la nouvelle empreinte dans la balise et refont l'échange de clés
+            self.discovery.set_key_fingerprint(CryptoManager.key_fingerprint(public_key_pem))
         return success
     
+    def get_network_metrics(self) -> Dict:
+        """Retourne les métriques du traitement des connexions entrantes"""
+        return self.communicator.get_metrics()
+    
+    def revoke_certificate(self, serial_number: str, reason: str) -> bool:
+        """Révoque un certificat : les trames des pairs qui le présentent sont ensuite ignorées"""
+        return self.key_manager.revoke_certificate(serial_number, reason)
+    
     def get_security_logs(self) -> List:
         """Retourne les logs de sécurité"""
         return self.key_manager.get_security_logs() 
\ No newline at end of file
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark du regroupement des envois (network/coalescer.py) :
+messages directs émis à 1, 10 et 1000 messages/s vers un même pair (serveur TCP local),
+par des threads d'envoi concurrents, avec et sans regroupement.
+Mesure le nombre d'écritures sur la socket, le débit atteint et la latence de bout en bout.
+
+Usage : python benchmarks/bench_coalescing.py [durée_en_secondes]   (défaut : 3)
+"""
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from network.coalescer import SendCoalescer, COALESCE_WINDOW
+from network.connection_pool import ConnectionPool
+from network.protocol import FrameDecoder, encode_frame, iter_frames, FRAME_BATCH, FRAME_DIRECT
+
+RATES = (1, 10, 1000)
+SEND_WORKERS = 8  # Comme l'envoi des messages de groupe (network/group_manager.py)
+PAYLOAD = struct.Struct('!dI')  # horodatage d'émission + numéro du message
+PADDING = os.urandom(200)  # Taille d'une enveloppe de message court
+
+
+class Recepteur:
+    """Serveur TCP local qui décode les trames (et les lots) et note l'heure de réception."""
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(16)
+        self.port = self.sock.getsockname()[1]
+        self.latences = []
+        self.lock = threading.Lock()
+        threading.Thread(target=self._accepter, daemon=True).start()
+
+    def _accepter(self):
+        while True:
+            conn, _ = self.sock.accept()
+            threading.Thread(target=self._lire, args=(conn,), daemon=True).start()
+
+    def _lire(self, conn):
+        decoder = FrameDecoder(conn)
+        while True:
+            frame = decoder.read_frame()
+            if frame is None:
+                return
+            frame_type, payload = frame
+            frames = iter_frames(payload) if frame_type == FRAME_BATCH else [frame]
+            now = time.perf_counter()
+            with self.lock:
+                for _, data in frames:
+                    self.latences.append(now - PAYLOAD.unpack_from(data)[0])
+
+    def reset(self):
+        with self.lock:
+            latences, self.latences = self.latences, []
+        return latences
+
+
+class PoolCompteur(ConnectionPool):
+    """ConnectionPool qui compte les écritures."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ecritures = 0
+
+    def send(self, ip, frame, preamble=None, deadline=None):
+        self.ecritures += 1
+        super().send(ip, frame, preamble, deadline)
+
+
+def mesurer(sender, pool, recepteur, rate, duree):
+    count = max(1, int(rate * duree))
+    executor = ThreadPoolExecutor(max_workers=SEND_WORKERS)
+    pool.ecritures = 0
+    recepteur.reset()
+    start = time.perf_counter()
+    for i in range(count):
+        # Émission régulière : le message i part à start + i / rate
+        delay = start + i / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        frame = encode_frame(FRAME_DIRECT, PAYLOAD.pack(time.perf_counter(), i) + PADDING)
+        executor.submit(sender.send, '127.0.0.1', frame)
+    executor.shutdown(wait=True)
+    elapsed = time.perf_counter() - start
+    deadline = time.monotonic() + 5
+    while len(recepteur.latences) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    latences = sorted(recepteur.reset())
+    p99 = latences[min(len(latences) - 1, int(len(latences) * 0.99))] * 1000
+    moyenne = sum(latences) / len(latences) * 1000
+    return count, pool.ecritures, len(latences) / elapsed, moyenne, p99
+
+
+def main():
+    duree = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    recepteur = Recepteur()
+    print(f"Durée par mesure : {duree:.0f} s, {SEND_WORKERS} threads d'envoi, fenêtre de regroupement "
+          f"{COALESCE_WINDOW * 1000:.0f} ms")
+    print(f"{'msg/s':>6} | {'mode':>12} | {'messages':>8} | {'écritures':>9} | {'débit msg/s':>11} | "
+          f"{'lat. moy. ms':>12} | {'lat. p99 ms':>11}")
+    print("-" * 88)
+    for rate in RATES:
+        for label in ("direct", "regroupé"):
+            pool = PoolCompteur(port=recepteur.port)
+            sender = pool if label == "direct" else SendCoalescer(pool)
+            count, ecritures, debit, moyenne, p99 = mesurer(sender, pool, recepteur, rate, duree)
+            pool.close_all()
+            print(f"{rate:>6} | {label:>12} | {count:>8} | {ecritures:>9} | {debit:>11.0f} | "
+                  f"{moyenne:>12.2f} | {p99:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
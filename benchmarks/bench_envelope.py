@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark de l'enveloppe des messages directs chiffrés :
+ancien format JSON + hexadécimal contre enveloppe binaire.
+Mesure la taille sur le réseau et le temps d'encodage/décodage pour 100 o, 10 Ko et 1 Mo.
+
+Usage : python benchmarks/bench_envelope.py
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from network.envelope import pack_envelope, unpack_envelope
+
+SIZES = [("100 o", 100), ("10 Ko", 10 * 1024), ("1 Mo", 1024 * 1024)]
+RSA_BLOCK_SIZE = 256  # Clé AES chiffrée avec RSA-2048
+IV_SIZE = 16
+
+
+def encode_json_hex(encrypted_key, iv, ciphertext):
+    return json.dumps({
+        'type': 'ENCRYPTED_MESSAGE',
+        'encrypted_key': encrypted_key.hex(),
+        'iv': iv.hex(),
+        'ciphertext': ciphertext.hex()
+    }).encode()
+
+
+def decode_json_hex(data):
+    message_data = json.loads(data)
+    return (bytes.fromhex(message_data['encrypted_key']),
+            bytes.fromhex(message_data['iv']),
+            bytes.fromhex(message_data['ciphertext']))
+
+
+def encode_binary(encrypted_key, iv, ciphertext):
+    return pack_envelope(encrypted_key, iv, ciphertext)
+
+
+def decode_binary(data):
+    envelope = unpack_envelope(data)
+    return envelope.encrypted_key, envelope.iv, envelope.ciphertext
+
+
+def mesurer(func, arg_tuple, iterations):
+    """Retourne le temps moyen d'un appel en microsecondes."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(*arg_tuple)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    print(f"{'Taille':>8} | {'Format':>8} | {'Octets':>10} | {'Encodage (µs)':>14} | {'Décodage (µs)':>14}")
+    print("-" * 68)
+    for label, size in SIZES:
+        encrypted_key = os.urandom(RSA_BLOCK_SIZE)
+        iv = os.urandom(IV_SIZE)
+        ciphertext = os.urandom(size)
+        iterations = max(20, 2_000_000 // size)
+
+        for name, encode, decode in (("JSON+hex", encode_json_hex, decode_json_hex),
+                                     ("binaire", encode_binary, decode_binary)):
+            wire = encode(encrypted_key, iv, ciphertext)
+            encode_time = mesurer(encode, (encrypted_key, iv, ciphertext), iterations)
+            decode_time = mesurer(decode, (wire,), iterations)
+            print(f"{label:>8} | {name:>8} | {len(wire):>10} | {encode_time:>14.2f} | {decode_time:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
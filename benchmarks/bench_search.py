@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la recherche dans l'historique des messages :
+parcours complet (LIKE '%mot%') contre index plein texte FTS5 classé par bm25.
+L'historique synthétique est créé dans une base temporaire (storage/ n'est pas modifié).
+
+Usage : python benchmarks/bench_search.py [nombre_de_messages]   (défaut : 1 000 000)
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from database.db import Base
+from database.models import Message
+from database.message_store import MessageStore, SEARCH_ALL
+
+BATCH_SIZE = 50_000
+PEERS = [f"192.168.1.{i}" for i in range(2, 60)]
+GROUPS = [f"groupe-{i}" for i in range(20)]
+WORDS = ("salut ça va bien et toi demain réunion projet rapport envoie fichier merci "
+         "à plus tard ok rendez-vous midi café serveur réseau clé certificat chiffrement "
+         "message groupe soirée weekend vacances bureau appel vidéo document présentation").split()
+RARE_WORDS = ["zéphyr", "quasar", "kayak", "xylophone"]
+QUERIES = [("mot fréquent", "réunion"), ("mot rare", "quasar"), ("préfixe", "certif"),
+           ("deux mots", "projet rapport")]
+
+
+def creer_store():
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}", future=True)
+
+    @event.listens_for(engine, "connect")
+    def pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine, future=True)
+    return MessageStore(session_factory=session_factory), session_factory
+
+
+def phrase(rng):
+    words = rng.choices(WORDS, k=rng.randint(4, 14))
+    if rng.random() < 0.001:
+        words.append(rng.choice(RARE_WORDS))
+    return " ".join(words)
+
+
+def remplir(store, count, rng):
+    """Insère count messages (90 % directs, 10 % de groupe) ; l'index FTS est tenu à jour par les déclencheurs."""
+    start = time.perf_counter()
+    inserted = 0
+    while inserted < count:
+        n = min(BATCH_SIZE, count - inserted)
+        directs, groupes = [], []
+        for _ in range(n):
+            if rng.random() < 0.9:
+                peer = rng.choice(PEERS)
+                directs.append((peer, peer, "192.168.1.1", phrase(rng)))
+            else:
+                groupes.append((rng.choice(GROUPS), rng.choice(PEERS), phrase(rng)))
+        store.import_messages(directs)
+        store.import_group_messages(groupes)
+        inserted += n
+    return time.perf_counter() - start
+
+
+def recherche_like(session_factory, keyword, limit):
+    query = select(Message.id).where(Message.content.ilike(f"%{keyword}%")).order_by(Message.id.desc()).limit(limit)
+    with session_factory() as session:
+        return session.execute(query).all()
+
+
+def mesurer(func, repetitions=3):
+    """Meilleur temps de plusieurs exécutions, en millisecondes."""
+    best = float("inf")
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(42)
+    store, session_factory = creer_store()
+    if not store.full_text:
+        print("SQLite compilé sans FTS5 : benchmark impossible")
+        return
+
+    duree = remplir(store, count, rng)
+    print(f"Messages : {count} (insertion avec index : {duree:.1f} s, {count / duree:,.0f} messages/s)")
+    print("Temps en ms. LIKE : 50 plus récents, sans classement ; FTS : pages 1 et 10 de 50 résultats.")
+    print(f"{'Requête':>14} | {'LIKE':>8} | {'bm25 p.1':>9} | {'bm25 p.10':>10} | {'date p.1':>9} | {'date p.10':>10}")
+    print("-" * 75)
+    for label, query in QUERIES:
+        like = mesurer(lambda: recherche_like(session_factory, query.split()[0], 50), repetitions=1)
+        ranked = [mesurer(lambda: store.search(query, scope=SEARCH_ALL, limit=50, offset=offset))
+                  for offset in (0, 450)]
+        recent = [mesurer(lambda: store.search(query, scope=SEARCH_ALL, limit=50, offset=offset, ranked=False))
+                  for offset in (0, 450)]
+        print(f"{label:>14} | {like:>8.1f} | {ranked[0]:>9.1f} | {ranked[1]:>10.1f} | {recent[0]:>9.1f} | {recent[1]:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
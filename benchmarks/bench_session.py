@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark du chemin cryptographique des messages directs :
+chiffrement hybride RSA + AES à chaque message, contre clé de session AES réutilisée.
+Mesure le nombre de messages chiffrés puis déchiffrés par seconde (émetteur + destinataire).
+
+Usage : python benchmarks/bench_session.py [nombre_de_messages]
+"""
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+from cryptography.hazmat.primitives import serialization
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import app.crypto_manager as crypto_manager
+from app.crypto_manager import CryptoManager
+from network.envelope import pack_envelope, pack_session_envelope, unpack_envelope
+from security.session_keys import SessionKeyCache
+
+PEER_IP = "192.168.1.42"
+
+
+def preparer_cles():
+    """Génère une paire de clés temporaire pour ne pas toucher à storage/."""
+    tmp_dir = tempfile.mkdtemp()
+    crypto_manager.CERTS_DIR = tmp_dir
+    crypto_manager.PRIVATE_KEY_FILE = os.path.join(tmp_dir, 'private_key.pem')
+    crypto_manager.CERT_FILE = os.path.join(tmp_dir, 'certificate.pem')
+    _, cert = CryptoManager.generate_key_and_cert("Benchmark")
+    return cert.public_bytes(serialization.Encoding.PEM)
+
+
+def bench_hybride(cert_pem, message, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        encrypted = CryptoManager.hybrid_encrypt(cert_pem, message)
+        wire = pack_envelope(encrypted['encrypted_key'], encrypted['iv'], encrypted['ciphertext'])
+        envelope = unpack_envelope(wire)
+        CryptoManager.hybrid_decrypt(bytes(envelope.encrypted_key), envelope.iv, envelope.ciphertext)
+    return count / (time.perf_counter() - start)
+
+
+def bench_session(cert_pem, message, count):
+    sender = SessionKeyCache()
+    receiver = SessionKeyCache()
+    start = time.perf_counter()
+    for _ in range(count):
+        session = sender.get_outgoing(PEER_IP, cert_pem)
+        if not session.announced:
+            # Annonce de la clé : seul passage par RSA
+            receiver.store_incoming(PEER_IP, session.session_id,
+                                    CryptoManager.decrypt_with_private_key(session.encrypted_key))
+            session.announced = True
+        iv, ciphertext = CryptoManager.encrypt_aes(session.key, message)
+        envelope = unpack_envelope(pack_session_envelope(session.session_id, iv, ciphertext))
+        key = receiver.get_incoming(PEER_IP, bytes(envelope.session_id))
+        CryptoManager.decrypt_aes(key, envelope.iv, envelope.ciphertext)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    warnings.simplefilter("ignore")  # Avertissement de dépréciation du mode CFB
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    cert_pem = preparer_cles()
+    message = "Salut, on se retrouve à 14h pour la réunion ?".encode()
+
+    avant = bench_hybride(cert_pem, message, count)
+    apres = bench_session(cert_pem, message, count)
+    print(f"Messages : {count}")
+    print(f"RSA à chaque message : {avant:>10.0f} messages/s")
+    print(f"Clé de session       : {apres:>10.0f} messages/s")
+    print(f"Gain                 : x{apres / avant:.1f}")
+
+
+if __name__ == "__main__":
+    main()
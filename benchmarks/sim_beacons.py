@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Simulation de la découverte (network/beacon.py) sur un sous-réseau de N pairs :
+balises toutes les 5 s (ancien fonctionnement) contre intervalle adaptatif.
+Simulation à événements discrets (temps simulé, réseau sans perte ni délai) qui utilise
+le vrai calcul d'intervalle et de délai d'expiration. Mesure :
+  - la charge : balises diffusées par seconde sur le sous-réseau (chacune est lue par tous les pairs)
+  - l'arrivée d'un pair : délai pour qu'il connaisse tous les pairs et que tous le connaissent
+  - le départ : délai de détection d'un pair arrêté brutalement, ou parti en l'annonçant
+  - le coût de lecture d'une balise JSON et d'une balise binaire
+
+Usage : python benchmarks/sim_beacons.py [nombre_de_pairs ...]   (défaut : 10 50 200)
+"""
+import heapq
+import itertools
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from network.beacon import (
+    Beacon, BeaconSchedule, FINGERPRINT_SIZE, LEGACY_PEER_TIMEOUT, REPLY_MAX_DELAY, pack_beacon, peer_timeout, unpack_beacon
+)
+
+WARMUP = 600.0    # Secondes simulées avant les mesures (voisinage stable)
+MEASURE = 300.0   # Fenêtre de mesure de la charge
+SETTLE = 120.0    # Temps laissé aux mesures d'arrivée et de départ
+
+
+class Pair:
+    def __init__(self, ident, schedule):
+        self.ident = ident
+        self.schedule = schedule
+        self.alive = True
+        self.known = {}  # pair -> échéance d'expiration
+
+
+class Simulation:
+    def __init__(self, count, adaptive, seed=1):
+        self.adaptive = adaptive
+        self.rng = random.Random(seed)
+        self.events = []
+        self.sequence = itertools.count()
+        self.now = 0.0
+        self.broadcasts = 0
+        self.learned = {}  # (pair, pair découvert) -> instant
+        self.pairs = []
+        for _ in range(count):
+            # Démarrages étalés sur les 10 premières secondes
+            self.ajouter(self.rng.uniform(0, 10))
+
+    def nouvelle_planification(self):
+        if self.adaptive:
+            return BeaconSchedule(rng=random.Random(self.rng.random()))
+        return BeaconSchedule(min_interval=5, base_interval=5, max_interval=5, jitter=0)
+
+    def ajouter(self, instant):
+        pair = Pair(len(self.pairs), self.nouvelle_planification())
+        self.pairs.append(pair)
+        self.planifier(instant, 'balise', pair)
+        return pair
+
+    def planifier(self, instant, kind, pair, *args):
+        heapq.heappush(self.events, (instant, next(self.sequence), kind, pair, args))
+
+    def executer(self, until):
+        while self.events and self.events[0][0] <= until:
+            self.now, _, kind, pair, args = heapq.heappop(self.events)
+            if not pair.alive:
+                continue
+            if kind == 'balise':
+                interval = pair.schedule.next_interval(len(pair.known))
+                beacon = Beacon("", pair.schedule.announced(interval) if self.adaptive else None)
+                self.broadcasts += 1
+                for other in self.pairs:
+                    if other is not pair and other.alive:
+                        self.recevoir(other, pair, beacon)
+                self.planifier(self.now + pair.schedule.delay(interval), 'balise', pair)
+            elif kind == 'reponse':
+                target = args[0]
+                if target.alive:
+                    interval = pair.schedule.interval or pair.schedule.min_interval
+                    self.recevoir(target, pair, Beacon("", pair.schedule.announced(interval), 1))
+        self.now = until
+
+    def recevoir(self, pair, sender, beacon):
+        # Expiration paresseuse : un pair dont l'échéance est passée est considéré comme perdu
+        deadline = pair.known.get(sender)
+        nouveau = deadline is None or deadline < self.now
+        pair.known[sender] = self.now + peer_timeout(beacon)
+        if nouveau:
+            self.learned.setdefault((pair, sender), self.now)
+            if self.adaptive and not beacon.flags:
+                self.planifier(self.now + self.rng.uniform(0, REPLY_MAX_DELAY), 'reponse', pair, sender)
+
+    def nettoyer(self):
+        for pair in self.pairs:
+            pair.known = {other: d for other, d in pair.known.items() if d >= self.now}
+
+
+def mesurer(count, adaptive):
+    sim = Simulation(count, adaptive)
+    sim.executer(WARMUP)
+    sim.nettoyer()
+    sim.broadcasts = 0
+    sim.executer(WARMUP + MEASURE)
+    charge = sim.broadcasts / MEASURE
+
+    # Arrivée d'un pair
+    arrivee = sim.now
+    nouveau = sim.ajouter(arrivee)
+    existants = [p for p in sim.pairs if p is not nouveau]
+    sim.executer(arrivee + SETTLE)
+    connu_par_tous = max(sim.learned.get((p, nouveau), float('inf')) for p in existants) - arrivee
+    connait_tous = max(sim.learned.get((nouveau, p), float('inf')) for p in existants) - arrivee
+
+    # Arrêt brutal : les autres pairs le retirent à l'échéance de sa dernière balise
+    panne = sim.now
+    victime = existants[0]
+    victime.alive = False
+    sim.executer(panne + SETTLE)
+    detections = [p.known[victime] - panne for p in sim.pairs if p.alive and victime in p.known]
+    return charge, connu_par_tous, connait_tous, max(detections), sum(detections) / len(detections)
+
+
+def cout_lecture():
+    """Temps moyen de lecture d'une balise, en microsecondes."""
+    balise_json = json.dumps({"type": "DISCOVER_PEER", "username": "Utilisateur"}).encode()
+    balise_binaire = pack_beacon("Utilisateur", 6.0, fingerprint=bytes(FINGERPRINT_SIZE))
+    resultats = []
+    for data in (balise_json, balise_binaire):
+        start = time.perf_counter()
+        for _ in range(100_000):
+            unpack_beacon(data)
+        resultats.append((time.perf_counter() - start) / 100_000 * 1e6)
+    return resultats, len(balise_json), len(balise_binaire)
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [10, 50, 200]
+    (lecture_json, lecture_binaire), taille_json, taille_binaire = cout_lecture()
+    print(f"Lecture d'une balise : JSON {lecture_json:.2f} µs ({taille_json} octets), "
+          f"binaire {lecture_binaire:.2f} µs ({taille_binaire} octets)")
+    print("Départ annoncé (balise de départ) : retiré immédiatement en mode adaptatif, "
+          f"{LEGACY_PEER_TIMEOUT:.0f} s au plus avec l'ancienne balise")
+    print(f"{'pairs':>5} | {'mode':>10} | {'balises/s':>9} | {'lecture ms/s':>12} | {'connu par tous':>14} | "
+          f"{'connaît tous':>12} | {'panne max':>9} | {'panne moy.':>10}")
+    print("-" * 103)
+    for count in counts:
+        for adaptive in (False, True):
+            charge, connu, connait, panne_max, panne_moy = mesurer(count, adaptive)
+            lecture = charge * (lecture_binaire if adaptive else lecture_json) / 1000
+            print(f"{count:>5} | {'adaptatif' if adaptive else 'fixe 5 s':>10} | {charge:>9.1f} | "
+                  f"{lecture:>12.3f} | {connu:>12.1f} s | {connait:>10.1f} s | {panne_max:>7.1f} s | "
+                  f"{panne_moy:>8.1f} s")
+
+
+if __name__ == "__main__":
+    main()
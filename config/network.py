@@ -0,0 +1,18 @@
+# Moteur réseau utilisé par NetworkManager :
+#   "threads" : un thread par tâche réseau et par connexion entrante
+#   "asyncio" : une seule boucle d'événements pour la découverte, le serveur TCP et les minuteries
+NETWORK_ENGINE = "threads"
+
+# Traitement des connexions TCP entrantes (moteur "threads") :
+# nombre de threads et nombre de connexions acceptées en attente avant refus
+TCP_HANDLER_WORKERS = 16
+TCP_HANDLER_QUEUE = 64
+
+# Diffusion des messages de groupe : à partir de ce nombre de destinataires, l'émetteur n'envoie
+# qu'à ~log2(N) membres qui relaient le message au reste du groupe (None : toujours en direct)
+GROUP_RELAY_THRESHOLD = 16
+
+# Regroupement des envois vers un même pair : les messages émis pendant qu'un envoi est en cours,
+# ou moins de SEND_COALESCE_WINDOW secondes après le précédent, partent ensemble dans une trame
+# FRAME_BATCH (0 : seuls les messages arrivés pendant un envoi en cours sont regroupés)
+SEND_COALESCE_WINDOW = 0.005
@@ -0,0 +1,278 @@
+import re
+import time
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.exc import OperationalError
+from database.db import SessionLocal, init_db
+from database.models import Message, GroupMessage
+
+PAGE_SIZE = 50  # Messages chargés à l'ouverture d'une conversation
+
+SEARCH_DIRECT = "direct"
+SEARCH_GROUP = "group"
+SEARCH_ALL = "all"
+
+# Index plein texte FTS5 « à contenu externe » : le texte n'est stocké qu'une fois (tables messages
+# et group_messages) et les déclencheurs tiennent l'index à jour à chaque insertion ou suppression.
+# unicode61 + remove_diacritics : « ete » trouve « été » ; prefix : index des préfixes de 2 et 3 lettres.
+_FTS_TABLES = (("messages", "messages_fts"), ("group_messages", "group_messages_fts"))
+_FTS_DDL = (
+    "CREATE VIRTUAL TABLE {fts} USING fts5(content, content='{table}', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+    "INSERT INTO {fts}(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+    "INSERT INTO {fts}({fts}, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN "
+    "INSERT INTO {fts}({fts}, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO {fts}(rowid, content) VALUES (new.id, new.content); END",
+)
+# Le tri et la limite sont appliqués dans l'index avant la jointure : seules les `window` meilleures
+# lignes de chaque table sont lues dans les tables de messages. Le tri par pertinence calcule bm25
+# pour chaque correspondance ; le tri par date (rowid décroissant) s'arrête après `window` lignes.
+_SEARCH_SQL = {
+    SEARCH_DIRECT: "SELECT 'direct' AS kind, m.id, m.conversation, m.sender, m.content, m.timestamp, f.rank "
+                   "FROM (SELECT rowid, rank FROM messages_fts WHERE messages_fts MATCH :query "
+                   "ORDER BY {order} LIMIT :window) AS f JOIN messages m ON m.id = f.rowid",
+    SEARCH_GROUP: "SELECT 'group' AS kind, g.id, g.group_name, g.sender, g.content, g.timestamp, f.rank "
+                  "FROM (SELECT rowid, rank FROM group_messages_fts WHERE group_messages_fts MATCH :query "
+                  "ORDER BY {order} LIMIT :window) AS f JOIN group_messages g ON g.id = f.rowid",
+}
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+class StoredMessage(NamedTuple):
+    id: int
+    sender: str
+    recipient: str
+    content: str
+    timestamp: float
+
+
+class StoredGroupMessage(NamedTuple):
+    id: int
+    group_name: str
+    sender: str
+    content: str
+    timestamp: float
+
+
+class SearchResult(NamedTuple):
+    kind: str  # SEARCH_DIRECT ou SEARCH_GROUP
+    id: int
+    conversation: str  # IP du pair ou nom du groupe
+    sender: str
+    content: str
+    timestamp: float
+    rank: float  # Score bm25 : plus petit = plus pertinent
+
+
+def build_fts_query(text_query: str) -> str:
+    """
+    Convertit une saisie libre en requête FTS5 : chaque mot est recherché comme préfixe
+    et tous les mots doivent être présents. Les guillemets neutralisent la syntaxe FTS5.
+    """
+    return " ".join(f'"{token}"*' for token in _TOKEN.findall(text_query))
+
+
+class MessageStore:
+    """
+    Historique des messages directs et de groupe dans SQLite (storage/app.db).
+    Les pages sont parcourues du plus récent au plus ancien par identifiant (`before_id`),
+    grâce aux index (conversation, id) et (group_name, id) : ouvrir une conversation
+    ne lit que la page demandée, quelle que soit la taille de l'historique.
+    Les pages sont retournées dans l'ordre chronologique.
+    """
+
+    def __init__(self, session_factory=None):
+        self.session_factory = session_factory if session_factory else SessionLocal
+        if session_factory is None:
+            init_db()
+        self.full_text = self._init_full_text()
+
+    def _init_full_text(self) -> bool:
+        """Crée les index FTS5 s'ils n'existent pas. Retourne False si SQLite est compilé sans FTS5."""
+        try:
+            with self.session_factory() as session:
+                for table, fts in _FTS_TABLES:
+                    exists = session.execute(
+                        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': fts}
+                    ).first()
+                    for ddl in _FTS_DDL:
+                        if exists and ddl.startswith("CREATE VIRTUAL TABLE"):
+                            continue
+                        session.execute(text(ddl.format(table=table, fts=fts)))
+                    if not exists:
+                        # Indexer les messages déjà présents
+                        session.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+                session.commit()
+            return True
+        except OperationalError as e:
+            print(f"[AVERTISSEMENT] Recherche plein texte indisponible (FTS5) : {e}")
+            return False
+
+    # === MESSAGES DIRECTS ===
+
+    def add_message(self, conversation: str, sender: str, recipient: str, content: str,
+                    timestamp: Optional[float] = None) -> int:
+        """Enregistre un message direct et retourne son identifiant"""
+        with self.session_factory() as session:
+            message = Message(conversation=conversation, sender=sender, recipient=recipient,
+                              content=content, timestamp=timestamp if timestamp else time.time())
+            session.add(message)
+            session.commit()
+            return message.id
+
+    def import_messages(self, rows: Iterable[Tuple[str, str, str, str]]) -> int:
+        """Insère en une transaction des messages (conversation, expéditeur, destinataire, contenu)"""
+        now = time.time()
+        values = [
+            {'conversation': conversation, 'sender': sender, 'recipient': recipient,
+             'content': content, 'timestamp': now}
+            for conversation, sender, recipient, content in rows
+        ]
+        if values:
+            with self.session_factory() as session:
+                session.execute(Message.__table__.insert(), values)
+                session.commit()
+        return len(values)
+
+    def get_conversation_page(self, conversation: str, limit: Optional[int] = PAGE_SIZE,
+                              before_id: Optional[int] = None) -> List[StoredMessage]:
+        """Retourne au plus `limit` messages d'une conversation antérieurs à `before_id` (None : sans limite)"""
+        query = select(Message.id, Message.sender, Message.recipient, Message.content, Message.timestamp) \
+            .where(Message.conversation == conversation)
+        if before_id is not None:
+            query = query.where(Message.id < before_id)
+        query = query.order_by(Message.id.desc())
+        if limit is not None:
+            query = query.limit(limit)
+        with self.session_factory() as session:
+            rows = session.execute(query).all()
+        return [StoredMessage(*row) for row in reversed(rows)]
+
+    def get_all_messages(self) -> List[StoredMessage]:
+        """Retourne tout l'historique des messages directs (à éviter pour l'affichage)"""
+        query = select(Message.id, Message.sender, Message.recipient, Message.content, Message.timestamp) \
+            .order_by(Message.id)
+        with self.session_factory() as session:
+            return [StoredMessage(*row) for row in session.execute(query).all()]
+
+    def get_recent_messages(self, limit: int) -> List[StoredMessage]:
+        """Retourne les `limit` derniers messages directs, toutes conversations confondues"""
+        query = select(Message.id, Message.sender, Message.recipient, Message.content, Message.timestamp) \
+            .order_by(Message.id.desc()).limit(limit)
+        with self.session_factory() as session:
+            rows = session.execute(query).all()
+        return [StoredMessage(*row) for row in reversed(rows)]
+
+    def count_messages(self, conversation: Optional[str] = None) -> int:
+        """Nombre de messages directs, dans une conversation ou au total"""
+        query = select(func.count(Message.id))
+        if conversation is not None:
+            query = query.where(Message.conversation == conversation)
+        with self.session_factory() as session:
+            return session.execute(query).scalar_one()
+
+    def search(self, text_query: str, scope: str = SEARCH_ALL, limit: int = PAGE_SIZE,
+               offset: int = 0, ranked: bool = True) -> List[SearchResult]:
+        """
+        Recherche plein texte dans les messages directs et/ou de groupe, classée par pertinence (bm25)
+        ou, si `ranked` est False, du plus récent au plus ancien.
+        Chaque mot de la requête est un préfixe (« bonj » trouve « bonjour ») ; tous doivent être présents.
+        """
+        fts_query = build_fts_query(text_query)
+        if not fts_query:
+            return []
+        if not self.full_text:
+            return self._search_without_index(text_query, scope, limit, offset)
+        order = "rank" if ranked else "rowid DESC"
+        parts = [_SEARCH_SQL[kind].format(order=order)
+                 for kind in (SEARCH_DIRECT, SEARCH_GROUP) if scope in (kind, SEARCH_ALL)]
+        sql = " UNION ALL ".join(parts) + (" ORDER BY rank, timestamp DESC" if ranked else " ORDER BY timestamp DESC")
+        sql += " LIMIT :limit OFFSET :offset"
+        params = {'query': fts_query, 'window': offset + limit, 'limit': limit, 'offset': offset}
+        with self.session_factory() as session:
+            rows = session.execute(text(sql), params).all()
+        return [SearchResult(*row) for row in rows]
+
+    def _search_without_index(self, text_query: str, scope: str, limit: int, offset: int) -> List[SearchResult]:
+        """Repli sans FTS5 : sous-chaîne sur le texte brut, du plus récent au plus ancien"""
+        results = []
+        with self.session_factory() as session:
+            if scope in (SEARCH_DIRECT, SEARCH_ALL):
+                query = select(Message.id, Message.conversation, Message.sender, Message.content, Message.timestamp) \
+                    .where(Message.content.ilike(f"%{text_query}%"))
+                results += [SearchResult(SEARCH_DIRECT, *row, 0.0) for row in session.execute(query).all()]
+            if scope in (SEARCH_GROUP, SEARCH_ALL):
+                query = select(GroupMessage.id, GroupMessage.group_name, GroupMessage.sender,
+                               GroupMessage.content, GroupMessage.timestamp) \
+                    .where(GroupMessage.content.ilike(f"%{text_query}%"))
+                results += [SearchResult(SEARCH_GROUP, *row, 0.0) for row in session.execute(query).all()]
+        results.sort(key=lambda result: result.timestamp, reverse=True)
+        return results[offset:offset + limit]
+
+    def clear_messages(self, conversation: Optional[str] = None) -> int:
+        """Efface les messages d'une conversation, ou tous les messages directs"""
+        query = delete(Message)
+        if conversation is not None:
+            query = query.where(Message.conversation == conversation)
+        with self.session_factory() as session:
+            deleted = session.execute(query).rowcount
+            session.commit()
+            return deleted
+
+    # === MESSAGES DE GROUPE ===
+
+    def add_group_message(self, group_name: str, sender: str, content: str,
+                          timestamp: Optional[float] = None) -> int:
+        """Enregistre un message de groupe et retourne son identifiant"""
+        with self.session_factory() as session:
+            message = GroupMessage(group_name=group_name, sender=sender, content=content,
+                                   timestamp=timestamp if timestamp else time.time())
+            session.add(message)
+            session.commit()
+            return message.id
+
+    def import_group_messages(self, rows: Iterable[Tuple[str, str, str]]) -> int:
+        """Insère en une transaction des messages de groupe (groupe, expéditeur, contenu)"""
+        now = time.time()
+        values = [
+            {'group_name': group_name, 'sender': sender, 'content': content, 'timestamp': now}
+            for group_name, sender, content in rows
+        ]
+        if values:
+            with self.session_factory() as session:
+                session.execute(GroupMessage.__table__.insert(), values)
+                session.commit()
+        return len(values)
+
+    def get_group_page(self, group_name: str, limit: Optional[int] = PAGE_SIZE,
+                       before_id: Optional[int] = None) -> List[StoredGroupMessage]:
+        """Retourne au plus `limit` messages d'un groupe antérieurs à `before_id` (None : sans limite)"""
+        query = select(GroupMessage.id, GroupMessage.group_name, GroupMessage.sender,
+                       GroupMessage.content, GroupMessage.timestamp) \
+            .where(GroupMessage.group_name == group_name)
+        if before_id is not None:
+            query = query.where(GroupMessage.id < before_id)
+        query = query.order_by(GroupMessage.id.desc())
+        if limit is not None:
+            query = query.limit(limit)
+        with self.session_factory() as session:
+            rows = session.execute(query).all()
+        return [StoredGroupMessage(*row) for row in reversed(rows)]
+
+    def count_group_messages(self, group_name: str) -> int:
+        query = select(func.count(GroupMessage.id)).where(GroupMessage.group_name == group_name)
+        with self.session_factory() as session:
+            return session.execute(query).scalar_one()
+
+    def clear_group_messages(self, group_name: Optional[str] = None) -> int:
+        """Efface les messages d'un groupe, ou de tous les groupes"""
+        query = delete(GroupMessage)
+        if group_name is not None:
+            query = query.where(GroupMessage.group_name == group_name)
+        with self.session_factory() as session:
+            deleted = session.execute(query).rowcount
+            session.commit()
+            return deleted
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, func
+import time
+from sqlalchemy import Column, Integer, String, DateTime, Float, Text, Index, func
 from database.db import Base
 
 class User(Base):
@@ -8,3 +9,28 @@ class User(Base):
     username = Column(String(50), unique=True, nullable=False)
     password = Column(String(128), nullable=False)
     created_at = Column(DateTime, server_default=func.now())
+
+class Message(Base):
+    """Message direct. `conversation` est l'IP du pair, que le message soit envoyé ou reçu."""
+    __tablename__ = "messages"
+
+    id = Column(Integer, primary_key=True)
+    conversation = Column(String(64), nullable=False)
+    sender = Column(String(64), nullable=False, index=True)
+    recipient = Column(String(64), nullable=False)
+    content = Column(Text, nullable=False)
+    timestamp = Column(Float, nullable=False, default=time.time, index=True)
+
+    # Pagination d'une conversation : WHERE conversation = ? AND id < ? ORDER BY id DESC
+    __table_args__ = (Index("ix_messages_conversation_id", "conversation", "id"),)
+
+class GroupMessage(Base):
+    __tablename__ = "group_messages"
+
+    id = Column(Integer, primary_key=True)
+    group_name = Column(String(128), nullable=False)
+    sender = Column(String(64), nullable=False, index=True)
+    content = Column(Text, nullable=False)
+    timestamp = Column(Float, nullable=False, default=time.time, index=True)
+
+    __table_args__ = (Index("ix_group_messages_group_id", "group_name", "id"),)
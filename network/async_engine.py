@@ -0,0 +1,216 @@
+import asyncio
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from network.connection_pool import IDLE_TIMEOUT, TCP_PORT
+from network.discoveryend import BROADCAST_PORT
+from network.protocol import (
+    FRAME_HEADER, MAX_FRAME_SIZE, PROTOCOL_VERSION, ProtocolError,
+    encode_frame, encode_legacy, is_framed, parse_legacy
+)
+
+HANDLER_WORKERS = 4  # Threads pour les traitements bloquants (RSA, échanges de clés, callbacks)
+SERVER_IDLE_TIMEOUT = IDLE_TIMEOUT * 2  # Laisse à l'émetteur le soin de fermer en premier
+STOP_TIMEOUT = 5.0
+
+
+class _DiscoveryProtocol(asyncio.DatagramProtocol):
+    """Point d'écoute UDP de la découverte : délègue chaque balise à NetworkDiscovery."""
+
+    def __init__(self, engine: "AsyncNetworkEngine"):
+        self.engine = engine
+
+    def datagram_received(self, data, addr):
+        try:
+            self.engine.discovery.handle_beacon(data, addr[0], self.engine.discovery.get_local_ip())
+        except Exception as e:
+            self.engine.log(f"[ERREUR][DISCOVERY] Balise invalide reçue de {addr[0]}: {e}")
+
+    def error_received(self, exc):
+        self.engine.log(f"[ERREUR][DISCOVERY] Erreur lors de l'écoute: {exc}")
+
+
+class AsyncNetworkEngine:
+    """
+    Moteur réseau asyncio : un seul thread fait tourner la boucle d'événements qui héberge
+    la découverte UDP (écoute et diffusion), le serveur TCP par trames et les minuteries.
+    Le traitement des trames (déchiffrement, échanges de clés, callbacks vers l'interface)
+    est confié à un petit pool de threads pour ne jamais bloquer la boucle.
+    Remplace les threads d'écoute et de diffusion de NetworkDiscovery et le thread par
+    connexion de PeerCommunicator ; l'expiration des pairs reste confiée au thread de la
+    table des pairs (network/peer_table.py).
+    """
+
+    def __init__(self, discovery, communicator, log_func=None, port: int = TCP_PORT,
+                 handler_workers: int = HANDLER_WORKERS):
+        self.discovery = discovery
+        self.communicator = communicator
+        self.log = log_func if log_func else lambda msg: None
+        self.port = port
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._executor = ThreadPoolExecutor(max_workers=handler_workers, thread_name_prefix="net-handler")
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._startup_error: Optional[BaseException] = None
+        self._server = None
+        self._udp_transport = None
+        self._timers = {}  # nom -> prochaine échéance (asyncio.TimerHandle)
+
+    # === CYCLE DE VIE ===
+
+    def start(self) -> None:
+        """Démarre la boucle d'événements dans son thread et attend que les sockets soient ouvertes."""
+        self._thread = threading.Thread(target=self._run, name="net-loop", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._startup_error:
+            raise self._startup_error
+
+    def stop(self) -> None:
+        """Ferme les sockets, arrête la boucle et attend la fin des traitements en cours."""
+        if self.loop and self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(STOP_TIMEOUT)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self._thread:
+            self._thread.join(STOP_TIMEOUT)
+        self._executor.shutdown(wait=False)
+
+    def call_later(self, delay: float, callback, *args) -> None:
+        """Planifie un appel dans la boucle depuis n'importe quel thread."""
+        self.loop.call_soon_threadsafe(self.loop.call_later, delay, callback, *args)
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._startup())
+        except BaseException as e:
+            self._startup_error = e
+            self._ready.set()
+            self.loop.close()
+            return
+        self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    async def _startup(self):
+        # Serveur TCP
+        self._server = await asyncio.start_server(self._handle_connection, host='', port=self.port,
+                                                  reuse_address=True)
+        # Découverte UDP : la même socket écoute et diffuse
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        sock.bind(('', BROADCAST_PORT))
+        self._udp_transport, _ = await self.loop.create_datagram_endpoint(
+            lambda: _DiscoveryProtocol(self), sock=sock)
+        # Les réponses directes et l'annonce de départ de la découverte passent par la boucle
+        self.discovery.send_datagram = lambda data, addr: self.loop.call_soon_threadsafe(
+            self._udp_transport.sendto, data, addr)
+        self.discovery.call_later = self.call_later
+        self.discovery.wake_broadcast = lambda: self.loop.call_soon_threadsafe(self._restart_broadcast)
+        # Balises de présence ; l'expiration des pairs a son propre thread, réveillé à chaque échéance
+        self._broadcast()
+        self.discovery.start_expiry()
+        self.log(f"[INFO] Moteur asyncio démarré (TCP {self.port}, UDP {BROADCAST_PORT})")
+
+    async def _shutdown(self):
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        if self._udp_transport:
+            self._udp_transport.close()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.log("[INFO] Moteur asyncio arrêté")
+
+    # === MINUTERIES ===
+
+    def _broadcast(self):
+        """Diffuse la balise de présence puis planifie la suivante (intervalle adaptatif)."""
+        try:
+            beacon, delay = self.discovery.next_beacon()
+            self._udp_transport.sendto(beacon, ('<broadcast>', BROADCAST_PORT))
+        except Exception as e:
+            self.log(f"[ERREUR][DISCOVERY] Erreur lors du broadcast: {e}")
+            delay = self.discovery.schedule.base_interval
+        self._timers['_broadcast'] = self.loop.call_later(delay, self._broadcast)
+
+    def _restart_broadcast(self):
+        """Balise immédiate au lieu d'attendre la prochaine échéance (changement d'adresse locale)."""
+        timer = self._timers.pop('_broadcast', None)
+        if timer:
+            timer.cancel()
+        self._broadcast()
+
+    # === SERVEUR TCP ===
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        addr = writer.get_extra_info('peername')
+        self.log(f"[DEBUG] ASYNC_ENGINE: Connexion reçue de {addr[0]}")
+        try:
+            first_byte = await reader.read(1)
+            if not first_byte:
+                return
+            if is_framed(first_byte):
+                await self._serve_frames(reader, writer, addr)
+            else:
+                await self._serve_legacy(first_byte, reader, writer, addr)
+        except ProtocolError as e:
+            self.log(f"[ERREUR] Trame invalide reçue de {addr[0]}: {e}")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # Le pair a fermé la connexion au milieu d'une trame
+        except asyncio.CancelledError:
+            pass  # Arrêt du moteur
+        except Exception as e:
+            self.log(f"[ERREUR] Erreur lors du traitement de la connexion de {addr}: {e}")
+        finally:
+            writer.close()
+
+    async def _serve_frames(self, reader, writer, addr):
+        """Connexion persistante : trames successives jusqu'à fermeture ou inactivité."""
+        reply = self._make_reply(writer, encode_frame)
+        header_rest = FRAME_HEADER.size - 1  # La version a déjà été lue
+        version = PROTOCOL_VERSION
+        while True:
+            header = await reader.readexactly(header_rest)
+            _, frame_type, length = FRAME_HEADER.unpack(bytes((version,)) + header)
+            if length > MAX_FRAME_SIZE:
+                raise ProtocolError(f"Trame trop grande ({length} octets)")
+            payload = await reader.readexactly(length)
+            # Traitement séquentiel par connexion pour conserver l'ordre des messages
+            await self.loop.run_in_executor(self._executor, self.communicator.handle_frame,
+                                            frame_type, payload, addr, reply)
+            await writer.drain()
+            try:
+                next_byte = await asyncio.wait_for(reader.read(1), SERVER_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                self.log(f"[DEBUG] ASYNC_ENGINE: Connexion inactive fermée avec {addr[0]}")
+                return
+            if not next_byte:
+                return
+            version = next_byte[0]
+            if version != PROTOCOL_VERSION:
+                raise ProtocolError(f"Version de protocole non supportée : {version}")
+
+    async def _serve_legacy(self, first_byte, reader, writer, addr):
+        """Ancien protocole texte : un seul message, terminé par la fermeture de la connexion."""
+        data = first_byte + await reader.read()
+        frame_type, payload = parse_legacy(data)
+        await self.loop.run_in_executor(self._executor, self.communicator.handle_frame,
+                                        frame_type, payload, addr, self._make_reply(writer, encode_legacy))
+        await writer.drain()
+
+    def _make_reply(self, writer, encode):
+        """Réponse utilisable depuis un thread du pool : l'écriture est faite par la boucle."""
+        def reply(frame_type, payload):
+            self.loop.call_soon_threadsafe(writer.write, encode(frame_type, payload))
+        return reply
@@ -0,0 +1,120 @@
+import json
+import math
+import random
+import struct
+from typing import NamedTuple, Optional
+
+# Balise de présence binaire :
+#   marqueur (4) + drapeaux (1) + intervalle avant la prochaine balise (2, dixièmes de seconde)
+#   + empreinte de la clé publique (8, si FLAG_FINGERPRINT) + nom d'utilisateur (UTF-8, reste du datagramme)
+# L'ancienne balise JSON {"type": "DISCOVER_PEER", "username": ...} reste acceptée en réception.
+BEACON_MAGIC = b'MYKB'
+BEACON_HEADER = struct.Struct('!4sBH')
+FINGERPRINT_SIZE = 8
+MAX_USERNAME_BYTES = 200
+
+FLAG_REPLY = 0x01  # Réponse directe à un nouveau pair : ne pas y répondre
+FLAG_BYE = 0x02    # Départ annoncé : le pair peut être retiré immédiatement
+FLAG_FINGERPRINT = 0x04  # L'empreinte de la clé publique suit l'en-tête
+
+BEACON_MIN_INTERVAL = 1.0    # Intervalle au démarrage (secondes), doublé à chaque balise
+BEACON_BASE_INTERVAL = 5.0   # Intervalle minimal une fois le voisinage stable
+BEACON_MAX_INTERVAL = 30.0
+BEACON_TARGET_RATE = 10.0    # Balises par seconde visées pour l'ensemble du sous-réseau
+BEACON_JITTER = 0.2          # Variation aléatoire de l'intervalle (±20 %) contre la synchronisation
+REPLY_MAX_DELAY = 0.5        # Délai aléatoire avant de répondre à un nouveau pair
+MISSED_BEACONS = 3           # Balises manquées avant de considérer un pair comme perdu
+TIMEOUT_MARGIN = 2.0
+LEGACY_PEER_TIMEOUT = 30.0   # Pairs qui envoient l'ancienne balise JSON (toutes les 5 s)
+
+
+class BeaconError(ValueError):
+    """Balise de présence invalide."""
+
+
+class Beacon(NamedTuple):
+    username: str
+    interval: Optional[float]  # None pour une balise JSON (intervalle non annoncé)
+    flags: int = 0
+    fingerprint: Optional[bytes] = None  # Empreinte de la clé publique, si le pair l'annonce
+
+
+def pack_beacon(username: str, interval: float, flags: int = 0, fingerprint: Optional[bytes] = None) -> bytes:
+    name = username.encode('utf-8')[:MAX_USERNAME_BYTES].decode('utf-8', 'ignore').encode('utf-8')
+    tenths = min(0xFFFF, math.ceil(interval * 10))
+    if fingerprint is None:
+        return BEACON_HEADER.pack(BEACON_MAGIC, flags & ~FLAG_FINGERPRINT, tenths) + name
+    if len(fingerprint) != FINGERPRINT_SIZE:
+        raise BeaconError(f"Empreinte de {len(fingerprint)} octets au lieu de {FINGERPRINT_SIZE}")
+    return BEACON_HEADER.pack(BEACON_MAGIC, flags | FLAG_FINGERPRINT, tenths) + fingerprint + name
+
+
+def unpack_beacon(data: bytes) -> Beacon:
+    """Lit une balise binaire ou JSON."""
+    if data.startswith(BEACON_MAGIC):
+        if len(data) < BEACON_HEADER.size:
+            raise BeaconError("Balise tronquée")
+        _, flags, tenths = BEACON_HEADER.unpack_from(data)
+        offset, fingerprint = BEACON_HEADER.size, None
+        if flags & FLAG_FINGERPRINT:
+            if len(data) < offset + FINGERPRINT_SIZE:
+                raise BeaconError("Balise tronquée")
+            fingerprint = data[offset:offset + FINGERPRINT_SIZE]
+            offset += FINGERPRINT_SIZE
+        return Beacon(data[offset:].decode('utf-8', 'replace') or "Inconnu", tenths / 10, flags, fingerprint)
+    try:
+        message = json.loads(data.decode())
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise BeaconError(f"Balise illisible : {e}")
+    if not isinstance(message, dict) or message.get("type") != "DISCOVER_PEER":
+        raise BeaconError("Type de balise inconnu")
+    return Beacon(message.get("username", "Inconnu"), None)
+
+
+def peer_timeout(beacon: Beacon) -> float:
+    """Délai sans balise avant de considérer le pair comme perdu, d'après l'intervalle qu'il annonce."""
+    if beacon.interval is None:
+        return LEGACY_PEER_TIMEOUT
+    return beacon.interval * MISSED_BEACONS + TIMEOUT_MARGIN
+
+
+class BeaconSchedule:
+    """
+    Intervalle entre deux balises.
+    Au démarrage, les balises sont rapprochées (BEACON_MIN_INTERVAL) pour être découvert vite,
+    puis l'intervalle double à chaque balise jusqu'à une cible qui dépend du nombre de pairs :
+    au moins BEACON_BASE_INTERVAL, et assez long pour que l'ensemble du sous-réseau n'émette
+    pas plus de BEACON_TARGET_RATE balises par seconde (borné par BEACON_MAX_INTERVAL).
+    Chaque délai varie aléatoirement de ±BEACON_JITTER.
+    """
+
+    def __init__(self, min_interval: float = BEACON_MIN_INTERVAL, base_interval: float = BEACON_BASE_INTERVAL,
+                 max_interval: float = BEACON_MAX_INTERVAL, target_rate: float = BEACON_TARGET_RATE,
+                 jitter: float = BEACON_JITTER, rng: Optional[random.Random] = None):
+        self.min_interval = min_interval
+        self.base_interval = base_interval
+        self.max_interval = max_interval
+        self.target_rate = target_rate
+        self.jitter = jitter
+        self.rng = rng if rng else random.Random()
+        self.interval = 0.0
+
+    def reset(self) -> None:
+        """Repart des balises rapprochées (changement d'adresse, voir NetworkDiscovery)."""
+        self.interval = 0.0
+
+    def target(self, peer_count: int) -> float:
+        return min(self.max_interval, max(self.base_interval, (peer_count + 1) / self.target_rate))
+
+    def next_interval(self, peer_count: int) -> float:
+        """Intervalle nominal avant la balise suivante."""
+        target = self.target(peer_count)
+        self.interval = min(target, self.interval * 2) if self.interval else min(target, self.min_interval)
+        return self.interval
+
+    def announced(self, interval: float) -> float:
+        """Intervalle annoncé dans la balise : borne haute du délai réel."""
+        return interval * (1 + self.jitter)
+
+    def delay(self, interval: float) -> float:
+        return interval * self.rng.uniform(1 - self.jitter, 1 + self.jitter)
@@ -0,0 +1,138 @@
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from network.protocol import encode_frame, FRAME_BATCH
+
+COALESCE_WINDOW = 0.005  # Secondes
+MAX_BATCH_BYTES = 256 * 1024  # Taille maximale d'un lot (les trames plus grandes partent seules)
+
+
+class _PendingSend:
+    def __init__(self, frame: bytes, preamble: Optional[Callable[[], bytes]], deadline: Optional[float]):
+        self.frame = frame
+        self.preamble = preamble
+        self.deadline = deadline
+        self.completed = False
+        self.error: Optional[BaseException] = None
+        self.wake = threading.Event()
+
+
+class _PeerSends:
+    def __init__(self):
+        self.pending: List[_PendingSend] = []
+        self.busy = False  # Un envoi vers ce pair est en cours
+        self.last_send = 0.0
+
+
+class SendCoalescer:
+    """
+    Regroupe les envois vers un même pair, à la manière de l'algorithme de Nagle.
+    S'utilise à la place du ConnectionPool (même méthode `send`). Un message isolé part
+    immédiatement ; ceux qui arrivent pendant qu'un envoi vers le même pair est en cours, ou
+    moins de `window` secondes après le précédent, sont réunis dans une seule trame FRAME_BATCH
+    envoyée en une écriture. Chaque appel reste bloquant et lève l'erreur de l'envoi de son lot.
+    Un message avec échéance n'attend pas son lot au-delà de celle-ci (socket.timeout) ; un lot ne
+    mêle pas messages avec et sans échéance, et part avec l'échéance la plus proche de ses messages.
+    """
+
+    def __init__(self, connection_pool, window: float = COALESCE_WINDOW, max_batch_bytes: int = MAX_BATCH_BYTES,
+                 log_func=None):
+        self.connection_pool = connection_pool
+        self.window = window
+        self.max_batch_bytes = max_batch_bytes
+        self.log = log_func if log_func else lambda msg: None
+        self._peers: Dict[str, _PeerSends] = {}
+        self._lock = threading.Lock()
+        self.batches_sent = 0
+        self.frames_sent = 0
+
+    def send(self, ip: str, frame: bytes, preamble: Optional[Callable[[], bytes]] = None,
+             deadline: Optional[float] = None) -> None:
+        item = _PendingSend(frame, preamble, deadline)
+        with self._lock:
+            peer = self._peers.get(ip)
+            if peer is None:
+                peer = self._peers[ip] = _PeerSends()
+            peer.pending.append(item)
+            lead = not peer.busy
+            peer.busy = True
+        if not lead:
+            # Le message partira avec le lot suivant ; on peut aussi être désigné pour l'envoyer
+            self._wait_turn(peer, item)
+        if not item.completed:
+            self._send_batch(ip, peer)
+        if item.error is not None:
+            raise item.error
+
+    def close_peer(self, ip: str) -> None:
+        self.connection_pool.close_peer(ip)
+
+    def close_all(self) -> None:
+        self.connection_pool.close_all()
+
+    def _wait_turn(self, peer: _PeerSends, item: _PendingSend) -> None:
+        """Attend que le message soit envoyé ou que son tour vienne, au plus jusqu'à son échéance."""
+        if item.deadline is None:
+            item.wake.wait()
+            return
+        if item.wake.wait(max(0.0, item.deadline - time.monotonic())):
+            return
+        with self._lock:
+            if not item.wake.is_set() and item in peer.pending:
+                # Toujours en file : retiré, il ne partira pas
+                peer.pending.remove(item)
+                raise socket.timeout("Échéance d'envoi dépassée avant le départ du lot")
+        # Déjà dans un lot en cours d'envoi, borné par une échéance au plus égale à la sienne
+        item.wake.wait()
+
+    def _send_batch(self, ip: str, peer: _PeerSends):
+        """Envoie les messages en attente du pair (l'appelant est en tête de file) puis passe la main."""
+        if self.window and time.monotonic() - peer.last_send < self.window:
+            # Rafale en cours : on laisse les envois suivants rejoindre le lot
+            time.sleep(self.window)
+        with self._lock:
+            batch, size = [], 0
+            for item in peer.pending:
+                if batch and (size + len(item.frame) > self.max_batch_bytes
+                              or (item.deadline is None) != (batch[0].deadline is None)):
+                    break
+                batch.append(item)
+                size += len(item.frame)
+            del peer.pending[:len(batch)]
+
+        error = None
+        try:
+            frame, preamble = self._pack(batch)
+            deadline = None if batch[0].deadline is None else min(item.deadline for item in batch)
+            self.connection_pool.send(ip, frame, preamble, deadline=deadline)
+        except Exception as e:
+            error = e
+
+        with self._lock:
+            peer.last_send = time.monotonic()
+            self.batches_sent += 1
+            self.frames_sent += len(batch)
+            if peer.pending:
+                # Le premier message en attente devient responsable du lot suivant
+                peer.pending[0].wake.set()
+            else:
+                # L'état du pair est conservé : l'heure du dernier envoi sert à détecter les rafales
+                peer.busy = False
+        if len(batch) > 1:
+            self.log(f"[DEBUG] {len(batch)} messages regroupés vers {ip}")
+        for item in batch:
+            item.error = error
+            item.completed = True
+            item.wake.set()
+
+    @staticmethod
+    def _pack(batch: List[_PendingSend]):
+        """Trame à envoyer et préambule commun (annonces de clé de session, sans doublons)."""
+        if len(batch) == 1:
+            return batch[0].frame, batch[0].preamble
+        frame = encode_frame(FRAME_BATCH, b''.join(item.frame for item in batch))
+        preambles = [item.preamble for item in batch if item.preamble]
+        if not preambles:
+            return frame, None
+        return frame, lambda: b''.join(dict.fromkeys(p() for p in preambles))
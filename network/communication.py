@@ -1,16 +1,34 @@
 import socket
 import threading
+import time
 import json
+from network.connection_pool import ConnectionPool, IDLE_TIMEOUT
+from network.worker_pool import BoundedWorkerPool
+from network.protocol import (
+    FrameDecoder, ProtocolError, encode_frame, encode_legacy, is_framed, iter_frames, parse_legacy,
+    FRAME_PUBKEY, FRAME_DIRECT, FRAME_GROUPMSG, FRAME_JOINGROUP, FRAME_SESSION_KEY, FRAME_GROUPKEY,
+    FRAME_GROUPRELAY, FRAME_BATCH, FRAME_CLOSE
+)
+from network.envelope import is_group_envelope
 
 TCP_PORT = 50001
 BUFFER_SIZE = 1024
+SERVER_IDLE_TIMEOUT = IDLE_TIMEOUT * 2  # Laisse à l'émetteur le soin de fermer en premier
+IDLE_POLL_INTERVAL = 5  # Vérification périodique des connexions inactives
+CLOSE_GRACE = 1.0  # Lecture maintenue après FRAME_CLOSE, pour les trames écrites avant sa réception
 
 class PeerCommunicator:
-    def __init__(self, get_local_ip_func, key_exchange_func, on_key_received_func, log_func=None):
+    def __init__(self, get_local_ip_func, key_exchange_func, on_key_received_func, log_func=None,
+                 connection_pool=None, worker_pool=None, is_peer_revoked_func=None):
         self.get_local_ip = get_local_ip_func
         self.key_exchange = key_exchange_func
         self.on_key_received = on_key_received_func
+        # Vérifié pour chaque trame reçue, avant tout déchiffrement (recherche O(1))
+        self.is_peer_revoked = is_peer_revoked_func if is_peer_revoked_func else lambda ip: False
         self.log = log_func if log_func else lambda msg: None
+        self.connection_pool = connection_pool if connection_pool else ConnectionPool(log_func=self.log)
+        # Traitement des connexions entrantes par un nombre borné de threads
+        self.worker_pool = worker_pool if worker_pool else BoundedWorkerPool(name="tcp-handler", log_func=self.log)
         self.public_keys = {}
         self.groupes = {}
         self.messages = []
@@ -19,6 +37,11 @@ class PeerCommunicator:
         # Callbacks pour les messages reçus
         self.on_message_received = None
         self.on_group_message_received = None
+        self.on_session_key_received = None
+        self.on_group_key_received = None
+        self.on_group_envelope_received = None  # Message de groupe chiffré (déchiffré par le GroupManager)
+        self.on_group_relay_received = None
+        self.on_group_join_received = None
         self.local_public_key = None
         self.server_socket = None
         self.is_running = False
@@ -30,24 +53,120 @@ class PeerCommunicator:
     def handle_client(self, conn, addr):
         self.log(f"[DEBUG] PEER_COMMUNICATOR: Connexion reçue de {addr[0]}")
         try:
-            # Lire les données en boucle pour s'assurer de recevoir le message complet
-            full_data_bytes = b''
+            first_byte = conn.recv(1, socket.MSG_PEEK)
+            if not first_byte:
+                self.log(f"[DEBUG] PEER_COMMUNICATOR: Aucune donnée reçue de {addr[0]}.")
+                return
+
+            if is_framed(first_byte):
+                # Connexion persistante : plusieurs trames jusqu'à fermeture ou inactivité
+                conn.settimeout(IDLE_POLL_INTERVAL)
+                decoder = FrameDecoder(conn)
+                reply = lambda frame_type, payload: conn.sendall(encode_frame(frame_type, payload))
+                last_activity = time.monotonic()
+                while not self.stop_event.is_set():
+                    try:
+                        frame = decoder.read_frame()
+                    except socket.timeout:
+                        # Une connexion inactive rend son thread si d'autres connexions attendent
+                        idle = time.monotonic() - last_activity
+                        if idle > SERVER_IDLE_TIMEOUT or (self.worker_pool.has_waiting_tasks()
+                                                          and not decoder.has_partial_frame()):
+                            self.log(f"[DEBUG] PEER_COMMUNICATOR: Connexion inactive fermée avec {addr[0]}")
+                            self._close_persistent(conn, decoder, addr, reply)
+                            break
+                        continue
+                    if frame is None:
+                        break
+                    self.handle_frame(frame[0], frame[1], addr, reply)
+                    last_activity = time.monotonic()
+                return
+
+            # Ancien protocole texte : un seul message, terminé par la fermeture de la connexion
+            chunks = []
             while True:
                 chunk = conn.recv(BUFFER_SIZE)
                 if not chunk:
                     break  # Le client a fermé la connexion, message complet
-                full_data_bytes += chunk
+                chunks.append(chunk)
+            frame_type, payload = parse_legacy(b''.join(chunks))
+            reply = lambda frame_type, payload: conn.sendall(encode_legacy(frame_type, payload))
+            self.handle_frame(frame_type, payload, addr, reply)
+        except ProtocolError as e:
+            self.log(f"[ERREUR] Trame invalide reçue de {addr[0]}: {e}")
+        except Exception as e:
+            self.log(f"[ERREUR] Erreur lors du traitement de la connexion de {addr}: {e}")
+        finally:
+            conn.close()
+
+    def _close_persistent(self, conn, decoder, addr, reply):
+        """
+        Fermeture d'une connexion persistante à l'initiative du serveur : annonce FRAME_CLOSE, que le
+        pool du client voit avant de réutiliser la connexion (ConnectionPool écarte une connexion sur
+        laquelle des données sont arrivées), puis lit encore pendant CLOSE_GRACE secondes pour traiter
+        une trame écrite avant que l'annonce n'arrive, au lieu de la perdre.
+        """
+        try:
+            reply(FRAME_CLOSE, b'')
+            conn.settimeout(CLOSE_GRACE)
+            end = time.monotonic() + CLOSE_GRACE
+            while time.monotonic() < end:
+                try:
+                    frame = decoder.read_frame()
+                except socket.timeout:
+                    if not decoder.has_partial_frame():
+                        return
+                    continue
+                if frame is None:
+                    return
+                self.handle_frame(frame[0], frame[1], addr, reply)
+        except OSError:
+            pass  # Client déjà parti
+
+    def handle_frame(self, frame_type, payload, addr, reply):
+        """Traite une trame reçue. `reply(type, données)` répond au pair sur la même connexion."""
+        try:
+            self.log(f"[DEBUG] PEER_COMMUNICATOR: Trame {frame_type} reçue de {addr[0]} ({len(payload)} octets)")
             
-            if not full_data_bytes:
-                self.log(f"[DEBUG] PEER_COMMUNICATOR: Aucune donnée reçue de {addr[0]}.")
+            if self.is_peer_revoked(addr[0]):
+                # Certificat révoqué : aucun travail RSA ni AES pour ce pair, quelle que soit la clé
+                # qu'il présente ensuite (le rejet est définitif)
+                self.log(f"[AVERTISSEMENT] Trame de {addr[0]} rejetée : certificat révoqué")
+                return
+            if frame_type == FRAME_BATCH:
+                # Lot de trames regroupées par l'émetteur : traitées une par une, dans l'ordre
+                for inner_type, inner_payload in iter_frames(payload):
+                    if inner_type == FRAME_BATCH:
+                        raise ProtocolError("Lot de trames imbriqué")
+                    self.handle_frame(inner_type, inner_payload, addr, reply)
+                return
+            if frame_type == FRAME_DIRECT:
+                # Message direct chiffré (binaire) : transmis au NetworkManager qui le passera au MessageManager pour déchiffrement.
+                self.log(f"[DEBUG] PEER_COMMUNICATOR: Message direct reçu de {addr[0]}. Transmission pour déchiffrement.")
+                if self.on_message_received:
+                    self.on_message_received(addr[0], payload)
+                return
+            if frame_type == FRAME_SESSION_KEY:
+                if self.on_session_key_received:
+                    self.on_session_key_received(addr[0], payload)
+                return
+            if frame_type == FRAME_GROUPKEY:
+                if self.on_group_key_received:
+                    self.on_group_key_received(addr[0], payload)
+                return
+            if frame_type == FRAME_GROUPRELAY:
+                if self.on_group_relay_received:
+                    self.on_group_relay_received(addr[0], payload)
+                return
+            if frame_type == FRAME_GROUPMSG and is_group_envelope(payload):
+                if self.on_group_envelope_received:
+                    self.on_group_envelope_received(addr[0], payload)
                 return
 
-            data = full_data_bytes.decode()
-            self.log(f"[DEBUG] PEER_COMMUNICATOR: Données complètes reçues de {addr[0]}: {data[:150]}...")
-            
-            if data.startswith("PUBKEY:"):
+            data = payload.decode()
+            if frame_type == FRAME_PUBKEY:
                 peer_ip = addr[0]
-                key_pem = data.split(":", 1)[1]
+                key_pem = data
                 self.log(f"[INFO] Demande d'échange de clé reçue de {peer_ip}")
 
                 # Mettre à jour la clé de l'expéditeur
@@ -56,14 +175,13 @@ class PeerCommunicator:
 
                 # Envoyer notre propre clé en réponse
                 if self.local_public_key:
-                    response = f"PUBKEY:{self.local_public_key}"
-                    conn.sendall(response.encode())
+                    reply(FRAME_PUBKEY, self.local_public_key.encode())
                     self.log(f"[INFO] Clé publique locale envoyée à {peer_ip}")
                 else:
                     self.log("[ERREUR] Clé publique locale non disponible pour répondre.")
-            elif data.startswith("GROUPMSG:"):
+            elif frame_type == FRAME_GROUPMSG:
                 try:
-                    _, nom, msg = data.split(":", 2)
+                    nom, msg = data.split(":", 1)
                     if nom not in self.groupes:
                         self.groupes[nom] = {"membres": [addr[0]], "messages": []}
                     self.groupes[nom]["messages"].append((addr[0], msg))
@@ -75,10 +193,11 @@ class PeerCommunicator:
                         
                 except Exception as e:
                     self.log(f"[ERREUR] Mauvais format de message GROUPMSG : {e}")
-                return
-            elif data.startswith("JOINGROUP:"):
+            elif frame_type == FRAME_JOINGROUP and self.on_group_join_received:
+                self.on_group_join_received(addr[0], data)
+            elif frame_type == FRAME_JOINGROUP:
                 try:
-                    _, nom, ips_str = data.split(":", 2)
+                    nom, ips_str = data.split(":", 1)
                     membres = ips_str.split(",")
                     if nom not in self.groupes:
                         self.groupes[nom] = {"membres": [], "messages": []}
@@ -91,28 +210,26 @@ class PeerCommunicator:
                             self.key_exchange(ip)
                 except Exception as e:
                     self.log(f"[ERREUR] Mauvais format de message JOINGROUP : {e}")
-                return
             else:
-                # Si le message n'est pas une commande système, on suppose que c'est un message direct chiffré.
-                # On le transmet au NetworkManager qui le passera au MessageManager pour déchiffrement.
-                self.log(f"[DEBUG] PEER_COMMUNICATOR: Message direct reçu de {addr[0]}. Transmission pour déchiffrement.")
-                if self.on_message_received:
-                    self.on_message_received(addr[0], data)
+                self.log(f"[AVERTISSEMENT] Type de trame inconnu {frame_type} reçu de {addr[0]}")
         except Exception as e:
-            self.log(f"[ERREUR] Erreur lors du traitement de la connexion de {addr}: {e}")
-        finally:
-            conn.close()
+            self.log(f"[ERREUR] Erreur lors du traitement du message de {addr[0]}: {e}")
 
     def start_tcp_server(self):
         def server_loop():
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                # Les connexions persistantes fermées côté serveur laissent des sockets en TIME_WAIT
+                s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
                 s.bind(('', TCP_PORT))
                 s.listen()
                 while not self.stop_event.is_set():
                     try:
                         s.settimeout(1.0)
                         conn, addr = s.accept()
-                        threading.Thread(target=self.handle_client, args=(conn, addr), daemon=True).start()
+                        # Bloque l'acceptation tant que la file est pleine, puis refuse la connexion
+                        if not self.worker_pool.submit(self.handle_client, conn, addr):
+                            self.log(f"[AVERTISSEMENT] Connexion de {addr[0]} refusée : serveur saturé")
+                            conn.close()
                     except socket.timeout:
                         continue
         threading.Thread(target=server_loop, daemon=True).start()
@@ -122,10 +239,8 @@ class PeerCommunicator:
             self.log(f"[ERREUR] Envoi de message annulé, clé publique non échangée avec {ip}")
             return
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.connect((ip, TCP_PORT))
-                s.send(msg.encode())
-                self.log(f"[INFO] Message envoyé à {ip} : {msg}")
+            self.connection_pool.send(ip, encode_frame(*parse_legacy(msg.encode())))
+            self.log(f"[INFO] Message envoyé à {ip} : {msg}")
         except Exception as e:
             self.log(f"[ERREUR] Échec de l'envoi du message à {ip} : {e}")
 
@@ -148,11 +263,9 @@ class PeerCommunicator:
                 self.log(f"[ERREUR] Clé publique manquante pour {ip}, groupe incomplet.")
                 continue
             try:
-                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                    s.connect((ip, TCP_PORT))
-                    group_info = f"JOINGROUP:{nom}:{','.join(membres)}"
-                    s.send(group_info.encode())
-                    self.log(f"[INFO] Notification de groupe '{nom}' envoyée à {ip}")
+                group_info = f"{nom}:{','.join(membres)}"
+                self.connection_pool.send(ip, encode_frame(FRAME_JOINGROUP, group_info.encode()))
+                self.log(f"[INFO] Notification de groupe '{nom}' envoyée à {ip}")
             except Exception as e:
                 self.log(f"[ERREUR] Impossible de notifier {ip} pour le groupe '{nom}' : {e}")
 
@@ -161,8 +274,9 @@ class PeerCommunicator:
             self.log(f"[ERREUR] Le groupe '{nom}' n'existe pas.")
             return
         membres = self.groupes[nom]["membres"]
+        my_ip = self.get_local_ip()
         for ip in membres:
-            if ip == self.get_local_ip():
+            if ip == my_ip:
                 continue
             self.envoyer_message(ip, f"GROUPMSG:{nom}:{msg}")
         self.groupes[nom]["messages"].append(("Moi", msg))
@@ -173,5 +287,11 @@ class PeerCommunicator:
         self.is_running = True
         self.start_tcp_server()
 
+    def get_metrics(self) -> dict:
+        """Métriques du traitement des connexions entrantes (file d'attente, latences, refus)."""
+        return self.worker_pool.get_metrics()
+
     def stop(self):
-        self.stop_event.set() 
\ No newline at end of file
+        self.stop_event.set()
+        self.connection_pool.close_all()
+        self.worker_pool.shutdown() 
\ No newline at end of file
@@ -0,0 +1,197 @@
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+TCP_PORT = 50001
+MAX_CONNECTIONS_PER_PEER = 2
+IDLE_TIMEOUT = 60  # Secondes d'inactivité avant fermeture d'une connexion
+CONNECT_TIMEOUT = 5.0
+SEND_TIMEOUT = 5.0  # Durée maximale d'une écriture : un pair qui ne lit plus ne bloque pas l'envoi
+
+
+class _PooledConnection:
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.last_used = time.monotonic()
+
+    def is_alive(self) -> bool:
+        """Vérifie sans bloquer que le pair n'a pas fermé la connexion."""
+        try:
+            timeout = self.sock.gettimeout()
+            self.sock.setblocking(False)
+            try:
+                # b'' = fermeture par le pair ; des données (FRAME_CLOSE, fermeture annoncée par le serveur)
+                # rendent aussi la connexion inutilisable
+                self.sock.recv(1, socket.MSG_PEEK)
+                return False
+            except BlockingIOError:
+                return True
+            finally:
+                self.sock.settimeout(timeout)
+        except OSError:
+            return False
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class ConnectionPool:
+    """
+    Pool de connexions TCP persistantes par pair.
+    Les trames (voir network/protocol.py) sont envoyées sur des connexions réutilisées,
+    fermées après une période d'inactivité et recréées en cas d'échec.
+    Chaque écriture est bornée par `send_timeout` : une connexion dont l'écriture expire
+    est fermée (la trame a pu partir en partie) et n'est jamais rendue au pool.
+    Un envoi peut aussi recevoir une échéance (`deadline`, en time.monotonic()) qui borne
+    l'attente d'une connexion libre, la connexion et l'écriture.
+    """
+
+    def __init__(self, port: int = TCP_PORT, max_per_peer: int = MAX_CONNECTIONS_PER_PEER,
+                 idle_timeout: float = IDLE_TIMEOUT, connect_timeout: float = CONNECT_TIMEOUT,
+                 send_timeout: float = SEND_TIMEOUT, log_func=None):
+        self.port = port
+        self.max_per_peer = max_per_peer
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self.send_timeout = send_timeout
+        self.log = log_func if log_func else lambda msg: None
+        self._idle: Dict[str, List[_PooledConnection]] = {}  # ip -> connexions libres
+        self._in_use: Dict[str, int] = {}  # ip -> nombre de connexions empruntées
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def send(self, ip: str, frame: bytes, preamble: Optional[Callable[[], bytes]] = None,
+             deadline: Optional[float] = None) -> None:
+        """
+        Envoie une trame déjà encodée au pair en réutilisant une connexion du pool.
+        Réessaie une fois sur une nouvelle connexion si la connexion réutilisée a échoué.
+        `preamble` fournit des trames à envoyer avant `frame` lorsque la connexion est nouvelle
+        (ex. annonce de la clé de session, que le pair a pu perdre s'il a redémarré).
+        Lève OSError si l'envoi est impossible, socket.timeout si le pair ne lit plus
+        ou si l'échéance est dépassée.
+        """
+        conn, reused = self._acquire(ip, deadline=deadline)
+        try:
+            timeout = self._timeout(self.send_timeout, deadline)
+        except socket.timeout:
+            self._release(ip, conn)  # Rien n'a été écrit : la connexion reste utilisable
+            raise
+        try:
+            conn.sock.settimeout(timeout)
+            conn.sock.sendall(frame if reused or not preamble else preamble() + frame)
+        except OSError as e:
+            self._discard(ip, conn)
+            if not reused or isinstance(e, socket.timeout):
+                # Pair qui ne lit plus : une nouvelle connexion attendrait tout autant
+                raise
+            self.log(f"[DEBUG] Connexion persistante vers {ip} rompue ({e}), reconnexion")
+            conn, _ = self._acquire(ip, reuse=False, deadline=deadline)
+            try:
+                conn.sock.settimeout(self._timeout(self.send_timeout, deadline))
+                conn.sock.sendall(preamble() + frame if preamble else frame)
+            except OSError:
+                self._discard(ip, conn)
+                raise
+        self._release(ip, conn)
+
+    def close_peer(self, ip: str) -> None:
+        """Ferme toutes les connexions libres vers un pair."""
+        with self._condition:
+            for conn in self._idle.pop(ip, []):
+                conn.close()
+
+    def close_all(self) -> None:
+        """Ferme toutes les connexions libres et refuse les nouveaux envois."""
+        with self._condition:
+            self._closed = True
+            for conns in self._idle.values():
+                for conn in conns:
+                    conn.close()
+            self._idle.clear()
+            self._condition.notify_all()
+
+    @staticmethod
+    def _timeout(limit: float, deadline: Optional[float]) -> float:
+        """Délai d'une opération : `limit`, réduit au temps restant avant l'échéance."""
+        if deadline is None:
+            return limit
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise socket.timeout("Échéance d'envoi dépassée")
+        return min(limit, remaining)
+
+    def _acquire(self, ip: str, reuse: bool = True, deadline: Optional[float] = None):
+        """Emprunte une connexion libre ou en ouvre une nouvelle si la limite le permet."""
+        with self._condition:
+            wait_deadline = time.monotonic() + self._timeout(self.connect_timeout, deadline)
+            while True:
+                if self._closed:
+                    raise OSError("Pool de connexions fermé")
+                self._reap_idle()
+                idle = self._idle.get(ip)
+                if reuse and idle:
+                    conn = idle.pop()
+                    if conn.is_alive():
+                        self._in_use[ip] = self._in_use.get(ip, 0) + 1
+                        return conn, True
+                    conn.close()
+                    continue
+                if len(self._idle.get(ip, [])) + self._in_use.get(ip, 0) < self.max_per_peer:
+                    self._in_use[ip] = self._in_use.get(ip, 0) + 1
+                    break
+                if idle:
+                    # Limite atteinte avec des connexions libres : on en sacrifie une pour repartir à neuf
+                    idle.pop().close()
+                    continue
+                remaining = wait_deadline - time.monotonic()
+                if remaining <= 0:
+                    raise socket.timeout(f"Aucune connexion disponible vers {ip}")
+                self._condition.wait(remaining)
+
+        # Connexion hors verrou pour ne pas bloquer les autres pairs
+        try:
+            sock = socket.create_connection((ip, self.port), timeout=self._timeout(self.connect_timeout, deadline))
+            sock.settimeout(self.send_timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError:
+            with self._condition:
+                self._in_use[ip] -= 1
+                self._condition.notify_all()
+            raise
+        self.log(f"[DEBUG] Nouvelle connexion persistante ouverte vers {ip}")
+        return _PooledConnection(sock), False
+
+    def _release(self, ip: str, conn: _PooledConnection) -> None:
+        with self._condition:
+            self._in_use[ip] -= 1
+            if self._closed:
+                conn.close()
+            else:
+                conn.last_used = time.monotonic()
+                self._idle.setdefault(ip, []).append(conn)
+            self._condition.notify_all()
+
+    def _discard(self, ip: str, conn: _PooledConnection) -> None:
+        conn.close()
+        with self._condition:
+            self._in_use[ip] -= 1
+            self._condition.notify_all()
+
+    def _reap_idle(self) -> None:
+        """Ferme les connexions inactives depuis plus de idle_timeout (appelé sous verrou)."""
+        now = time.monotonic()
+        for ip in list(self._idle):
+            alive = []
+            for conn in self._idle[ip]:
+                if now - conn.last_used > self.idle_timeout:
+                    conn.close()
+                else:
+                    alive.append(conn)
+            if alive:
+                self._idle[ip] = alive
+            else:
+                del self._idle[ip]
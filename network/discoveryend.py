@@ -1,99 +1,161 @@
+import random
 import socket
 import threading
-import time
-import json
+from typing import Callable, Optional
+from network.local_address import get_local_address_service, get_local_ip
+from network.peer_table import PeerTable, PEER_TIMEOUT
+from network.beacon import (
+    BeaconSchedule, FLAG_BYE, FLAG_REPLY, REPLY_MAX_DELAY, pack_beacon, peer_timeout, unpack_beacon
+)
 
 BROADCAST_PORT = 50000
-BROADCAST_INTERVAL = 5  # Envoyer un broadcast toutes les 5 secondes
 BUFFER_SIZE = 1024
 
 class NetworkDiscovery:
-    def __init__(self, username="User", on_peer_discovered=None, on_peer_lost=None):
+    def __init__(self, username="User", on_peer_discovered=None, on_peer_lost=None, on_peer_key=None,
+                 local_address=None):
         self.username = username
-        self.known_peers = {}  # ip -> {nom, ip, status, last_seen}
         self.stop_event = threading.Event()
         self.on_peer_discovered = on_peer_discovered  # callback(ip, nom)
         self.on_peer_lost = on_peer_lost  # callback(ip)
-        self.peer_timeout = 30  # Secondes d'inactivité avant de considérer un pair comme perdu
+        self.on_peer_key = on_peer_key  # callback(ip, empreinte) pour chaque balise qui annonce une empreinte de clé
+        self.key_fingerprint: Optional[bytes] = None  # Empreinte de notre clé publique, annoncée dans les balises
+        self.peer_timeout = PEER_TIMEOUT  # Secondes d'inactivité avant de considérer un pair comme perdu
+        # Pairs connus et expiration (callback on_peer_lost appelé depuis le thread d'expiration)
+        self.known_peers = PeerTable(timeout=self.peer_timeout, on_expired=self._on_peer_expired)
+        # Intervalle adaptatif entre deux balises (voir network/beacon.py)
+        self.schedule = BeaconSchedule()
+        # Envoi d'un datagramme, minuterie et réveil de la diffusion : socket, threading.Timer et
+        # événement par défaut, remplacés par le moteur asyncio pour passer par sa boucle d'événements
+        self.send_datagram: Optional[Callable[[bytes, tuple], None]] = None
+        self.call_later: Callable = self._call_later
+        self._wake = threading.Event()
+        self.wake_broadcast: Callable[[], None] = self._wake.set
+        self._socket: Optional[socket.socket] = None
+        # Changement d'adresse locale : les pairs doivent nous redécouvrir vite
+        self.local_address = local_address if local_address else get_local_address_service()
+        self.local_address.add_listener(self._on_local_address_changed)
 
     def get_local_ip(self):
-        """Tente de récupérer l'IP locale pour éviter de se découvrir soi-même."""
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-                # Se connecte à une IP externe (sans envoyer de données) pour obtenir l'IP de l'interface sortante
-                s.connect(("8.8.8.8", 80))
-                return s.getsockname()[0]
-        except Exception:
-            return "127.0.0.1"  # Fallback
+        """IP locale (service partagé, mise en cache) pour éviter de se découvrir soi-même."""
+        return get_local_ip()
+
+    def build_beacon(self, interval: Optional[float] = None, flags: int = 0) -> bytes:
+        """Construit la balise de présence ; elle annonce le délai maximal avant la suivante."""
+        interval = interval if interval else (self.schedule.interval or self.schedule.min_interval)
+        return pack_beacon(self.username, self.schedule.announced(interval), flags, self.key_fingerprint)
+
+    def set_key_fingerprint(self, fingerprint: Optional[bytes]):
+        """Change l'empreinte annoncée (rotation des clés) et l'annonce aussitôt si la découverte est démarrée."""
+        changed = fingerprint != self.key_fingerprint
+        self.key_fingerprint = fingerprint
+        if changed and (self._socket or self.send_datagram) and not self.stop_event.is_set():
+            self._send(self.build_beacon(), ('<broadcast>', BROADCAST_PORT))
+
+    def next_beacon(self):
+        """Retourne (balise à diffuser, délai avant la suivante) selon le nombre de pairs connus."""
+        interval = self.schedule.next_interval(len(self.known_peers))
+        return self.build_beacon(interval), self.schedule.delay(interval)
 
     def broadcast_presence(self):
-        """Envoie périodiquement un message de présence sur le réseau."""
-        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP) as s:
-            s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-            message = {
-                "type": "DISCOVER_PEER",
-                "username": self.username
-            }
-            encoded_message = json.dumps(message).encode()
-            
-            while not self.stop_event.is_set():
-                try:
-                    s.sendto(encoded_message, ('<broadcast>', BROADCAST_PORT))
-                except Exception as e:
-                    print(f"[ERREUR][DISCOVERY] Erreur lors du broadcast: {e}")
-                time.sleep(BROADCAST_INTERVAL)
+        """Envoie la balise de présence sur le réseau, à intervalle adaptatif."""
+        while not self.stop_event.is_set():
+            beacon, delay = self.next_beacon()
+            self._send(beacon, ('<broadcast>', BROADCAST_PORT))
+            # Réveillé plus tôt par l'arrêt ou un changement d'adresse
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def _on_local_address_changed(self, previous: str, address: str):
+        """Nouvelle adresse locale : balise immédiate, puis de nouveau des balises rapprochées."""
+        self.schedule.reset()
+        self.wake_broadcast()
+
+    def say_goodbye(self):
+        """Annonce le départ : les pairs nous retirent sans attendre l'expiration."""
+        self._send(self.build_beacon(flags=FLAG_BYE), ('<broadcast>', BROADCAST_PORT))
+
+    def handle_beacon(self, data: bytes, peer_ip: str, local_ip: str):
+        """Traite un message de présence reçu d'un pair (balise binaire ou ancienne balise JSON)."""
+        # Ignorer les messages venant de soi-même
+        if peer_ip == local_ip:
+            return
+
+        beacon = unpack_beacon(data)
+        if beacon.flags & FLAG_BYE:
+            if self.known_peers.remove(peer_ip):
+                self._on_peer_expired(peer_ip)
+            return
+        if beacon.fingerprint is not None and self.on_peer_key:
+            # Avant la découverte : une clé en cache périmée doit être oubliée avant l'échange anticipé
+            self.on_peer_key(peer_ip, beacon.fingerprint)
+        # Nouveau pair découvert, ou pair déjà connu dont l'échéance est repoussée
+        if self.known_peers.touch(peer_ip, beacon.username, peer_timeout(beacon)):
+            if self.on_peer_discovered:
+                self.on_peer_discovered(peer_ip, beacon.username)
+            if not beacon.flags & FLAG_REPLY:
+                # Le nouveau pair nous découvre par une réponse directe, sans attendre notre
+                # prochaine balise ni faire accélérer les balises de tout le sous-réseau
+                self.call_later(random.uniform(0, REPLY_MAX_DELAY), self._reply, peer_ip)
+
+    def _reply(self, ip: str):
+        self._send(self.build_beacon(flags=FLAG_REPLY), (ip, BROADCAST_PORT))
+
+    def _send(self, data: bytes, addr: tuple):
+        try:
+            if self.send_datagram:
+                self.send_datagram(data, addr)
+            elif self._socket:
+                self._socket.sendto(data, addr)
+        except Exception as e:
+            print(f"[ERREUR][DISCOVERY] Erreur lors de l'envoi de la balise à {addr[0]}: {e}")
+
+    @staticmethod
+    def _call_later(delay: float, func, *args):
+        timer = threading.Timer(delay, func, args)
+        timer.daemon = True
+        timer.start()
 
     def listen_for_peers(self):
         """Écoute les messages de présence des autres pairs."""
-        local_ip = self.get_local_ip()
         with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
             s.bind(('', BROADCAST_PORT))
             
             while not self.stop_event.is_set():
                 try:
                     data, addr = s.recvfrom(BUFFER_SIZE)
-                    peer_ip = addr[0]
-
-                    # Ignorer les messages venant de soi-même
-                    if peer_ip == local_ip:
-                        continue
-
-                    message = json.loads(data.decode())
-                    if message.get("type") == "DISCOVER_PEER":
-                        peer_name = message.get("username", "Inconnu")
-                        current_time = time.time()
-                        
-                        if peer_ip not in self.known_peers:
-                            # Nouveau pair découvert
-                            self.known_peers[peer_ip] = {'nom': peer_name, 'last_seen': current_time}
-                            if self.on_peer_discovered:
-                                self.on_peer_discovered(peer_ip, peer_name)
-                        else:
-                            # Pair déjà connu, mettre à jour son timestamp
-                            self.known_peers[peer_ip]['last_seen'] = current_time
-
+                    # Adresse en cache : suit les changements d'interface sans coût par paquet
+                    self.handle_beacon(data, addr[0], self.get_local_ip())
                 except Exception as e:
                     print(f"[ERREUR][DISCOVERY] Erreur lors de l'écoute: {e}")
 
-    def cleanup_inactive_peers(self):
-        """Vérifie et supprime les pairs inactifs."""
-        current_time = time.time()
-        inactive_peers = [ip for ip, data in self.known_peers.items() if current_time - data['last_seen'] > self.peer_timeout]
-        
-        for ip in inactive_peers:
-            del self.known_peers[ip]
-            if self.on_peer_lost:
-                self.on_peer_lost(ip)
+    def _on_peer_expired(self, ip: str):
+        """Appelé par la table des pairs dès qu'un pair n'a plus envoyé de balise depuis peer_timeout."""
+        if self.on_peer_lost:
+            self.on_peer_lost(ip)
+
+    def start_expiry(self):
+        """Démarre le thread d'expiration des pairs (utilisé seul par le moteur asyncio)."""
+        self.known_peers.start()
 
     def start(self):
-        """Démarre les threads de broadcast et d'écoute."""
+        """Démarre les threads de broadcast, d'écoute et d'expiration des pairs."""
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
         threading.Thread(target=self.broadcast_presence, daemon=True).start()
         threading.Thread(target=self.listen_for_peers, daemon=True).start()
+        self.start_expiry()
 
     def stop(self):
-        """Arrête les threads."""
+        """Annonce le départ et arrête les threads."""
         self.stop_event.set()
+        self._wake.set()
+        self.say_goodbye()
+        self.known_peers.stop()
+        if self._socket:
+            self._socket.close()
+            self._socket = None
 
     def get_known_peers(self):
         """Retourne une copie des pairs connus."""
-        return self.known_peers.copy() 
\ No newline at end of file
+        return self.known_peers.snapshot() 
\ No newline at end of file
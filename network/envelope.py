@@ -0,0 +1,125 @@
+import struct
+from typing import NamedTuple, Optional, Tuple, Union
+
+# Enveloppes binaires des messages directs chiffrés (remplacent le dict JSON dont les champs
+# étaient encodés en hexadécimal, ce qui doublait la taille) :
+#   hybride : type (1) + taille du bloc RSA (2) + clé AES chiffrée RSA + IV (16) + message chiffré
+#   session : type (1) + identifiant de session (8) + IV (16) + message chiffré
+# Annonce de clé de session (trame FRAME_SESSION_KEY) : identifiant (8) + clé AES chiffrée RSA
+# Messages de groupe (trame FRAME_GROUPMSG), chiffrés une seule fois pour tous les membres :
+#   groupe : type (1) + identifiant de la clé de groupe (8) + IV (16) + message chiffré
+# Annonce de clé de groupe (trame FRAME_GROUPKEY) :
+#   identifiant (8) + taille du nom (2) + nom du groupe (UTF-8) + clé AES chiffrée RSA
+ENVELOPE_HYBRID = 0x01
+ENVELOPE_SESSION = 0x02
+ENVELOPE_GROUP = 0x03
+ENVELOPE_HEADER = struct.Struct('!BH')
+GROUP_NAME_HEADER = struct.Struct('!H')
+SESSION_ID_SIZE = 8
+GROUP_KEY_ID_SIZE = 8
+IV_SIZE = 16
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+class EnvelopeError(ValueError):
+    """Enveloppe binaire invalide."""
+
+
+class Envelope(NamedTuple):
+    kind: int
+    session_id: Optional[memoryview]  # Identifiant de la clé de session ou de groupe
+    encrypted_key: Optional[memoryview]
+    iv: memoryview
+    ciphertext: memoryview
+
+
+def is_envelope(data: BytesLike) -> bool:
+    """Distingue une enveloppe binaire de l'ancien format JSON (qui commence par '{')."""
+    return len(data) > 0 and data[0] in (ENVELOPE_HYBRID, ENVELOPE_SESSION)
+
+
+def is_group_envelope(data: BytesLike) -> bool:
+    """Distingue un message de groupe chiffré de l'ancien format texte "nom:message"."""
+    return len(data) > 0 and data[0] == ENVELOPE_GROUP
+
+
+def pack_envelope(encrypted_key: bytes, iv: bytes, ciphertext: bytes) -> bytes:
+    """Assemble une enveloppe hybride en une seule allocation, sans conversion en texte."""
+    if len(iv) != IV_SIZE:
+        raise EnvelopeError(f"IV de taille invalide ({len(iv)} octets)")
+    return b''.join((ENVELOPE_HEADER.pack(ENVELOPE_HYBRID, len(encrypted_key)), encrypted_key, iv, ciphertext))
+
+
+def pack_session_envelope(session_id: bytes, iv: bytes, ciphertext: bytes) -> bytes:
+    """Assemble une enveloppe chiffrée avec une clé de session déjà annoncée."""
+    if len(iv) != IV_SIZE:
+        raise EnvelopeError(f"IV de taille invalide ({len(iv)} octets)")
+    return b''.join((bytes((ENVELOPE_SESSION,)), session_id, iv, ciphertext))
+
+
+def pack_group_envelope(key_id: bytes, iv: bytes, ciphertext: bytes) -> bytes:
+    """Assemble un message de groupe chiffré avec la clé de groupe de l'expéditeur."""
+    if len(iv) != IV_SIZE:
+        raise EnvelopeError(f"IV de taille invalide ({len(iv)} octets)")
+    return b''.join((bytes((ENVELOPE_GROUP,)), key_id, iv, ciphertext))
+
+
+def unpack_envelope(data: BytesLike) -> Envelope:
+    """
+    Découpe une enveloppe en ses différentes parties.
+    Les parties sont des vues sur `data` : aucune copie n'est faite.
+    """
+    view = memoryview(data)
+    if not len(view):
+        raise EnvelopeError("Enveloppe vide")
+    kind = view[0]
+    if kind == ENVELOPE_HYBRID:
+        if len(view) < ENVELOPE_HEADER.size:
+            raise EnvelopeError("Enveloppe tronquée")
+        _, key_size = ENVELOPE_HEADER.unpack_from(view)
+        key_start = ENVELOPE_HEADER.size
+        iv_start = key_start + key_size
+        ciphertext_start = iv_start + IV_SIZE
+        if len(view) < ciphertext_start:
+            raise EnvelopeError("Enveloppe tronquée")
+        return Envelope(kind, None, view[key_start:iv_start], view[iv_start:ciphertext_start],
+                        view[ciphertext_start:])
+    if kind in (ENVELOPE_SESSION, ENVELOPE_GROUP):
+        # SESSION_ID_SIZE == GROUP_KEY_ID_SIZE : même découpage
+        iv_start = 1 + SESSION_ID_SIZE
+        ciphertext_start = iv_start + IV_SIZE
+        if len(view) < ciphertext_start:
+            raise EnvelopeError("Enveloppe tronquée")
+        return Envelope(kind, view[1:iv_start], None, view[iv_start:ciphertext_start], view[ciphertext_start:])
+    raise EnvelopeError(f"Type d'enveloppe inconnu : {kind}")
+
+
+def pack_session_key(session_id: bytes, encrypted_key: bytes) -> bytes:
+    """Construit l'annonce d'une clé de session."""
+    return session_id + encrypted_key
+
+
+def unpack_session_key(data: BytesLike) -> Tuple[bytes, bytes]:
+    """Retourne (identifiant de session, clé AES chiffrée RSA)."""
+    if len(data) <= SESSION_ID_SIZE:
+        raise EnvelopeError("Annonce de clé de session tronquée")
+    return bytes(data[:SESSION_ID_SIZE]), bytes(data[SESSION_ID_SIZE:])
+
+
+def pack_group_key(key_id: bytes, group_name: str, encrypted_key: bytes) -> bytes:
+    """Construit l'annonce d'une clé de groupe."""
+    name = group_name.encode()
+    return b''.join((key_id, GROUP_NAME_HEADER.pack(len(name)), name, encrypted_key))
+
+
+def unpack_group_key(data: BytesLike) -> Tuple[bytes, str, bytes]:
+    """Retourne (identifiant de la clé, nom du groupe, clé AES chiffrée RSA)."""
+    name_start = GROUP_KEY_ID_SIZE + GROUP_NAME_HEADER.size
+    if len(data) < name_start:
+        raise EnvelopeError("Annonce de clé de groupe tronquée")
+    (name_size,) = GROUP_NAME_HEADER.unpack_from(data, GROUP_KEY_ID_SIZE)
+    key_start = name_start + name_size
+    if len(data) <= key_start:
+        raise EnvelopeError("Annonce de clé de groupe tronquée")
+    return bytes(data[:GROUP_KEY_ID_SIZE]), bytes(data[name_start:key_start]).decode(), bytes(data[key_start:])
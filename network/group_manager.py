@@ -1,19 +1,79 @@
-import socket
-import json
 import os
-from typing import Dict, List, Tuple, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Tuple, Optional
+from app.crypto_manager import CryptoManager
+from network.connection_pool import ConnectionPool
+from network.protocol import encode_frame, FRAME_GROUPMSG, FRAME_JOINGROUP, FRAME_GROUPKEY, FRAME_GROUPRELAY
+from network.group_relay import (RELAY_ID_SIZE, RelayKey, SeenMessages, pack_relay, relay_fanout, signed_key_data,
+                                 split_subtrees, unpack_relay)
+from network.envelope import pack_group_envelope, pack_group_key, unpack_envelope, unpack_group_key
+from security.group_keys import GroupKeyCache, OutgoingGroupKey
+from utils.journal import AppendOnlyJournal
+from database.message_store import MessageStore, StoredGroupMessage, SearchResult, PAGE_SIZE, SEARCH_GROUP
+
+SEND_WORKERS = 8  # Envois simultanés vers les membres d'un groupe
+SEND_TIMEOUT = 5.0  # Échéance (secondes) de l'envoi à chaque membre : connexion et écriture comprises
+RETRY_DELAYS = (2, 10, 30)  # Délais (secondes) des nouvelles tentatives vers un membre injoignable
+
+
+class _SuiviRemise:
+    """
+    Remise d'un message de groupe : `callback(True)` dès qu'un membre l'a reçu (au premier envoi
+    ou lors d'une nouvelle tentative), `callback(False)` quand tous les envois ont été abandonnés.
+    Le callback est appelé une seule fois.
+    """
+
+    def __init__(self, callback: Callable[[bool], None], envois: int):
+        self.callback = callback
+        self._restants = envois
+        self._termine = False
+        self._lock = threading.Lock()
+
+    def remis(self) -> None:
+        with self._lock:
+            if self._termine:
+                return
+            self._termine = True
+        self.callback(True)
+
+    def abandon(self) -> None:
+        with self._lock:
+            self._restants -= 1
+            if self._termine or self._restants > 0:
+                return
+            self._termine = True
+        self.callback(False)
+
 
 class GroupManager:
-    def __init__(self, get_local_ip_func, key_exchange_func, log_func=None):
+    def __init__(self, get_local_ip_func, key_exchange_func, log_func=None, connection_pool=None,
+                 message_store=None, send_executor=None, get_public_key_func=None, group_keys=None,
+                 relay_threshold: Optional[int] = None, key_prefetch_func=None):
         self.get_local_ip = get_local_ip_func
         self.key_exchange = key_exchange_func
+        # Lance un échange de clés sans l'attendre (par défaut : échange immédiat, bloquant)
+        self.prefetch_key = key_prefetch_func if key_prefetch_func else self.key_exchange
+        self.get_public_key = get_public_key_func if get_public_key_func else lambda ip: None
         self.log = log_func if log_func else lambda msg: None
-        self.groupes = {}
-        self.TCP_PORT = 50001
+        self.connection_pool = connection_pool if connection_pool else ConnectionPool(log_func=self.log)
+        self.message_store = message_store if message_store else MessageStore()
+        self.group_keys = group_keys if group_keys else GroupKeyCache()
+        self.send_executor = send_executor if send_executor else ThreadPoolExecutor(
+            max_workers=SEND_WORKERS, thread_name_prefix="group-send")
+        # Au-delà de relay_threshold destinataires, diffusion par arbre de relais (None : toujours en direct)
+        self.relay_threshold = relay_threshold
+        self.relay_seen = SeenMessages()
+        self._retry_timers = set()
+        self._retry_lock = threading.Lock()
+        self._closed = False
+        self.groupes = {}  # nom -> {"membres": [...]} ; les messages sont dans la base
         
         # Fichier de persistance
         self.storage_dir = os.path.join(os.path.dirname(__file__), '..', 'storage')
-        self.groups_file = os.path.join(self.storage_dir, 'groups.json')
+        self.groups_file = os.path.join(self.storage_dir, 'groups.json')  # Ancien format, migré au démarrage
+        self.groups_journal = AppendOnlyJournal(os.path.join(self.storage_dir, 'groups.jsonl'), log_func=self.log)
         
         # Charger les groupes sauvegardés
         self._load_groups()
@@ -33,15 +93,20 @@ class GroupManager:
         self.log(f"[DEBUG] Création du groupe '{nom}' avec membres (incluant soi) : {membres}")
 
         self.groupes[nom] = {
-            "membres": membres,
-            "messages": []
+            "membres": membres
         }
         self.log(f"[INFO] Groupe '{nom}' créé avec les membres : {membres}")
         
         # Sauvegarder les groupes
-        self._save_groups()
+        self._journal_membres(nom)
+
+        # Échanges de clés lancés en parallèle ; la boucle ci-dessous attend chacun d'eux
+        for ip in membres:
+            if ip != my_ip:
+                self.prefetch_key(ip)
 
         # Notification des autres membres
+        cle = self.group_keys.get_outgoing(nom, membres)
         for ip in membres:
             if ip == my_ip:
                 self.log(f"[DEBUG] Je suis {ip}, je ne m'envoie pas JOINGROUP, Duh")
@@ -54,58 +119,271 @@ class GroupManager:
 
             try:
                 self.log(f"[DEBUG] Envoi de JOINGROUP à {ip}")
-                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                    s.connect((ip, self.TCP_PORT))
-                    group_info = f"JOINGROUP:{nom}:{','.join(membres)}"
-                    s.send(group_info.encode())
-                    self.log(f"[INFO] Notification de groupe '{nom}' envoyée à {ip}")
+                group_info = f"{nom}:{','.join(membres)}"
+                # La clé de groupe est transmise avec la notification, sur la même connexion
+                annonce = self._annonce_cle(cle, ip)
+                self.connection_pool.send(ip, encode_frame(FRAME_JOINGROUP, group_info.encode()) + annonce)
+                cle.mark_announced(ip)
+                self.log(f"[INFO] Notification de groupe '{nom}' envoyée à {ip}")
             except Exception as e:
                 self.log(f"[ERREUR] Impossible de notifier {ip} pour le groupe '{nom}' : {e}")
 
         return True
 
-    def envoyer_message_dans_groupe(self, nom: str, msg: str) -> bool:
-        """Envoie un message à tous les membres d'un groupe"""
+    def envoyer_message_dans_groupe(self, nom: str, msg: str,
+                                    on_remise: Optional[Callable[[bool], None]] = None) -> Optional[Dict[str, bool]]:
+        """
+        Envoie un message à tous les membres d'un groupe, en parallèle.
+        Retourne le résultat de l'envoi par membre (False si l'envoi a échoué ou n'a pas abouti
+        dans SEND_TIMEOUT secondes : l'échéance s'applique à la connexion et à l'écriture, le
+        résultat est donc bien celui de l'envoi ; ces membres sont relancés en arrière-plan),
+        ou None si le groupe n'existe pas.
+        En mode relais, le résultat d'un membre est celui de l'envoi à la tête de son sous-arbre.
+        `on_remise(True)` est appelé dès qu'un membre a reçu le message, éventuellement lors d'une
+        nouvelle tentative, `on_remise(False)` si tous les envois ont été abandonnés.
+        """
         if nom not in self.groupes:
             self.log(f"[ERREUR] Le groupe '{nom}' n'existe pas.")
-            return False
+            return None
 
         membres = self.groupes[nom]["membres"]
-        self.log(f"[DEBUG] Envoi d'un message dans le groupe '{nom}'")
-        self.log(f"[DEBUG] Membres du groupe '{nom}' : {membres}")
-
         self.log(f"[DEBUG] Envoi d'un message dans groupe '{nom}' aux membres : {membres}")
-        for ip in membres:
-            if ip == self.get_local_ip():
-                self.log(f"[DEBUG] Ignoré : moi-même ({ip})")
-                continue  # Ne pas s'envoyer à soi-même
-            
-            self.log(f"[DEBUG] Tentative d'envoi à {ip} pour le groupe '{nom}'")
-            self._envoyer_message_groupe(ip, nom, msg)
 
-        # Ajout du message localement
-        self.groupes[nom]["messages"].append(("Moi", msg))
+        # Ajout du message localement (il est conservé même si des membres sont injoignables)
+        self._record_message(nom, "Moi", msg)
         self.log(f"[DEBUG] Message ajouté localement dans groupe '{nom}'")
-        self.log(f"[INFO] Message envoyé au groupe '{nom}' : {msg}")
-        
-        # Sauvegarder les groupes
-        self._save_groups()
-        
-        return True
 
-    def _envoyer_message_groupe(self, ip: str, nom_groupe: str, msg: str) -> bool:
-        """Envoie un message de groupe à une IP spécifique"""
+        # Chiffrement unique : le même chiffré est envoyé à tous les membres
+        cle = self.group_keys.get_outgoing(nom, membres)
+        iv, ciphertext = CryptoManager.encrypt_aes(cle.key, msg.encode())
+        enveloppe = pack_group_envelope(cle.key_id, iv, ciphertext)
+
+        my_ip = self.get_local_ip()
+        destinataires = [ip for ip in membres if ip != my_ip]  # Ne pas s'envoyer à soi-même
+        # Un membre hors ligne ne retarde pas les autres : chaque envoi abandonne à l'échéance
+        echeance = time.monotonic() + SEND_TIMEOUT
+        if self.relay_threshold and len(destinataires) >= self.relay_threshold:
+            resultats = self._diffuser_par_relais(cle, enveloppe, my_ip, destinataires, echeance, on_remise)
+        else:
+            trame = encode_frame(FRAME_GROUPMSG, enveloppe)
+            suivi = _SuiviRemise(on_remise, len(destinataires)) if on_remise and destinataires else None
+            futures = {ip: self.send_executor.submit(self._envoyer_avec_relance, ip, cle, trame, 0, echeance, suivi)
+                       for ip in destinataires}
+            resultats = {ip: future.result() for ip, future in futures.items()}
+
+        echecs = [ip for ip, ok in resultats.items() if not ok]
+        if echecs:
+            self.log(f"[AVERTISSEMENT] Message du groupe '{nom}' non remis à {echecs}, nouvelle tentative en arrière-plan")
+        self.log(f"[INFO] Message envoyé au groupe '{nom}' ({len(resultats) - len(echecs)}/{len(resultats)} membres) : {msg}")
+        if on_remise and not destinataires:
+            on_remise(True)  # Seul membre du groupe : rien à remettre
+        return resultats
+
+    def _envoyer_avec_relance(self, ip: str, cle: OutgoingGroupKey, trame: bytes, tentative: int,
+                              echeance: Optional[float] = None, suivi: Optional[_SuiviRemise] = None) -> bool:
+        """Envoie le message au membre et planifie une nouvelle tentative en cas d'échec."""
+        nom_groupe = cle.group_name
+        if self._envoyer_message_groupe(ip, cle, trame, echeance):
+            if tentative:
+                self.log(f"[INFO] Message du groupe '{nom_groupe}' remis à {ip} (tentative {tentative + 1})")
+            if suivi:
+                suivi.remis()
+            return True
+        if tentative < len(RETRY_DELAYS):
+            self._planifier_relance(RETRY_DELAYS[tentative], self._envoyer_avec_relance, ip, cle, trame, tentative + 1,
+                                    None, suivi)
+        else:
+            self.log(f"[ERREUR] Abandon de l'envoi du message du groupe '{nom_groupe}' à {ip} "
+                     f"après {tentative + 1} tentatives")
+            if suivi:
+                suivi.abandon()
+        return False
+
+    def _planifier_relance(self, delai: float, func, *args):
+        """Soumet func(*args) à l'exécuteur d'envoi après `delai` secondes."""
+        def relancer():
+            with self._retry_lock:
+                self._retry_timers.discard(timer)
+                if self._closed:
+                    return
+            try:
+                self.send_executor.submit(func, *args)
+            except RuntimeError:
+                pass  # Exécuteur arrêté
+
+        timer = threading.Timer(delai, relancer)
+        timer.daemon = True
+        with self._retry_lock:
+            if self._closed:
+                return
+            self._retry_timers.add(timer)
+        timer.start()
+
+    def _annonce_cle(self, cle: OutgoingGroupKey, ip: str) -> bytes:
+        """Trame FRAME_GROUPKEY transmettant la clé de groupe au membre (chiffrée avec son certificat)."""
+        return encode_frame(FRAME_GROUPKEY, pack_group_key(cle.key_id, cle.group_name, self._cle_chiffree(cle, ip)))
+
+    def _cle_chiffree(self, cle: OutgoingGroupKey, ip: str) -> bytes:
+        """Clé de groupe chiffrée avec le certificat du membre (échange de clés si besoin)."""
+        cert_pem = self._certificat(ip)
+        if not cert_pem:
+            raise ValueError(f"clé publique de {ip} inconnue")
+        return cle.wrapped_for(ip, cert_pem.encode())
+
+    def _certificat(self, ip: str) -> Optional[str]:
+        cert_pem = self.get_public_key(ip)
+        if not cert_pem and self.key_exchange(ip):
+            cert_pem = self.get_public_key(ip)
+        return cert_pem
+
+    def _envoyer_message_groupe(self, ip: str, cle: OutgoingGroupKey, trame: bytes,
+                                echeance: Optional[float] = None) -> bool:
+        """Envoie un message de groupe chiffré à une IP spécifique, précédé de la clé si le membre ne l'a pas"""
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.connect((ip, self.TCP_PORT))
-                group_msg = f"GROUPMSG:{nom_groupe}:{msg}"
-                s.send(group_msg.encode())
-                self.log(f"[INFO] Message de groupe envoyé à {ip}")
-                return True
+            annonce = self._annonce_cle(cle, ip)
+            # La clé est aussi réannoncée sur chaque nouvelle connexion (le membre a pu redémarrer)
+            premier_envoi = not cle.is_announced(ip)
+            self.connection_pool.send(ip, annonce + trame if premier_envoi else trame, preamble=lambda: annonce,
+                                      deadline=echeance)
+            cle.mark_announced(ip)
+            self.log(f"[INFO] Message de groupe envoyé à {ip}")
+            return True
         except Exception as e:
             self.log(f"[ERREUR] Échec de l'envoi du message de groupe à {ip} : {e}")
             return False
 
+    # === DIFFUSION PAR RELAIS ===
+
+    def _diffuser_par_relais(self, cle: OutgoingGroupKey, enveloppe: bytes, my_ip: str,
+                             destinataires: List[str], echeance: Optional[float] = None,
+                             on_remise: Optional[Callable[[bool], None]] = None) -> Dict[str, bool]:
+        """
+        L'émetteur n'envoie le message qu'à ~log2(N) membres, têtes de sous-arbres qui le relaient
+        au reste de leur sous-arbre (voir network/group_relay.py).
+        La clé de groupe de l'émetteur, signée et chiffrée pour chaque membre, voyage avec le message :
+        l'émetteur ne contacte jamais directement tous les membres, même quand sa clé change.
+        La préparation des clés chiffrées (échanges de clés éventuels) est bornée par `echeance` ;
+        l'envoi aux têtes a sa propre échéance de SEND_TIMEOUT secondes.
+        """
+        futures = [self.send_executor.submit(self._cle_chiffree, cle, ip) for ip in destinataires]
+        wait(futures, timeout=None if echeance is None else max(0.0, echeance - time.monotonic()))
+        cles = []
+        for ip, future in zip(destinataires, futures):
+            if future.done() and future.exception() is None:
+                cles.append(future.result())
+            else:
+                # Le membre ne pourra pas lire ce message ; il le relaiera quand même s'il connaît déjà la clé
+                self.log(f"[ERREUR] Clé du groupe '{cle.group_name}' non chiffrée pour {ip} : "
+                         f"{future.exception() if future.done() else 'échéance dépassée'}")
+                cles.append(b'')
+        cle_relais = RelayKey(cle.key_id, cle.group_name, cle.signature(), cles)
+
+        msg_id = os.urandom(RELAY_ID_SIZE)
+        self.relay_seen.add(msg_id)
+        echeance_relais = time.monotonic() + SEND_TIMEOUT
+        sous_arbres = list(self._repartir(destinataires, cle_relais))
+        suivi = _SuiviRemise(on_remise, len(sous_arbres)) if on_remise else None
+        futures = [(sous_arbre, self.send_executor.submit(self._relayer_avec_relance, sous_arbre, cles_sous_arbre,
+                                                          msg_id, my_ip, enveloppe, 0, echeance_relais, suivi))
+                   for sous_arbre, cles_sous_arbre in sous_arbres]
+        return {ip: future.result() for sous_arbre, future in futures for ip in sous_arbre}
+
+    @staticmethod
+    def _repartir(destinataires: List[str], cle_relais: RelayKey):
+        """Sous-arbres de destinataires, chacun avec sa part des clés chiffrées (alignées sur `destinataires`)."""
+        debut = 0
+        for sous_arbre in split_subtrees(destinataires, relay_fanout(len(destinataires))):
+            fin = debut + len(sous_arbre)
+            yield sous_arbre, cle_relais._replace(wrapped=cle_relais.wrapped[debut:fin])
+            debut = fin
+
+    def _relayer(self, sous_arbre: List[str], cle_relais: RelayKey, msg_id: bytes, origine: str, enveloppe: bytes,
+                 echeance: Optional[float] = None) -> bool:
+        """
+        Envoie le message à la tête du sous-arbre avec la liste des membres qu'elle doit relayer
+        et leurs clés chiffrées. Si la tête est injoignable, le membre suivant du sous-arbre prend sa place.
+        """
+        for i, tete in enumerate(sous_arbre):
+            cle_tete = cle_relais._replace(wrapped=cle_relais.wrapped[i:])
+            trame = encode_frame(FRAME_GROUPRELAY, pack_relay(msg_id, origine, sous_arbre[i + 1:], cle_tete, enveloppe))
+            try:
+                self.connection_pool.send(tete, trame, deadline=echeance)
+                return True
+            except Exception as e:
+                self.log(f"[ERREUR] Relais du message de groupe vers {tete} impossible : {e}")
+        return False
+
+    def _relayer_avec_relance(self, sous_arbre: List[str], cle_relais: RelayKey, msg_id: bytes, origine: str,
+                              enveloppe: bytes, tentative: int, echeance: Optional[float] = None,
+                              suivi: Optional[_SuiviRemise] = None) -> bool:
+        if self._relayer(sous_arbre, cle_relais, msg_id, origine, enveloppe, echeance):
+            if suivi:
+                suivi.remis()
+            return True
+        if tentative < len(RETRY_DELAYS):
+            self._planifier_relance(RETRY_DELAYS[tentative], self._relayer_avec_relance, sous_arbre, cle_relais,
+                                    msg_id, origine, enveloppe, tentative + 1, None, suivi)
+        else:
+            self.log(f"[ERREUR] Abandon du relais du message de groupe {msg_id.hex()} vers {sous_arbre}")
+            if suivi:
+                suivi.abandon()
+        return False
+
+    def traiter_relais_groupe(self, data: bytes, addr: str) -> Optional[Tuple[str, str, str]]:
+        """
+        Traite un message de groupe relayé : enregistre la clé de l'émetteur d'origine jointe à la
+        trame si elle est nouvelle (signature vérifiée), déchiffre le message, puis le transmet au
+        sous-arbre confié à ce membre.
+        Le message n'est relayé que si le groupe est connu localement et que l'émetteur d'origine
+        et tous les destinataires en sont membres : sinon la trame est ignorée (pas de relais ouvert).
+        Retourne (nom du groupe, émetteur d'origine, message), ou None (doublon, clé inconnue, trame refusée).
+        """
+        try:
+            relais = unpack_relay(data)
+        except Exception as e:
+            self.log(f"[ERREUR] Trame de relais invalide reçue de {addr} : {e}")
+            return None
+        if relais.msg_id in self.relay_seen:
+            self.log(f"[DEBUG] Message de groupe {relais.msg_id.hex()} déjà reçu, ignoré")
+            return None
+
+        enveloppe = bytes(relais.envelope)
+        if not self._accepter_cle_relayee(relais.origin, relais.key):
+            return None
+        dechiffre = self._dechiffrer_message_groupe(enveloppe, relais.origin)
+        if dechiffre is None:
+            return None
+        nom, msg = dechiffre
+        groupe = self.groupes.get(nom)
+        membres = set(groupe["membres"]) if groupe else set()
+        if relais.origin not in membres or not membres.issuperset(relais.targets):
+            self.log(f"[AVERTISSEMENT] Relais de {addr} refusé : émetteur ou destinataires hors du groupe '{nom}'")
+            return None
+        # Marqué comme reçu une fois validé : une trame forgée ne peut pas bloquer le vrai message
+        if not self.relay_seen.add(relais.msg_id):
+            return None
+
+        # Le relais ne bloque pas le thread de réception
+        cles_destinataires = relais.key._replace(wrapped=relais.key.wrapped[1:])
+        for sous_arbre, cles_sous_arbre in self._repartir(relais.targets, cles_destinataires):
+            self.send_executor.submit(self._relayer_avec_relance, sous_arbre, cles_sous_arbre, relais.msg_id,
+                                      relais.origin, enveloppe, 0, time.monotonic() + SEND_TIMEOUT)
+
+        if not self.traiter_message_groupe(f"GROUPMSG:{nom}:{msg}", relais.origin):
+            return None
+        return nom, relais.origin, msg
+
+    def close(self):
+        """Annule les nouvelles tentatives en attente et écrit le journal des groupes sur disque."""
+        with self._retry_lock:
+            self._closed = True
+            timers = list(self._retry_timers)
+            self._retry_timers.clear()
+        for timer in timers:
+            timer.cancel()
+        self.send_executor.shutdown(wait=False, cancel_futures=True)
+        self.groups_journal.close()
+
     def traiter_message_groupe(self, data: str, addr: str) -> bool:
         """Traite un message de groupe reçu"""
         try:
@@ -115,27 +393,91 @@ class GroupManager:
 
                 if nom not in self.groupes:
                     self.groupes[nom] = {
-                        "membres": [addr],  # on initialise au moins avec l'expéditeur
-                        "messages": []
+                        "membres": [addr]  # on initialise au moins avec l'expéditeur
                     }
                     self.log(f"[INFO] Message de groupe reçu pour groupe inconnu '{nom}', groupe créé avec {addr}")
+                    self._journal_membres(nom)
                 else:
                     if addr not in self.groupes[nom]["membres"]:
                         self.groupes[nom]["membres"].append(addr)
                         self.log(f"[DEBUG] Ajout du nouvel expéditeur {addr} au groupe existant '{nom}'")
 
             self.log(f"[DEBUG] Message de groupe reçu de {addr} pour '{nom}' : {msg}")
-            self.groupes[nom]["messages"].append((addr, msg))
+            self._record_message(nom, addr, msg)
             self.log(f"[INFO] Message de {addr} reçu dans le groupe '{nom}' : {msg}")
             
-            # Sauvegarder les groupes
-            self._save_groups()
-            
             return True
         except Exception as e:
             self.log(f"[ERREUR] Mauvais format de message GROUPMSG : {e}")
             return False
 
+    def _accepter_cle_relayee(self, origine: str, cle: RelayKey) -> bool:
+        """
+        Enregistre la clé de groupe de l'émetteur d'origine jointe à un relais, si elle est nouvelle.
+        Sa signature est vérifiée avec le certificat de l'émetteur : un relais ne peut pas imposer
+        une clé au nom d'un autre membre.
+        """
+        if self.group_keys.get_incoming(origine, cle.key_id) is not None:
+            return True  # Déjà connue : ni RSA ni vérification de signature
+        if not cle.wrapped[0]:
+            self.log(f"[ERREUR] Clé du groupe '{cle.group_name}' de {origine} absente du relais")
+            return False
+        cert_pem = self._certificat(origine)
+        if not cert_pem:
+            self.log(f"[ERREUR] Clé relayée du groupe '{cle.group_name}' ignorée : clé publique de {origine} inconnue")
+            return False
+        try:
+            key = CryptoManager.decrypt_with_private_key(cle.wrapped[0])
+        except Exception as e:
+            self.log(f"[ERREUR] Clé relayée du groupe '{cle.group_name}' de {origine} illisible : {e}")
+            return False
+        if not CryptoManager.verify_with_cert(cert_pem.encode(), cle.signature,
+                                              signed_key_data(cle.key_id, cle.group_name, key)):
+            self.log(f"[AVERTISSEMENT] Clé relayée du groupe '{cle.group_name}' refusée : signature de {origine} invalide")
+            return False
+        self.group_keys.store_incoming(origine, cle.group_name, cle.key_id, key)
+        self.log(f"[DEBUG] Clé du groupe '{cle.group_name}' ({cle.key_id.hex()}) de {origine} reçue par relais")
+        return True
+
+    def traiter_cle_groupe(self, data: bytes, addr: str) -> bool:
+        """Déchiffre et enregistre la clé de groupe annoncée par un membre"""
+        try:
+            key_id, nom, encrypted_key = unpack_group_key(data)
+            self.group_keys.store_incoming(addr, nom, key_id, CryptoManager.decrypt_with_private_key(encrypted_key))
+            self.log(f"[DEBUG] Clé du groupe '{nom}' ({key_id.hex()}) reçue de {addr}")
+            return True
+        except Exception as e:
+            self.log(f"[ERREUR] Clé de groupe invalide reçue de {addr} : {e}")
+            return False
+
+    def traiter_message_groupe_chiffre(self, data: bytes, addr: str) -> Optional[Tuple[str, str]]:
+        """
+        Déchiffre un message de groupe avec la clé annoncée par l'expéditeur et l'enregistre.
+        Retourne (nom du groupe, message), ou None si la clé est inconnue.
+        """
+        dechiffre = self._dechiffrer_message_groupe(data, addr)
+        if dechiffre is None:
+            return None
+        nom, msg = dechiffre
+        if not self.traiter_message_groupe(f"GROUPMSG:{nom}:{msg}", addr):
+            return None
+        return nom, msg
+
+    def _dechiffrer_message_groupe(self, data: bytes, addr: str) -> Optional[Tuple[str, str]]:
+        """Déchiffre un message de groupe sans l'enregistrer ; retourne (nom du groupe, message) ou None."""
+        try:
+            envelope = unpack_envelope(data)
+            entry = self.group_keys.get_incoming(addr, bytes(envelope.session_id))
+            if entry is None:
+                self.log(f"[ERREUR] Message de groupe de {addr} chiffré avec une clé inconnue")
+                return None
+            nom, key = entry
+            msg = CryptoManager.decrypt_aes(key, envelope.iv, envelope.ciphertext).decode()
+        except Exception as e:
+            self.log(f"[ERREUR] Message de groupe chiffré invalide reçu de {addr} : {e}")
+            return None
+        return nom, msg
+
     def traiter_join_groupe(self, data: str, addr: str) -> bool:
         """Traite une demande de rejoindre un groupe"""
         try:
@@ -145,8 +487,7 @@ class GroupManager:
 
             if nom not in self.groupes:
                 self.groupes[nom] = {
-                    "membres": [],
-                    "messages": []
+                    "membres": []
                 }
                 self.log(f"[INFO] Nouveau groupe '{nom}' ajouté localement.")
 
@@ -157,14 +498,14 @@ class GroupManager:
             self.log(f"[INFO] Groupe '{nom}' mis à jour avec membres : {self.groupes[nom]['membres']}")
             
             # Sauvegarder les groupes
-            self._save_groups()
+            self._journal_membres(nom)
 
-            # Échange de clés publiques avec les autres membres
+            # Échange de clés publiques avec les autres membres, en arrière-plan et en parallèle
             my_ip = self.get_local_ip()
             for ip in membres:
                 if ip != my_ip:
                     self.log(f"[DEBUG] Tentative d'échange de clé avec {ip} à la réception du groupe")
-                    self.key_exchange(ip)
+                    self.prefetch_key(ip)
 
             return True
         except Exception as e:
@@ -180,11 +521,23 @@ class GroupManager:
         return self.groupes.get(nom)
 
     def get_messages_groupe(self, nom: str) -> List[Tuple[str, str]]:
-        """Retourne les messages d'un groupe"""
+        """Retourne tous les messages d'un groupe (préférer get_page_groupe pour l'affichage)"""
         if nom in self.groupes:
-            return self.groupes[nom]["messages"]
+            return [(m.sender, m.content) for m in self.message_store.get_group_page(nom, limit=None)]
         return []
 
+    def get_page_groupe(self, nom: str, limit: int = PAGE_SIZE,
+                        before_id: Optional[int] = None) -> List[StoredGroupMessage]:
+        """
+        Retourne une page des messages d'un groupe, dans l'ordre chronologique.
+        Pour charger les messages plus anciens, passer l'identifiant du premier message de la page.
+        """
+        return self.message_store.get_group_page(nom, limit=limit, before_id=before_id)
+
+    def rechercher_messages(self, texte: str, limit: int = PAGE_SIZE, offset: int = 0) -> List[SearchResult]:
+        """Recherche plein texte dans les messages de tous les groupes, les plus pertinents en premier"""
+        return self.message_store.search(texte, scope=SEARCH_GROUP, limit=limit, offset=offset)
+
     def get_membres_groupe(self, nom: str) -> List[str]:
         """Retourne les membres d'un groupe"""
         if nom in self.groupes:
@@ -195,6 +548,9 @@ class GroupManager:
         """Supprime un groupe"""
         if nom in self.groupes:
             del self.groupes[nom]
+            self.group_keys.rotate(nom)
+            self.groups_journal.append({'op': 'delete', 'nom': nom})
+            self.message_store.clear_group_messages(nom)
             self.log(f"[INFO] Groupe '{nom}' supprimé")
             return True
         return False
@@ -203,6 +559,7 @@ class GroupManager:
         """Ajoute un membre à un groupe existant"""
         if nom in self.groupes and ip not in self.groupes[nom]["membres"]:
             self.groupes[nom]["membres"].append(ip)
+            self._journal_membres(nom)
             self.log(f"[INFO] Membre {ip} ajouté au groupe '{nom}'")
             return True
         return False
@@ -211,6 +568,7 @@ class GroupManager:
         """Retire un membre d'un groupe"""
         if nom in self.groupes and ip in self.groupes[nom]["membres"]:
             self.groupes[nom]["membres"].remove(ip)
+            self._journal_membres(nom)
             self.log(f"[INFO] Membre {ip} retiré du groupe '{nom}'")
             return True
         return False
@@ -218,32 +576,59 @@ class GroupManager:
     def clear_group_messages(self, nom: str) -> bool:
         """Efface tous les messages d'un groupe spécifique"""
         if nom in self.groupes:
-            self.groupes[nom]["messages"].clear()
+            self.message_store.clear_group_messages(nom)
             self.log(f"[INFO] Tous les messages du groupe '{nom}' ont été effacés")
-            # Sauvegarder les groupes
-            self._save_groups()
             return True
         return False
 
     def clear_all_group_messages(self) -> bool:
         """Efface tous les messages de tous les groupes"""
-        for nom in self.groupes:
-            self.groupes[nom]["messages"].clear()
+        self.message_store.clear_group_messages()
         self.log(f"[INFO] Tous les messages de tous les groupes ont été effacés")
-        # Sauvegarder les groupes
-        self._save_groups()
         return True
 
     def _load_groups(self):
-        """Charge les groupes sauvegardés"""
-        if os.path.exists(self.groups_file):
-            with open(self.groups_file, 'r') as f:
-                self.groupes = json.load(f)
-        else:
-            self.groupes = {}
-
-    def _save_groups(self):
-        """Sauvegarde les groupes"""
-        os.makedirs(self.storage_dir, exist_ok=True)
-        with open(self.groups_file, 'w') as f:
-            json.dump(self.groupes, f, indent=2) 
\ No newline at end of file
+        """
+        Charge les membres des groupes en rejouant le journal (après migration de l'ancien groups.json).
+        Les messages encore présents dans le journal (anciennes versions) sont importés dans la base.
+        """
+        self.groups_journal.import_legacy(self.groups_file, self._group_records)
+        self.groupes = {}
+        anciens_messages = {}  # nom -> [(expéditeur, message)]
+        for record in self.groups_journal.replay():
+            op, nom = record.get('op'), record.get('nom')
+            if op == 'group':
+                self.groupes.setdefault(nom, {"membres": []})["membres"] = record['membres']
+            elif op == 'msg':
+                self.groupes.setdefault(nom, {"membres": []})
+                anciens_messages.setdefault(nom, []).append((record['from'], record['msg']))
+            elif op == 'clear':
+                anciens_messages.pop(nom, None)
+            elif op == 'delete':
+                self.groupes.pop(nom, None)
+                anciens_messages.pop(nom, None)
+        if anciens_messages:
+            count = self.message_store.import_group_messages(
+                (nom, expediteur, msg) for nom, messages in anciens_messages.items() for expediteur, msg in messages
+            )
+            self.log(f"[INFO] {count} messages de groupe importés dans la base de données")
+        if anciens_messages or self.groups_journal.needs_compaction(len(self.groupes)):
+            self.groups_journal.compact(self._group_records())
+
+    def _journal_membres(self, nom: str):
+        """Enregistre la liste des membres d'un groupe dans le journal"""
+        self.groups_journal.append({'op': 'group', 'nom': nom, 'membres': list(self.groupes[nom]["membres"])})
+
+    def _record_message(self, nom: str, expediteur: str, msg: str):
+        """Ajoute un message de groupe à l'historique (une ligne indexée, sans réécrire les groupes)"""
+        self.message_store.add_group_message(nom, expediteur, msg)
+
+    def _group_records(self, groupes: Optional[Dict] = None) -> List[Dict]:
+        """État des groupes sous forme d'enregistrements de journal (migration et compaction)"""
+        records = []
+        for nom, groupe in (self.groupes if groupes is None else groupes).items():
+            records.append({'op': 'group', 'nom': nom, 'membres': list(groupe.get("membres", []))})
+            # Seul l'import de l'ancien groups.json contient encore des messages
+            for expediteur, msg in groupe.get("messages", []):
+                records.append({'op': 'msg', 'nom': nom, 'from': expediteur, 'msg': msg})
+        return records
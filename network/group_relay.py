@@ -0,0 +1,135 @@
+import math
+import socket
+import struct
+import threading
+from collections import OrderedDict
+from typing import List, NamedTuple, Tuple, Union
+from network.envelope import GROUP_KEY_ID_SIZE
+
+# Relais des messages de groupe (trame FRAME_GROUPRELAY) :
+#   identifiant du message (16) + IP de l'émetteur d'origine (4) + nombre de destinataires (2)
+#   + IP des destinataires (4 chacune)
+#   + clé de groupe de l'émetteur d'origine : identifiant (8) + nom du groupe (2 + n)
+#     + signature de l'émetteur (2 + n) + clé chiffrée pour le membre qui reçoit la trame puis
+#     pour chaque destinataire, dans le même ordre (2 + n chacune)
+#   + enveloppe de groupe chiffrée par l'émetteur d'origine
+# Le membre qui reçoit la trame lit le message, puis la transmet à son tour au sous-arbre de
+# destinataires qui lui est confié, avec leurs clés chiffrées : l'émetteur n'a jamais à
+# contacter directement tous les membres, même quand sa clé de groupe change.
+RELAY_ID_SIZE = 16
+RELAY_HEADER = struct.Struct('!16s4sH')
+LENGTH_HEADER = struct.Struct('!H')
+ADDRESS_SIZE = 4
+SEEN_CACHE_SIZE = 4096  # Identifiants de messages déjà reçus, pour ignorer les doublons
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+class RelayError(ValueError):
+    """Trame de relais invalide."""
+
+
+class RelayKey(NamedTuple):
+    """Clé de groupe de l'émetteur d'origine ; `wrapped[i]` est chiffrée pour le i-ème membre."""
+    key_id: bytes
+    group_name: str
+    signature: bytes
+    wrapped: List[bytes]
+
+
+class RelayFrame(NamedTuple):
+    msg_id: bytes
+    origin: str
+    targets: List[str]
+    key: RelayKey  # wrapped[0] : membre qui reçoit la trame, wrapped[i + 1] : targets[i]
+    envelope: memoryview
+
+
+def signed_key_data(key_id: bytes, group_name: str, key: bytes) -> bytes:
+    """Données signées par l'émetteur d'origine pour attester sa clé de groupe."""
+    return b''.join((key_id, group_name.encode(), key))
+
+
+def pack_relay(msg_id: bytes, origin: str, targets: List[str], key: RelayKey, envelope: bytes) -> bytes:
+    if len(key.wrapped) != len(targets) + 1:
+        raise RelayError("Une clé chiffrée est attendue par destinataire")
+    header = RELAY_HEADER.pack(msg_id, socket.inet_aton(origin), len(targets))
+    fields = (key.group_name.encode(), key.signature, *key.wrapped)
+    return b''.join((header, *(socket.inet_aton(ip) for ip in targets), key.key_id,
+                     *(LENGTH_HEADER.pack(len(field)) + field for field in fields), envelope))
+
+
+def unpack_relay(data: BytesLike) -> RelayFrame:
+    """Découpe une trame de relais ; l'enveloppe est une vue sur `data`."""
+    view = memoryview(data)
+    if len(view) < RELAY_HEADER.size:
+        raise RelayError("Trame de relais tronquée")
+    msg_id, origin, count = RELAY_HEADER.unpack_from(view)
+    offset = RELAY_HEADER.size + count * ADDRESS_SIZE
+    if len(view) < offset + GROUP_KEY_ID_SIZE:
+        raise RelayError("Trame de relais tronquée")
+    targets = [socket.inet_ntoa(view[start:start + ADDRESS_SIZE])
+               for start in range(RELAY_HEADER.size, offset, ADDRESS_SIZE)]
+    key_id = bytes(view[offset:offset + GROUP_KEY_ID_SIZE])
+    offset += GROUP_KEY_ID_SIZE
+    fields = []
+    for _ in range(count + 3):  # Nom du groupe, signature, clés chiffrées
+        field, offset = _read_field(view, offset)
+        fields.append(field)
+    if len(view) <= offset:
+        raise RelayError("Trame de relais tronquée")
+    key = RelayKey(key_id, fields[0].decode(), fields[1], fields[2:])
+    return RelayFrame(msg_id, socket.inet_ntoa(origin), targets, key, view[offset:])
+
+
+def _read_field(view: memoryview, offset: int) -> Tuple[bytes, int]:
+    if len(view) < offset + LENGTH_HEADER.size:
+        raise RelayError("Trame de relais tronquée")
+    (size,) = LENGTH_HEADER.unpack_from(view, offset)
+    start = offset + LENGTH_HEADER.size
+    if len(view) < start + size:
+        raise RelayError("Trame de relais tronquée")
+    return bytes(view[start:start + size]), start + size
+
+
+def relay_fanout(count: int) -> int:
+    """Nombre de membres contactés directement pour `count` destinataires (~log2 N)."""
+    return max(2, math.ceil(math.log2(count + 1)))
+
+
+def split_subtrees(targets: List[str], fanout: int) -> List[List[str]]:
+    """Répartit les destinataires en `fanout` sous-arbres de tailles égales (à un près)."""
+    fanout = min(fanout, len(targets))
+    if not fanout:
+        return []
+    size, extra = divmod(len(targets), fanout)
+    subtrees, start = [], 0
+    for i in range(fanout):
+        end = start + size + (1 if i < extra else 0)
+        subtrees.append(targets[start:end])
+        start = end
+    return subtrees
+
+
+class SeenMessages:
+    """Ensemble borné (LRU) des identifiants de messages déjà traités."""
+
+    def __init__(self, capacity: int = SEEN_CACHE_SIZE):
+        self.capacity = capacity
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, msg_id: bytes) -> bool:
+        with self._lock:
+            return msg_id in self._ids
+
+    def add(self, msg_id: bytes) -> bool:
+        """Retourne True si l'identifiant est nouveau (et le mémorise), False pour un doublon."""
+        with self._lock:
+            if msg_id in self._ids:
+                self._ids.move_to_end(msg_id)
+                return False
+            self._ids[msg_id] = None
+            if len(self._ids) > self.capacity:
+                self._ids.popitem(last=False)
+            return True
@@ -0,0 +1,128 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional
+
+PREFETCH_WORKERS = 4  # Échanges de clés simultanés lancés en arrière-plan
+EXCHANGE_TIMEOUT = 10.0  # Attente maximale d'un échange déjà en cours (connexion et lecture : 5 s chacune)
+
+
+class _Exchange:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = False
+        self.started = False  # Pris en charge par un thread (verrou du KeyPrefetcher tenu)
+
+
+class KeyPrefetcher:
+    """
+    Échanges de clés publiques anticipés.
+    `prefetch(ip)` lance l'échange en arrière-plan (au plus `max_workers` à la fois) dès qu'un
+    pair est découvert, pour que le premier envoi n'ait plus à attendre la connexion et l'aller-retour
+    des clés. Un seul échange est en cours par pair : `exchange(ip)`, appelé par les chemins d'envoi,
+    attend celui qui est déjà lancé (au plus `exchange_timeout` secondes) au lieu d'en démarrer un second ;
+    un échange encore en file derrière les autres est repris et exécuté dans le thread appelant.
+    `exchange_func(ip) -> bool` effectue l'échange ; `has_key_func(ip) -> bool` indique si la clé est connue.
+    """
+
+    def __init__(self, exchange_func: Callable[[str], bool], has_key_func: Callable[[str], bool],
+                 max_workers: int = PREFETCH_WORKERS, exchange_timeout: float = EXCHANGE_TIMEOUT, log_func=None):
+        self.exchange_func = exchange_func
+        self.exchange_timeout = exchange_timeout
+        self.has_key = has_key_func
+        self.log = log_func if log_func else lambda msg: None
+        self._in_flight: Dict[str, _Exchange] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="key-prefetch")
+        self._closed = False
+
+    def prefetch(self, ip: str) -> bool:
+        """Lance l'échange de clés avec ce pair en arrière-plan. Retourne False si rien n'est à faire."""
+        if self.has_key(ip):
+            return False
+        with self._lock:
+            if self._closed or ip in self._in_flight:
+                return False
+            exchange = self._in_flight[ip] = _Exchange()
+        self.log(f"[DEBUG] Échange de clé anticipé avec {ip}")
+        try:
+            self._executor.submit(self._run_queued, ip, exchange)
+        except RuntimeError:
+            # Pool arrêté entre-temps
+            self._finish(ip, exchange, False)
+            return False
+        return True
+
+    def prefetch_all(self, ips: Iterable[str]) -> None:
+        for ip in ips:
+            self.prefetch(ip)
+
+    def exchange(self, ip: str, timeout: Optional[float] = None) -> bool:
+        """
+        Échange les clés avec ce pair dans le thread appelant, ou attend l'échange déjà en cours
+        (au plus `timeout` secondes, `exchange_timeout` par défaut). Un échange anticipé qui attend
+        encore un thread libre est exécuté ici plutôt qu'après ceux qui le précèdent.
+        Retourne True si la clé du pair est connue à la fin.
+        """
+        if self.has_key(ip):
+            return True
+        with self._lock:
+            exchange = self._in_flight.get(ip)
+            if exchange is None:
+                exchange = self._in_flight[ip] = _Exchange()
+            owner = not exchange.started
+            exchange.started = True
+        if owner:
+            self._run(ip, exchange)
+        elif not exchange.done.wait(self.exchange_timeout if timeout is None else timeout):
+            return False
+        return exchange.result
+
+    def is_ready(self, ip: str) -> bool:
+        """Vrai si la clé du pair est connue : l'envoi ne demandera pas d'échange."""
+        return self.has_key(ip)
+
+    def is_pending(self, ip: str) -> bool:
+        with self._lock:
+            return ip in self._in_flight
+
+    def wait_ready(self, ip: str, timeout: Optional[float] = None) -> bool:
+        """Attend la fin de l'échange en cours avec ce pair (sans en lancer) ; retourne is_ready(ip)."""
+        with self._lock:
+            exchange = self._in_flight.get(ip)
+        if exchange is not None:
+            exchange.done.wait(timeout)
+        return self.has_key(ip)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        # Les échanges annulés avant d'avoir démarré ne doivent pas bloquer ceux qui les attendent
+        with self._lock:
+            abandoned = list(self._in_flight.values())
+        for exchange in abandoned:
+            exchange.done.set()
+
+    def _run_queued(self, ip: str, exchange: _Exchange):
+        """Échange anticipé sorti de la file : ignoré s'il a déjà été repris par un envoi."""
+        with self._lock:
+            if exchange.started:
+                return
+            exchange.started = True
+        self._run(ip, exchange)
+
+    def _run(self, ip: str, exchange: _Exchange):
+        result = False
+        try:
+            result = self.exchange_func(ip)
+        except Exception as e:
+            self.log(f"[ERREUR] Échec de l'échange de clé avec {ip} : {e}")
+        finally:
+            self._finish(ip, exchange, result)
+
+    def _finish(self, ip: str, exchange: _Exchange, result: bool):
+        exchange.result = result
+        with self._lock:
+            if self._in_flight.get(ip) is exchange:
+                del self._in_flight[ip]
+        exchange.done.set()
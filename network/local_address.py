@@ -0,0 +1,179 @@
+import ipaddress
+import socket
+import struct
+import sys
+import threading
+import time
+from typing import Callable, List, Optional
+
+LOCAL_IP_TTL = 30  # Secondes avant de revérifier l'adresse (filet de sécurité si netlink est indisponible)
+FALLBACK_IP = "127.0.0.1"
+# Adresse privée utilisée pour choisir l'interface de sortie : connect() sur une socket UDP
+# n'envoie aucun paquet, il suffit d'une route (pas besoin d'accès à Internet)
+PROBE_ADDRESS = ("10.254.254.254", 1)
+
+# Netlink (Linux) : notification des changements d'adresse et d'interface
+_RTMGRP_LINK = 0x1
+_RTMGRP_IPV4_IFADDR = 0x10
+_SIOCGIFADDR = 0x8915
+
+
+class LocalAddressService:
+    """
+    Adresse IPv4 locale partagée par les modules réseau.
+    Résolue une seule fois puis mise en cache ; le cache est invalidé par les notifications
+    netlink (Linux) quand une interface ou une adresse change, et expire après LOCAL_IP_TTL secondes.
+    Fonctionne hors ligne : seule une route vers le réseau local est nécessaire.
+    """
+
+    def __init__(self, ttl: float = LOCAL_IP_TTL, log_func=None):
+        self.ttl = ttl
+        self.log = log_func if log_func else lambda msg: None
+        self._lock = threading.Lock()
+        self._address: Optional[str] = None
+        self._resolved_at = 0.0
+        self._listeners: List[Callable[[str, str], None]] = []
+        self._monitor: Optional[threading.Thread] = None
+        self._netlink: Optional[socket.socket] = None
+
+    def get(self) -> str:
+        """Retourne l'adresse locale (depuis le cache tant qu'il est valide)."""
+        with self._lock:
+            if self._address is not None and time.monotonic() - self._resolved_at < self.ttl:
+                return self._address
+        return self.refresh()
+
+    def refresh(self) -> str:
+        """Résout à nouveau l'adresse locale et prévient les abonnés si elle a changé."""
+        address = self._resolve()
+        with self._lock:
+            previous = self._address
+            self._address = address
+            self._resolved_at = time.monotonic()
+            listeners = list(self._listeners) if previous not in (None, address) else []
+        if listeners:
+            self.log(f"[INFO] Adresse locale modifiée : {previous} -> {address}")
+        for listener in listeners:
+            try:
+                listener(previous, address)
+            except Exception as e:
+                self.log(f"[ERREUR] Erreur dans un abonné au changement d'adresse : {e}")
+        return address
+
+    def invalidate(self) -> None:
+        """Force une nouvelle résolution au prochain appel de get()."""
+        with self._lock:
+            self._resolved_at = 0.0
+
+    def add_listener(self, callback: Callable[[str, str], None]) -> None:
+        """callback(ancienne_adresse, nouvelle_adresse) est appelé quand l'adresse change."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def start_monitoring(self) -> bool:
+        """Surveille les changements d'interface via netlink. Retourne False si indisponible (hors Linux)."""
+        if self._monitor is not None:
+            return True
+        if not sys.platform.startswith("linux"):
+            return False
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+            sock.bind((0, _RTMGRP_LINK | _RTMGRP_IPV4_IFADDR))
+        except (OSError, AttributeError) as e:
+            self.log(f"[DEBUG] Surveillance netlink indisponible ({e}), expiration du cache seule")
+            return False
+        self._netlink = sock
+        self._monitor = threading.Thread(target=self._monitor_loop, name="local-address", daemon=True)
+        self._monitor.start()
+        return True
+
+    def stop_monitoring(self) -> None:
+        if self._netlink is not None:
+            try:
+                self._netlink.close()
+            except OSError:
+                pass
+        self._netlink = None
+        self._monitor = None
+
+    def _monitor_loop(self):
+        sock = self._netlink
+        while sock is not None and self._netlink is sock:
+            try:
+                if not sock.recv(65536):
+                    break
+            except OSError:
+                break
+            # Une rafale de messages accompagne souvent un changement : une seule résolution suffit
+            self.invalidate()
+            self.refresh()
+
+    # === RÉSOLUTION ===
+
+    def _resolve(self) -> str:
+        for resolver in (self._from_route, self._from_interfaces, self._from_hostname):
+            try:
+                address = resolver()
+            except OSError:
+                address = None
+            if address:
+                return address
+        return FALLBACK_IP
+
+    @staticmethod
+    def _from_route() -> Optional[str]:
+        """Adresse de l'interface qui porte la route vers un réseau privé (ou la route par défaut)."""
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(PROBE_ADDRESS)
+            address = s.getsockname()[0]
+        return address if _is_usable(address) else None
+
+    @staticmethod
+    def _from_interfaces() -> Optional[str]:
+        """Parcourt les interfaces (Linux) : utile hors ligne, sans route par défaut."""
+        if not sys.platform.startswith("linux"):
+            return None
+        import fcntl
+        candidates = []
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            for _, name in socket.if_nameindex():
+                try:
+                    request = struct.pack('256s', name.encode()[:15])
+                    address = socket.inet_ntoa(fcntl.ioctl(s.fileno(), _SIOCGIFADDR, request)[20:24])
+                except OSError:
+                    continue  # Interface sans adresse IPv4
+                if _is_usable(address):
+                    candidates.append(address)
+        # Les adresses privées (réseau local) sont préférées
+        candidates.sort(key=lambda address: not ipaddress.ip_address(address).is_private)
+        return candidates[0] if candidates else None
+
+    @staticmethod
+    def _from_hostname() -> Optional[str]:
+        for address in socket.gethostbyname_ex(socket.gethostname())[2]:
+            if _is_usable(address):
+                return address
+        return None
+
+
+def _is_usable(address: str) -> bool:
+    ip = ipaddress.ip_address(address)
+    return not (ip.is_loopback or ip.is_unspecified or ip.is_link_local)
+
+
+_service: Optional[LocalAddressService] = None
+_service_lock = threading.Lock()
+
+
+def get_local_address_service() -> LocalAddressService:
+    """Retourne l'instance partagée du service d'adresse locale."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = LocalAddressService()
+        return _service
+
+
+def get_local_ip() -> str:
+    """Raccourci : adresse locale depuis le service partagé."""
+    return get_local_address_service().get()
@@ -1,48 +1,108 @@
 import socket
 import json
 import os
-from typing import Dict, List, Tuple, Optional, Callable
+from typing import Dict, List, Tuple, Optional, Callable, Union
 from app.crypto_manager import CryptoManager
+from network.connection_pool import ConnectionPool
+from network.protocol import FrameDecoder, ProtocolError, encode_frame, FRAME_PUBKEY, FRAME_DIRECT, FRAME_SESSION_KEY
+from network.outbox import Outbox
+from network.key_prefetch import KeyPrefetcher
+from network.envelope import (
+    ENVELOPE_SESSION, is_envelope, pack_session_envelope, pack_session_key, unpack_envelope, unpack_session_key
+)
+from security.session_keys import SessionKeyCache
+from security.key_store import KeyStore, get_key_store
+from utils.journal import AppendOnlyJournal
+from database.message_store import MessageStore, StoredMessage, PAGE_SIZE, SEARCH_DIRECT
 
 class MessageManager:
-    def __init__(self, get_local_ip_func, log_func=None):
+    def __init__(self, get_local_ip_func, log_func=None, connection_pool=None, session_keys=None,
+                 message_store=None, outbox=None, key_prefetcher=None, key_store: Optional[KeyStore] = None,
+                 is_key_revoked_func=None, is_peer_revoked_func=None):
         self.get_local_ip = get_local_ip_func
         self.log = log_func if log_func else lambda msg: None
-        self.public_keys = {}
+        self.connection_pool = connection_pool if connection_pool else ConnectionPool(log_func=self.log)
+        self.session_keys = session_keys if session_keys else SessionKeyCache()
+        self.message_store = message_store if message_store else MessageStore()
+        # Clés publiques des pairs, partagées avec KeyManager (storage/public_keys.json) ;
+        # "is not None" : une table vide est fausse (__len__) mais doit être utilisée
+        self.key_store = key_store if key_store is not None else get_key_store()
+        # Certificat révoqué (KeyManager.is_key_revoked) : la clé n'est jamais enregistrée,
+        # et la clé en cache d'un pair révoqué n'est jamais oubliée (KeyManager.is_peer_revoked)
+        self.is_key_revoked = is_key_revoked_func if is_key_revoked_func else lambda key_pem, ip=None: False
+        self.is_peer_revoked = is_peer_revoked_func if is_peer_revoked_func else lambda ip: False
         self.ma_cle_publique = ""
-        self.messages = []
         self.TCP_PORT = 50001
         self.BUFFER_SIZE = 1024
         
         # Fichiers de persistance
         self.storage_dir = os.path.join(os.path.dirname(__file__), '..', 'storage')
+        # Anciens formats, importés dans la base au démarrage
         self.messages_file = os.path.join(self.storage_dir, 'messages.json')
-        self.keys_file = os.path.join(self.storage_dir, 'public_keys.json')
+        self.messages_journal = AppendOnlyJournal(os.path.join(self.storage_dir, 'messages.jsonl'), log_func=self.log)
+        # Messages directs non remis (pair hors ligne), renvoyés plus tard
+        self.outbox = outbox if outbox else Outbox(self._envoyer_lot, os.path.join(self.storage_dir, 'outbox.jsonl'),
+                                                   log_func=self.log)
+        # Échanges de clés anticipés dès la découverte d'un pair, un seul en cours par pair
+        self.key_prefetcher = key_prefetcher if key_prefetcher else KeyPrefetcher(
+            self._echanger_cles, self.has_public_key, log_func=self.log)
         
         # Charger les données sauvegardées
-        self._load_messages()
-        self._load_public_keys()
+        self._migrate_messages()
 
     def set_ma_cle_publique(self, cle_publique: str) -> None:
         """Définit la clé publique locale"""
         self.ma_cle_publique = cle_publique
         self.log("[INFO] Clé publique locale définie")
 
-    def add_public_key(self, ip: str, key_pem: str):
-        """Ajoute ou met à jour la clé publique d'un pair et sauvegarde."""
-        if self.public_keys.get(ip) != key_pem:
+    def add_public_key(self, ip: str, key_pem: str) -> bool:
+        """
+        Ajoute ou met à jour la clé publique d'un pair et sauvegarde.
+        Toutes les clés reçues passent par ici : retourne False si le certificat est révoqué.
+        """
+        if self.is_key_revoked(key_pem, ip):
+            self.log(f"[AVERTISSEMENT] Clé publique de {ip} refusée : certificat révoqué")
+            return False
+        if self.key_store.set(ip, key_pem):
             self.log(f"[INFO] Mise à jour de la clé publique pour {ip}.")
-            self.public_keys[ip] = key_pem
-            self._save_public_keys()
+            # La session en cours a été chiffrée pour l'ancienne clé
+            self.session_keys.drop_outgoing(ip)
         else:
             self.log(f"[DEBUG] Clé publique pour {ip} déjà à jour.")
+        return True
+
+    def invalider_cle_perimee(self, ip: str, empreinte: bytes) -> bool:
+        """
+        Compare la clé en cache d'un pair à l'empreinte annoncée dans sa balise de présence.
+        Si elles diffèrent (rotation des clés, adresse réattribuée à un autre pair), oublie la clé
+        et la session d'envoi, et retourne True : un nouvel échange est nécessaire.
+        La clé d'un pair révoqué est gardée : changer d'empreinte ne lève pas la révocation.
+        """
+        key_pem = self.key_store.get(ip)
+        if key_pem is None or self.key_store.fingerprint(ip) == empreinte:
+            return False
+        if self.is_peer_revoked(ip):
+            self.log(f"[AVERTISSEMENT] Nouvelle empreinte annoncée par {ip} ignorée : certificat révoqué")
+            return False
+        self.log(f"[INFO] La clé publique de {ip} a changé, nouvel échange de clés")
+        self.key_store.remove(ip, key_pem)
+        self.session_keys.drop_outgoing(ip)
+        return True
 
     def echanger_cles_publiques(self, ip: str) -> bool:
-        """Échange les clés publiques avec un pair"""
-        self.log(f"[DEBUG] Démarrage de l'échange de clé avec {ip}")
-        
+        """
+        Échange les clés publiques avec un pair.
+        Si un échange avec ce pair est déjà en cours (échange anticipé, autre envoi), l'attend.
+        """
         # Vérifications si on a déjà cet IP
-        if ip in self.public_keys:
+        if ip in self.key_store:
+            return True
+        return self.key_prefetcher.exchange(ip)
+
+    def _echanger_cles(self, ip: str) -> bool:
+        """Effectue l'échange de clés publiques (connexion, envoi de notre clé, lecture de la sienne)"""
+        self.log(f"[DEBUG] Démarrage de l'échange de clé avec {ip}")
+        if ip in self.key_store:
             return True
             
         # vérification que ce ne soit pas ma clé publique
@@ -55,29 +115,64 @@ class MessageManager:
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
                 s.settimeout(5.0)  # Timeout de 5 secondes
                 s.connect((ip, self.TCP_PORT))
-                s.send(f"PUBKEY:{self.ma_cle_publique}".encode())
+                s.sendall(encode_frame(FRAME_PUBKEY, self.ma_cle_publique.encode()))
                 self.log(f"[INFO] Clé publique envoyée à {ip}")
-                data = s.recv(self.BUFFER_SIZE).decode()
-                if data.startswith("PUBKEY:"):
-                    key = data.split(":", 1)[1]
-                    self.public_keys[ip] = key
+                frame = FrameDecoder(s).read_frame()
+                if frame and frame[0] == FRAME_PUBKEY:
+                    key = frame[1].decode()
+                    if not self.add_public_key(ip, key):
+                        return False
                     self.log(f"[DEBUG] Échange de clé réussi avec {ip}")
                     self.log(f"[INFO] Clé publique reçue de {ip}")
-                    # Sauvegarder les clés publiques
-                    self._save_public_keys()
                     return True
                 else:
-                    self.log(f"[ERREUR] Réponse inattendue lors de l'échange de clé avec {ip}: {data}")
+                    self.log(f"[ERREUR] Réponse inattendue lors de l'échange de clé avec {ip}: {frame}")
                     return False
         except socket.timeout:
             self.log(f"[ERREUR] Timeout lors de l'échange de clé avec {ip}")
             return False
+        except ProtocolError as e:
+            self.log(f"[ERREUR] Réponse invalide lors de l'échange de clé avec {ip} : {e}")
+            return False
         except Exception as e:
             self.log(f"[ERREUR] Échec de l'échange de clé avec {ip} : {e}")
             return False
 
     def envoyer_message(self, ip: str, msg: str) -> bool:
-        """Envoie un message direct chiffré à un pair"""
+        """
+        Envoie un message direct chiffré à un pair.
+        Si le pair est injoignable, le message est mis en file d'attente et renvoyé plus tard :
+        il est enregistré dans l'historique dans les deux cas.
+        """
+        self.envoyer_message_suivi(ip, msg)
+        return True
+
+    def envoyer_message_suivi(self, ip: str, msg: str, message_id: Optional[str] = None) -> bool:
+        """
+        Comme envoyer_message, mais indique si le message a été remis tout de suite (True)
+        ou mis en file d'attente (False) ; dans ce cas, `outbox.on_delivered` recevra
+        `message_id` quand il sera remis.
+        """
+        if self.outbox.has_pending(ip):
+            # Des messages plus anciens attendent déjà : celui-ci passe derrière pour garder l'ordre
+            self.outbox.enqueue(ip, msg, message_id)
+            delivered = False
+        elif self._envoyer_lot(ip, [msg]):
+            self.log(f"[INFO] Message chiffré envoyé à {ip} : {msg}")
+            delivered = True
+        else:
+            self.log(f"[AVERTISSEMENT] {ip} injoignable, message mis en attente")
+            self.outbox.enqueue(ip, msg, message_id)
+            delivered = False
+
+        # Stocker le message envoyé dans la liste locale (en clair pour l'affichage)
+        local_ip = self.get_local_ip()
+        self._record_message(ip, local_ip, ip, msg)
+        self.log(f"[DEBUG] Message envoyé stocké : ({local_ip}, {ip}, {msg})")
+        return delivered
+
+    def _envoyer_lot(self, ip: str, messages: List[str]) -> bool:
+        """Chiffre et envoie des messages directs à un pair en une seule écriture, sur une seule connexion."""
         # Vérification si l'échange de clé à bien eu lieu
         if not self.echanger_cles_publiques(ip):
             self.log(f"[ERREUR] Envoi de message annulé, clé publique non échangée avec {ip}")
@@ -85,40 +180,31 @@ class MessageManager:
             
         try:
             # Récupérer la clé publique du destinataire
-            if ip not in self.public_keys:
+            recipient_public_key = self.key_store.get(ip)
+            if recipient_public_key is None:
                 self.log(f"[ERREUR] Clé publique manquante pour {ip}")
                 return False
-                
-            recipient_public_key = self.public_keys[ip]
             
-            # Chiffrer le message avec la clé publique du destinataire
-            encrypted_data = CryptoManager.hybrid_encrypt(
-                recipient_public_key.encode(), 
-                msg.encode()
-            )
+            # Clé de session AES : RSA n'est utilisé qu'à la création de la session
+            session = self.session_keys.get_outgoing(ip, recipient_public_key.encode())
+            frames = []
+            for msg in messages:
+                iv, ciphertext = CryptoManager.encrypt_aes(session.key, msg.encode())
+                frames.append(encode_frame(FRAME_DIRECT, pack_session_envelope(session.session_id, iv, ciphertext)))
+            frame = b''.join(frames)
+            key_frame = lambda: encode_frame(FRAME_SESSION_KEY, pack_session_key(session.session_id, session.encrypted_key))
             
-            # Préparer le message chiffré pour l'envoi
-            encrypted_message = {
-                'type': 'ENCRYPTED_MESSAGE',
-                'encrypted_key': encrypted_data['encrypted_key'].hex(),
-                'iv': encrypted_data['iv'].hex(),
-                'ciphertext': encrypted_data['ciphertext'].hex()
-            }
-            
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.connect((ip, self.TCP_PORT))
-                s.send(json.dumps(encrypted_message).encode())
-                self.log(f"[INFO] Message chiffré envoyé à {ip} : {msg}")
-                
-                # Stocker le message envoyé dans la liste locale (en clair pour l'affichage)
-                local_ip = self.get_local_ip()
-                self.messages.append((local_ip, ip, msg))
-                print(f"[DEBUG] MessageManager - Message envoyé stocké: ({local_ip}, {ip}, {msg})")
-                print(f"[DEBUG] MessageManager - État des messages après envoi: {self.messages}")
-                # Sauvegarder les messages
-                self._save_messages()
-                
-                return True
+            try:
+                if session.announced:
+                    # Le pair connaît déjà la session ; on la réannonce seulement sur une nouvelle connexion
+                    self.connection_pool.send(ip, frame, preamble=key_frame)
+                else:
+                    self.connection_pool.send(ip, key_frame() + frame)
+                    session.announced = True
+            except Exception:
+                self.session_keys.drop_outgoing(ip)
+                raise
+            return True
         except Exception as e:
             self.log(f"[ERREUR] Échec de l'envoi du message chiffré à {ip} : {e}")
             return False
@@ -131,9 +217,9 @@ class MessageManager:
             resultats[ip] = self.envoyer_message(ip, msg)
         return resultats
 
-    def traiter_message_recu(self, data: str, addr: str) -> Optional[str]:
+    def traiter_message_recu(self, data: Union[bytes, str], addr: str) -> Optional[str]:
         """
-        Traite un message direct reçu.
+        Traite un message direct reçu (enveloppe binaire, ou JSON de l'ancien format).
         Retourne le message en clair si le déchiffrement réussit, sinon None.
         """
         try:
@@ -142,6 +228,26 @@ class MessageManager:
             
             local_ip = self.get_local_ip()
 
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                if is_envelope(data):
+                    envelope = unpack_envelope(data)
+                    if envelope.kind == ENVELOPE_SESSION:
+                        session_key = self.session_keys.get_incoming(addr, bytes(envelope.session_id))
+                        if session_key is None:
+                            self.log(f"[ERREUR] Message de {addr} chiffré avec une session inconnue ou expirée")
+                            return None
+                        plaintext = CryptoManager.decrypt_aes(session_key, envelope.iv, envelope.ciphertext).decode()
+                    else:
+                        # RSA n'accepte que des bytes ; le bloc ne fait que 256 octets, le message reste une vue
+                        plaintext = CryptoManager.hybrid_decrypt(
+                            bytes(envelope.encrypted_key), envelope.iv, envelope.ciphertext
+                        ).decode()
+                    
+                    self.log(f"[INFO] Message déchiffré reçu de {addr} : {plaintext}")
+                    self._record_message(addr, addr, local_ip, plaintext)
+                    return plaintext
+                data = bytes(data).decode()
+
             try:
                 message_data = json.loads(data)
                 if message_data.get('type') == 'ENCRYPTED_MESSAGE':
@@ -153,34 +259,54 @@ class MessageManager:
                     plaintext = decrypted_message.decode()
                     
                     self.log(f"[INFO] Message déchiffré reçu de {addr} : {plaintext}")
-                    self.messages.append((addr, local_ip, plaintext))
-                    self._save_messages()
+                    self._record_message(addr, addr, local_ip, plaintext)
                     return plaintext
                 else:
                     # Gérer d'autres types de messages JSON si nécessaire
                     self.log(f"[INFO] Message JSON non-chiffré reçu de {addr} : {data}")
-                    self.messages.append((addr, local_ip, data))
-                    self._save_messages()
+                    self._record_message(addr, addr, local_ip, data)
                     return data
 
             except json.JSONDecodeError:
                 # Gérer les messages non-JSON (pour la compatibilité)
                 self.log(f"[INFO] Message texte simple reçu de {addr} : {data}")
-                self.messages.append((addr, local_ip, data))
-                self._save_messages()
+                self._record_message(addr, addr, local_ip, data)
                 return data
                 
         except Exception as e:
             self.log(f"[ERREUR] Erreur lors du traitement du message de {addr} : {e}")
             return None
 
+    def traiter_cle_session(self, data: bytes, addr: str) -> bool:
+        """Déchiffre et enregistre une clé de session annoncée par un pair"""
+        try:
+            session_id, encrypted_key = unpack_session_key(data)
+            session_key = CryptoManager.decrypt_with_private_key(encrypted_key)
+            self.session_keys.store_incoming(addr, session_id, session_key)
+            self.log(f"[DEBUG] Clé de session {session_id.hex()} reçue de {addr}")
+            return True
+        except Exception as e:
+            self.log(f"[ERREUR] Clé de session invalide reçue de {addr} : {e}")
+            return False
+
+    def reset_sessions(self, ip: Optional[str] = None) -> None:
+        """
+        Oublie la session d'envoi vers un pair, ou toutes les sessions d'envoi si ip est None.
+        Les sessions reçues sont gardées : les pairs peuvent continuer à les utiliser.
+        """
+        if ip is None:
+            self.session_keys.clear_outgoing()
+        else:
+            self.session_keys.drop_outgoing(ip)
+
     def traiter_echange_cles(self, data: str, addr: str) -> bool:
         """Traite un échange de clés publiques"""
         try:
             if data.startswith("PUBKEY:"):
                 peer_ip = addr
                 key = data.split(":", 1)[1]
-                self.public_keys[peer_ip] = key
+                if not self.add_public_key(peer_ip, key):
+                    return False
                 self.log(f"[INFO] Clé publique reçue de {peer_ip}")
                 
                 # Envoi de notre clé publique en réponse
@@ -201,86 +327,90 @@ class MessageManager:
             return False
 
     def get_messages(self) -> List[Tuple[str, str, str]]:
-        """Retourne tous les messages reçus"""
-        print(f"[DEBUG] MessageManager - get_messages appelé, messages disponibles: {self.messages}")
-        return self.messages.copy()
+        """Retourne tous les messages (tout l'historique : préférer get_conversation_page pour l'affichage)"""
+        return [(m.sender, m.recipient, m.content) for m in self.message_store.get_all_messages()]
 
     def get_messages_from(self, ip: str) -> List[Tuple[str, str, str]]:
-        """Retourne les messages reçus d'une IP spécifique"""
-        local_ip = self.get_local_ip()
-        return [
-            (sender, recipient, msg) 
-            for sender, recipient, msg in self.messages 
-            if (sender == ip and recipient == local_ip) or (sender == local_ip and recipient == ip)
-        ]
+        """Retourne les messages échangés avec une IP spécifique"""
+        return [(m.sender, m.recipient, m.content) for m in self.message_store.get_conversation_page(ip, limit=None)]
+
+    def get_conversation_page(self, ip: str, limit: int = PAGE_SIZE,
+                              before_id: Optional[int] = None) -> List[StoredMessage]:
+        """
+        Retourne une page de la conversation avec un pair, dans l'ordre chronologique.
+        Pour charger les messages plus anciens, passer l'identifiant du premier message de la page.
+        """
+        return self.message_store.get_conversation_page(ip, limit=limit, before_id=before_id)
 
     def get_public_keys(self) -> Dict[str, str]:
         """Retourne toutes les clés publiques reçues"""
-        return self.public_keys.copy()
+        return self.key_store.snapshot()
 
     def get_public_key(self, ip: str) -> Optional[str]:
         """Retourne la clé publique d'une IP spécifique"""
-        return self.public_keys.get(ip)
+        return self.key_store.get(ip)
 
     def has_public_key(self, ip: str) -> bool:
         """Vérifie si on a la clé publique d'une IP"""
-        return ip in self.public_keys
+        return ip in self.key_store
 
     def clear_messages(self) -> None:
         """Efface tous les messages"""
-        self.messages.clear()
-        self._save_messages()
+        self.message_store.clear_messages()
         self.log("[INFO] Tous les messages ont été effacés")
 
     def clear_messages_from(self, ip: str) -> int:
         """Efface tous les messages d'une IP spécifique et retourne le nombre d'effacés"""
-        initial_count = len(self.messages)
-        self.messages = [(sender, recipient, msg) for sender, recipient, msg in self.messages if sender != ip and recipient != ip]
-        deleted_count = initial_count - len(self.messages)
+        deleted_count = self.message_store.clear_messages(ip)
         if deleted_count > 0:
             self.log(f"[INFO] {deleted_count} messages de {ip} ont été effacés")
         return deleted_count
 
     def get_message_count(self) -> int:
         """Retourne le nombre total de messages"""
-        return len(self.messages)
+        return self.message_store.count_messages()
 
     def get_message_count_from(self, ip: str) -> int:
         """Retourne le nombre de messages d'une IP spécifique"""
-        return len([1 for sender, recipient, _ in self.messages if sender == ip or recipient == ip])
+        return self.message_store.count_messages(ip)
 
     def get_recent_messages(self, count: int = 10) -> List[Tuple[str, str, str]]:
         """Retourne les messages les plus récents"""
-        return self.messages[-count:] if self.messages else []
+        return [(m.sender, m.recipient, m.content) for m in self.message_store.get_recent_messages(count)]
 
-    def search_messages(self, keyword: str) -> List[Tuple[str, str, str]]:
-        """Recherche des messages contenant un mot-clé"""
-        return [(sender, recipient, msg) for sender, recipient, msg in self.messages if keyword.lower() in msg.lower()]
+    def search_messages(self, keyword: str, limit: int = PAGE_SIZE, offset: int = 0) -> List[Tuple[str, str, str]]:
+        """Recherche plein texte dans les messages directs, les plus pertinents en premier"""
+        local_ip = self.get_local_ip()
+        return [
+            (r.sender, local_ip if r.sender == r.conversation else r.conversation, r.content)
+            for r in self.message_store.search(keyword, scope=SEARCH_DIRECT, limit=limit, offset=offset)
+        ]
 
-    def _load_messages(self) -> None:
-        """Charge les messages depuis le fichier de persistance"""
-        if os.path.exists(self.messages_file):
-            with open(self.messages_file, 'r') as f:
-                self.messages = json.load(f)
-        else:
-            self.messages = []
+    def _migrate_messages(self) -> None:
+        """Importe dans la base les messages des anciens formats (messages.json puis journal messages.jsonl)"""
+        self.messages_journal.import_legacy(
+            self.messages_file,
+            lambda messages: [{'op': 'add', 'msg': list(entry)} for entry in messages]
+        )
+        if not self.messages_journal.exists():
+            return
+        messages = []
+        for record in self.messages_journal.replay():
+            op = record.get('op')
+            if op == 'add':
+                messages.append(tuple(record['msg']))
+            elif op == 'clear_from':
+                ip = record['ip']
+                messages = [m for m in messages if m[0] != ip and m[1] != ip]
+        local_ip = self.get_local_ip()
+        # La conversation est le pair : le destinataire des messages envoyés, l'expéditeur des messages reçus
+        count = self.message_store.import_messages(
+            (recipient if sender == local_ip else sender, sender, recipient, msg)
+            for sender, recipient, msg in messages
+        )
+        os.replace(self.messages_journal.path, self.messages_journal.path + '.bak')
+        self.log(f"[INFO] {count} messages importés dans la base de données")
 
-    def _load_public_keys(self) -> None:
-        """Charge les clés publiques depuis le fichier de persistance"""
-        if os.path.exists(self.keys_file):
-            with open(self.keys_file, 'r') as f:
-                self.public_keys = json.load(f)
-        else:
-            self.public_keys = {}
-
-    def _save_messages(self) -> None:
-        """Sauvegarde les messages dans le fichier de persistance"""
-        os.makedirs(self.storage_dir, exist_ok=True)
-        with open(self.messages_file, 'w') as f:
-            json.dump(self.messages, f, indent=2)
-
-    def _save_public_keys(self) -> None:
-        """Sauvegarde les clés publiques dans le fichier de persistance"""
-        os.makedirs(self.storage_dir, exist_ok=True)
-        with open(self.keys_file, 'w') as f:
-            json.dump(self.public_keys, f, indent=2) 
\ No newline at end of file
+    def _record_message(self, conversation: str, sender: str, recipient: str, msg: str) -> None:
+        """Ajoute un message à l'historique (une ligne indexée, sans relire l'historique)"""
+        self.message_store.add_message(conversation, sender, recipient, msg)
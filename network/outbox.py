@@ -0,0 +1,198 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from utils.journal import AppendOnlyJournal
+
+BACKOFF_BASE = 2.0  # Délai avant la première nouvelle tentative (secondes), doublé à chaque échec
+BACKOFF_MAX = 300.0  # Délai maximal entre deux tentatives
+BACKOFF_JITTER = 0.2  # Part aléatoire du délai, pour ne pas relancer tous les pairs au même instant
+BATCH_MAX_MESSAGES = 100  # Messages envoyés au plus par connexion lors d'une tentative
+FLUSH_WORKERS = 4
+
+
+class _PeerQueue:
+    def __init__(self):
+        self.messages: List[Tuple[str, str]] = []  # (identifiant, message) dans l'ordre d'envoi
+        self.failures = 0
+        self.next_attempt = 0.0  # time.monotonic() de la prochaine tentative
+
+
+class Outbox:
+    """
+    File d'envoi persistante des messages directs, par pair.
+    Un message qui n'a pas pu être envoyé (pair hors ligne, échange de clé expiré) est écrit
+    dans un journal en ajout seul puis renvoyé avec un délai exponentiel ; la découverte du
+    pair déclenche un renvoi immédiat. Les messages en attente d'un pair sont envoyés
+    ensemble, sur une seule connexion, par `send_batch_func(ip, messages) -> bool`.
+    """
+
+    def __init__(self, send_batch_func: Callable[[str, List[str]], bool], path: str,
+                 log_func=None, base_delay: float = BACKOFF_BASE, max_delay: float = BACKOFF_MAX):
+        self.send_batch = send_batch_func
+        self.log = log_func if log_func else lambda msg: None
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.journal = AppendOnlyJournal(path, log_func=self.log)
+        self.on_delivered: Optional[Callable[[List[str]], None]] = None  # callback(identifiants remis)
+        self._queues: Dict[str, _PeerQueue] = {}
+        self._in_flight = set()  # Pairs dont un envoi est en cours
+        self._cond = threading.Condition()
+        self._stopped = True
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._load()
+
+    # === FILE D'ATTENTE ===
+
+    def enqueue(self, ip: str, msg: str, msg_id: Optional[str] = None) -> str:
+        """Met un message en attente pour ce pair ; retourne son identifiant (`msg_id` s'il est fourni)."""
+        msg_id = msg_id if msg_id else os.urandom(8).hex()
+        with self._cond:
+            # Journal et file modifiés sous le même verrou : une compaction ne peut pas perdre l'ajout
+            self.journal.append({'op': 'queue', 'id': msg_id, 'ip': ip, 'msg': msg, 'ts': time.time()})
+            queue = self._queues.get(ip)
+            if queue is None:
+                queue = self._queues[ip] = _PeerQueue()
+                queue.next_attempt = time.monotonic() + self._delay(1)
+            queue.messages.append((msg_id, msg))
+            self._cond.notify()
+        self.log(f"[INFO] Message pour {ip} mis en file d'attente ({self.pending_count(ip)} en attente)")
+        return msg_id
+
+    def has_pending(self, ip: str) -> bool:
+        with self._cond:
+            queue = self._queues.get(ip)
+            return bool(queue and queue.messages)
+
+    def pending_count(self, ip: Optional[str] = None) -> int:
+        with self._cond:
+            if ip is not None:
+                queue = self._queues.get(ip)
+                return len(queue.messages) if queue else 0
+            return sum(len(queue.messages) for queue in self._queues.values())
+
+    def notify_peer_online(self, ip: str) -> None:
+        """Le pair vient d'être découvert : ses messages en attente sont renvoyés sans attendre le délai."""
+        with self._cond:
+            queue = self._queues.get(ip)
+            if not queue or not queue.messages:
+                return
+            queue.failures = 0
+            queue.next_attempt = 0.0
+            self._cond.notify()
+        self.log(f"[DEBUG] Pair {ip} en ligne, envoi des messages en attente")
+
+    # === BOUCLE D'ENVOI ===
+
+    def start(self) -> None:
+        with self._cond:
+            if not self._stopped:
+                return
+            self._stopped = False
+        self._executor = ThreadPoolExecutor(max_workers=FLUSH_WORKERS, thread_name_prefix="outbox")
+        self._thread = threading.Thread(target=self._run, name="outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Arrête les renvois ; les messages encore en attente restent dans le journal."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self.journal.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                due = self._wait_for_due()
+                if due is None:
+                    return
+                self._in_flight.update(due)
+            for ip in due:
+                try:
+                    self._executor.submit(self._flush, ip)
+                except RuntimeError:
+                    return  # Exécuteur arrêté pendant la fermeture
+
+    def _wait_for_due(self) -> Optional[List[str]]:
+        """Attend qu'au moins un pair soit à relancer (verrou tenu). Retourne None à l'arrêt."""
+        while not self._stopped:
+            now = time.monotonic()
+            waiting = [(queue.next_attempt, ip) for ip, queue in self._queues.items()
+                       if queue.messages and ip not in self._in_flight]
+            due = [ip for next_attempt, ip in waiting if next_attempt <= now]
+            if due:
+                return due
+            # Sans échéance, on dort jusqu'à un nouveau message ou une découverte
+            self._cond.wait(min(waiting)[0] - now if waiting else None)
+        return None
+
+    def _flush(self, ip: str):
+        """Envoie les messages en attente du pair, par lots, tant que les envois réussissent."""
+        try:
+            while True:
+                with self._cond:
+                    queue = self._queues.get(ip)
+                    if self._stopped or not queue or not queue.messages:
+                        return
+                    batch = queue.messages[:BATCH_MAX_MESSAGES]
+                try:
+                    sent = self.send_batch(ip, [msg for _, msg in batch])
+                except Exception as e:
+                    self.log(f"[ERREUR] Renvoi des messages en attente pour {ip} : {e}")
+                    sent = False
+                if not sent:
+                    with self._cond:
+                        queue.failures += 1
+                        delay = self._delay(queue.failures + 1)
+                        queue.next_attempt = time.monotonic() + delay
+                    self.log(f"[DEBUG] {ip} injoignable, nouvelle tentative dans {delay:.0f} s")
+                    return
+                with self._cond:
+                    self.journal.append({'op': 'done', 'ids': [msg_id for msg_id, _ in batch]})
+                    del queue.messages[:len(batch)]
+                    queue.failures = 0
+                    if not queue.messages:
+                        self._queues.pop(ip, None)
+                    self._compact_if_needed()
+                self.log(f"[INFO] {len(batch)} message(s) en attente remis à {ip}")
+                if self.on_delivered:
+                    self.on_delivered([msg_id for msg_id, _ in batch])
+        finally:
+            with self._cond:
+                self._in_flight.discard(ip)
+                self._cond.notify()
+
+    def _delay(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return delay * (1 + random.uniform(-BACKOFF_JITTER, BACKOFF_JITTER))
+
+    # === PERSISTANCE ===
+
+    def _load(self):
+        """Relit le journal : les messages sans enregistrement 'done' sont toujours en attente."""
+        pending: Dict[str, Tuple[str, str]] = {}  # id -> (ip, message), dans l'ordre d'ajout
+        for record in self.journal.replay():
+            op = record.get('op')
+            if op == 'queue':
+                pending[record['id']] = (record['ip'], record['msg'])
+            elif op == 'done':
+                for msg_id in record.get('ids', []):
+                    pending.pop(msg_id, None)
+        for msg_id, (ip, msg) in pending.items():
+            self._queues.setdefault(ip, _PeerQueue()).messages.append((msg_id, msg))
+        if pending:
+            self.log(f"[INFO] {len(pending)} message(s) en attente rechargé(s) pour {len(self._queues)} pair(s)")
+        with self._cond:
+            self._compact_if_needed()
+
+    def _compact_if_needed(self):
+        """Réécrit le journal avec les seuls messages en attente (verrou tenu)."""
+        live = sum(len(queue.messages) for queue in self._queues.values())
+        if self.journal.needs_compaction(live):
+            self.journal.compact({'op': 'queue', 'id': msg_id, 'ip': ip, 'msg': msg}
+                                 for ip, queue in self._queues.items() for msg_id, msg in queue.messages)
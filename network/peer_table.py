@@ -0,0 +1,140 @@
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+PEER_TIMEOUT = 30  # Secondes sans balise avant de considérer un pair comme perdu
+
+
+class _Peer:
+    __slots__ = ('nom', 'last_seen', 'deadline', 'scheduled')
+
+    def __init__(self, nom: str, last_seen: float, deadline: float):
+        self.nom = nom
+        self.last_seen = last_seen  # time.time() de la dernière balise (affichage)
+        self.deadline = deadline  # time.monotonic() d'expiration
+        self.scheduled = 0  # Entrées de ce pair présentes dans le tas
+
+
+class PeerTable:
+    """
+    Pairs découverts et échéances d'expiration, protégés par un verrou.
+    Un tas (min-heap) contient une seule entrée par pair : une balise ne fait que repousser
+    l'échéance du pair (O(1)) ; quand une entrée arrive à échéance, elle est replacée dans le
+    tas si le pair a été vu entre-temps (O(log n)), sinon le pair est retiré.
+    Un thread attend la prochaine échéance sur une Condition et appelle `on_expired(ip)`
+    dès qu'un pair expire, au lieu de parcourir toute la table à intervalle fixe.
+    """
+
+    def __init__(self, timeout: float = PEER_TIMEOUT, on_expired: Optional[Callable[[str], None]] = None,
+                 log_func=None):
+        self.timeout = timeout
+        self.on_expired = on_expired
+        self.log = log_func if log_func else lambda msg: None
+        self._peers: Dict[str, _Peer] = {}
+        self._heap: List[Tuple[float, int, str, _Peer]] = []  # (échéance, n° d'ordre, ip, pair)
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def touch(self, ip: str, nom: str, timeout: Optional[float] = None) -> bool:
+        """Enregistre une balise du pair. Retourne True s'il est nouveau."""
+        now = time.monotonic()
+        deadline = now + (timeout if timeout is not None else self.timeout)
+        with self._cond:
+            peer = self._peers.get(ip)
+            if peer is not None:
+                shortened = deadline < peer.deadline
+                peer.nom = nom
+                peer.last_seen = time.time()
+                peer.deadline = deadline
+                if shortened:
+                    # Délai plus court annoncé : l'entrée existante arriverait trop tard
+                    self._schedule(ip, peer)
+                return False
+            peer = self._peers[ip] = _Peer(nom, time.time(), deadline)
+            self._schedule(ip, peer)
+            return True
+
+    def remove(self, ip: str) -> bool:
+        """Retire un pair sans appeler on_expired (son entrée dans le tas sera ignorée)."""
+        with self._cond:
+            return self._peers.pop(ip, None) is not None
+
+    def __contains__(self, ip: str) -> bool:
+        with self._cond:
+            return ip in self._peers
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._peers)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Copie des pairs connus : ip -> {nom, last_seen}."""
+        with self._cond:
+            return {ip: {'nom': peer.nom, 'last_seen': peer.last_seen} for ip, peer in self._peers.items()}
+
+    # === EXPIRATION ===
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="peer-expiry", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._thread = None
+            self._cond.notify_all()
+
+    def expire(self) -> List[str]:
+        """Retire les pairs dont l'échéance est passée et retourne leurs adresses, sans appeler on_expired."""
+        with self._cond:
+            return self._pop_expired(time.monotonic())
+
+    def _run(self):
+        while True:
+            with self._cond:
+                expired = []
+                while not self._stopped and not expired:
+                    now = time.monotonic()
+                    expired = self._pop_expired(now)
+                    if not expired:
+                        self._cond.wait(self._heap[0][0] - now if self._heap else None)
+                if self._stopped:
+                    return
+            for ip in expired:
+                self.log(f"[DEBUG] Pair {ip} expiré")
+                if self.on_expired:
+                    try:
+                        self.on_expired(ip)
+                    except Exception as e:
+                        self.log(f"[ERREUR] Erreur dans le callback de perte du pair {ip} : {e}")
+
+    def _schedule(self, ip: str, peer: _Peer) -> None:
+        """Place l'échéance du pair dans le tas (verrou tenu)."""
+        heapq.heappush(self._heap, (peer.deadline, next(self._sequence), ip, peer))
+        peer.scheduled += 1
+        if self._heap[0][3] is peer:
+            self._cond.notify()  # Nouvelle échéance la plus proche
+
+    def _pop_expired(self, now: float) -> List[str]:
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            _, _, ip, peer = heapq.heappop(self._heap)
+            if self._peers.get(ip) is not peer:
+                continue  # Pair retiré (ou retiré puis revenu) entre-temps
+            peer.scheduled -= 1
+            if peer.deadline > now:
+                # Vu depuis la création de l'entrée : replanifié à sa nouvelle échéance
+                if not peer.scheduled:
+                    self._schedule(ip, peer)
+                continue
+            del self._peers[ip]
+            expired.append(ip)
+        return expired
@@ -0,0 +1,145 @@
+import socket
+import struct
+from typing import Iterator, Optional, Tuple, Union
+
+# Format d'une trame : version (1 octet) + type (1 octet) + longueur (4 octets, big-endian) + données.
+# Le premier octet (version) n'est jamais un caractère imprimable, ce qui permet au serveur
+# de distinguer une trame d'un message de l'ancien protocole texte (PUBKEY:, GROUPMSG:, JOINGROUP:, JSON).
+PROTOCOL_VERSION = 1
+FRAME_HEADER = struct.Struct('!BBI')
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+DECODER_BUFFER_SIZE = 64 * 1024
+
+# Types de trame
+FRAME_PUBKEY = 1      # Certificat PEM, la réponse utilise le même type
+FRAME_DIRECT = 2      # Message direct chiffré
+FRAME_GROUPMSG = 3    # Enveloppe de groupe chiffrée, ou "nom:message" (ancien format en clair)
+FRAME_JOINGROUP = 4   # "nom:ip1,ip2,..."
+FRAME_SESSION_KEY = 5 # Annonce d'une clé de session (voir network/envelope.py)
+FRAME_GROUPKEY = 6    # Annonce d'une clé de groupe (voir network/envelope.py)
+FRAME_GROUPRELAY = 7  # Message de groupe à relayer (voir network/group_relay.py)
+FRAME_BATCH = 8       # Plusieurs trames complètes regroupées en un seul envoi (voir network/coalescer.py)
+FRAME_CLOSE = 9       # Fermeture annoncée par le serveur : le client n'écrit plus sur cette connexion
+
+LEGACY_PREFIXES = {
+    b"PUBKEY:": FRAME_PUBKEY,
+    b"GROUPMSG:": FRAME_GROUPMSG,
+    b"JOINGROUP:": FRAME_JOINGROUP,
+}
+
+
+class ProtocolError(Exception):
+    """Trame invalide ou non supportée."""
+
+
+def encode_frame(frame_type: int, payload: bytes) -> bytes:
+    """Construit une trame complète prête à être envoyée."""
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Trame trop grande ({len(payload)} octets)")
+    return FRAME_HEADER.pack(PROTOCOL_VERSION, frame_type, len(payload)) + payload
+
+
+def iter_frames(data: Union[bytes, memoryview]) -> Iterator[Tuple[int, bytes]]:
+    """Découpe une suite de trames complètes (contenu d'une trame FRAME_BATCH) en (type, données)."""
+    view = memoryview(data)
+    offset = 0
+    while offset < len(view):
+        if len(view) - offset < FRAME_HEADER.size:
+            raise ProtocolError("Lot de trames tronqué")
+        version, frame_type, length = FRAME_HEADER.unpack_from(view, offset)
+        if version != PROTOCOL_VERSION:
+            raise ProtocolError(f"Version de protocole non supportée : {version}")
+        offset += FRAME_HEADER.size
+        if offset + length > len(view):
+            raise ProtocolError("Lot de trames tronqué")
+        yield frame_type, bytes(view[offset:offset + length])
+        offset += length
+
+
+def is_framed(first_byte: bytes) -> bool:
+    """Indique si une connexion utilise le protocole par trames, d'après son premier octet."""
+    return bool(first_byte) and first_byte[0] == PROTOCOL_VERSION
+
+
+def parse_legacy(data: bytes) -> Tuple[int, bytes]:
+    """Convertit un message de l'ancien protocole texte en (type, données)."""
+    for prefix, frame_type in LEGACY_PREFIXES.items():
+        if data.startswith(prefix):
+            return frame_type, data[len(prefix):]
+    # Tout le reste est considéré comme un message direct (JSON chiffré)
+    return FRAME_DIRECT, data
+
+
+def encode_legacy(frame_type: int, payload: bytes) -> bytes:
+    """Construit la réponse au format texte pour un pair utilisant l'ancien protocole."""
+    for prefix, legacy_type in LEGACY_PREFIXES.items():
+        if legacy_type == frame_type:
+            return prefix + payload
+    return payload
+
+
+class FrameDecoder:
+    """
+    Lit des trames successives depuis une socket.
+    Les données sont reçues avec recv_into dans un tampon préalloué, ce qui évite les copies
+    répétées ; une seule lecture peut contenir plusieurs trames.
+    """
+
+    def __init__(self, sock: socket.socket, buffer_size: int = DECODER_BUFFER_SIZE,
+                 max_frame_size: int = MAX_FRAME_SIZE):
+        self.sock = sock
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = 0
+
+    def read_frame(self) -> Optional[Tuple[int, bytes]]:
+        """Retourne (type, données) pour la trame suivante, ou None si le pair a fermé la connexion."""
+        if not self._fill(FRAME_HEADER.size):
+            return None
+        version, frame_type, length = FRAME_HEADER.unpack_from(self._buffer, self._start)
+        if version != PROTOCOL_VERSION:
+            raise ProtocolError(f"Version de protocole non supportée : {version}")
+        if length > self.max_frame_size:
+            raise ProtocolError(f"Trame annoncée trop grande ({length} octets)")
+        if not self._fill(FRAME_HEADER.size + length):
+            raise ProtocolError("Connexion fermée au milieu d'une trame")
+        payload_start = self._start + FRAME_HEADER.size
+        payload = bytes(self._view[payload_start:payload_start + length])
+        self._start = payload_start + length
+        if self._start == self._end:
+            self._start = self._end = 0
+        return frame_type, payload
+
+    def has_partial_frame(self) -> bool:
+        """Indique si une trame a commencé à arriver sans être complète."""
+        return self._end > self._start
+
+    def _fill(self, size: int) -> bool:
+        """S'assure que `size` octets sont disponibles à partir de _start. False si fin de flux."""
+        while self._end - self._start < size:
+            if self._start + size > len(self._buffer):
+                self._make_room(size)
+            n = self.sock.recv_into(self._view[self._end:])
+            if not n:
+                if self._end - self._start:
+                    raise ProtocolError("Connexion fermée au milieu d'une trame")
+                return False
+            self._end += n
+        return True
+
+    def _make_room(self, size: int) -> None:
+        """Ramène les données en attente au début du tampon, en l'agrandissant si nécessaire."""
+        pending = self._end - self._start
+        if size > len(self._buffer):
+            new_buffer = bytearray(max(size, len(self._buffer) * 2))
+            new_buffer[:pending] = self._view[self._start:self._end]
+            self._view.release()
+            self._buffer = new_buffer
+            self._view = memoryview(self._buffer)
+        else:
+            # Copie intermédiaire : source et destination se chevauchent dans le même tampon
+            self._buffer[:pending] = bytes(self._view[self._start:self._end])
+        self._start = 0
+        self._end = pending
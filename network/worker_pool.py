@@ -0,0 +1,97 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+MAX_WORKERS = 16  # Connexions traitées simultanément
+MAX_QUEUE = 64  # Connexions acceptées en attente d'un thread libre
+SUBMIT_TIMEOUT = 0.5  # Attente maximale d'une place avant de refuser
+
+
+class BoundedWorkerPool:
+    """
+    Pool de threads à file d'attente bornée.
+    Au-delà de max_workers tâches en cours et max_queue tâches en attente, `submit` attend
+    au plus `timeout` secondes qu'une place se libère puis refuse la tâche (contre-pression).
+    Tient des métriques de profondeur de file et de latence (attente et traitement).
+    """
+
+    def __init__(self, max_workers: int = MAX_WORKERS, max_queue: int = MAX_QUEUE,
+                 name: str = "worker", log_func=None):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.log = log_func if log_func else lambda msg: None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._max_queue_depth = 0
+        self._completed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._total_handling = 0.0
+        self._max_handling = 0.0
+
+    def submit(self, func, *args, timeout: float = SUBMIT_TIMEOUT) -> bool:
+        """Planifie func(*args). Retourne False si la file est pleine après `timeout` secondes."""
+        if not self._slots.acquire(timeout=timeout):
+            with self._lock:
+                self._rejected += 1
+            self.log(f"[AVERTISSEMENT] File de traitement pleine ({self.max_queue} en attente), tâche refusée")
+            return False
+        with self._lock:
+            self._queued += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._queued)
+        try:
+            self._executor.submit(self._run, func, args, time.monotonic())
+        except RuntimeError:
+            # Pool arrêté
+            with self._lock:
+                self._queued -= 1
+                self._rejected += 1
+            self._slots.release()
+            return False
+        return True
+
+    def has_waiting_tasks(self) -> bool:
+        """Indique si des tâches attendent un thread libre."""
+        with self._lock:
+            return self._queued > 0
+
+    def get_metrics(self) -> Dict:
+        """Retourne un instantané des métriques du pool (latences en millisecondes)."""
+        with self._lock:
+            completed = self._completed
+            return {
+                'active': self._active,
+                'queue_depth': self._queued,
+                'max_queue_depth': self._max_queue_depth,
+                'completed': completed,
+                'rejected': self._rejected,
+                'avg_wait_ms': self._total_wait / completed * 1000 if completed else 0.0,
+                'avg_handling_ms': self._total_handling / completed * 1000 if completed else 0.0,
+                'max_handling_ms': self._max_handling * 1000,
+            }
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, func, args, submitted: float):
+        started = time.monotonic()
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+        try:
+            func(*args)
+        except Exception as e:
+            self.log(f"[ERREUR] Erreur dans une tâche du pool : {e}")
+        finally:
+            finished = time.monotonic()
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+                self._total_wait += started - submitted
+                self._total_handling += finished - started
+                self._max_handling = max(self._max_handling, finished - started)
+            self._slots.release()
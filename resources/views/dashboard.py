@@ -1,10 +1,29 @@
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QFrame, QPushButton, QLabel, QLineEdit, QMainWindow, QScrollArea, QMessageBox, QDialog, QTextEdit, QSizePolicy
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QFrame, QPushButton, QLabel, QLineEdit, QMainWindow, QMessageBox, QDialog, QTextEdit, QSizePolicy, QStackedWidget
 from PyQt5.QtCore import Qt, QSize, QTimer, QThread, pyqtSignal, QPoint
 from PyQt5.QtGui import QIcon, QPixmap, QFont
 import os
+from collections import OrderedDict
 from app.network_manager import NetworkManager
+from database.message_store import PAGE_SIZE
+from config.network import NETWORK_ENGINE
+from resources.views.message_list import ChatMessage, MessageListView
 from resources.views.settings_window import SettingsWindow
 
+CHAT_VIEW_CACHE_SIZE = 8  # Conversations dont la zone de chat reste construite en mémoire
+
+_pixmap_cache = {}
+
+
+def cached_pixmap(icon_path, size):
+    """Retourne l'icône redimensionnée ; elle n'est lue sur le disque qu'une fois par (chemin, taille)."""
+    key = (icon_path, size)
+    pixmap = _pixmap_cache.get(key)
+    if pixmap is None:
+        pixmap = QPixmap(icon_path).scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        _pixmap_cache[key] = pixmap
+    return pixmap
+
+
 SERVICE_TYPE = "_securemsg._tcp.local."
 SERVICE_PORT = 50001  # À adapter selon serveur TCP
 
@@ -52,8 +71,7 @@ class CustomTooltip(QWidget):
         icon_label = QLabel()
         icon_path = os.path.join("resources/img", "lockblanc.png")
         if os.path.exists(icon_path):
-            pixmap = QPixmap(icon_path)
-            icon_label.setPixmap(pixmap.scaled(24, 24, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+            icon_label.setPixmap(cached_pixmap(icon_path, 24))
             details_layout.addWidget(icon_label, alignment=Qt.AlignTop)
 
         # VBox pour les textes de détails
@@ -119,8 +137,7 @@ class IconTextButton(QFrame):
         layout.setSpacing(8)
         # Icône
         icon_label = QLabel()
-        pixmap = QPixmap(icon_path)
-        icon_label.setPixmap(pixmap.scaled(30, 30, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        icon_label.setPixmap(cached_pixmap(icon_path, 30))
         icon_label.setAlignment(Qt.AlignHCenter)
         layout.addWidget(icon_label)
         # Texte
@@ -151,8 +168,7 @@ class CircleIcon(QFrame):
         layout.setSpacing(0)
         icon_label = QLabel()
         icon_label.setObjectName("circleIconLabel")
-        pixmap = QPixmap(icon_path)
-        icon_label.setPixmap(pixmap.scaled(diameter-20, diameter-20, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        icon_label.setPixmap(cached_pixmap(icon_path, diameter-20))
         icon_label.setAlignment(Qt.AlignCenter)
         layout.addWidget(icon_label, alignment=Qt.AlignCenter)
         
@@ -297,49 +313,217 @@ class ContactCell(QFrame):
             }}
         """)
 
-class MessageBubble(QFrame):
-    def __init__(self, text, is_sent, parent=None):
+class ChatView(QFrame):
+    """
+    Zone de chat d'une conversation : en-tête, messages et saisie.
+    Construite une seule fois à partir de la dernière page de l'historique ; les messages
+    suivants sont ajoutés en fin de liste et les pages plus anciennes sont lues dans le
+    stockage quand l'utilisateur remonte l'historique.
+    """
+
+    def __init__(self, conv, network_manager, on_send, on_show_key, parent=None):
         super().__init__(parent)
-        
-        # Le conteneur principal de la bulle
-        main_layout = QHBoxLayout(self)
-        main_layout.setContentsMargins(0, 0, 0, 0)
-        
-        # Le widget de texte qui contient le message
-        text_widget = QFrame()
-        text_layout = QVBoxLayout(text_widget)
-        text_layout.setContentsMargins(12, 10, 12, 10)
-        
-        text_label = QLabel(text)
-        text_label.setWordWrap(True)
-        text_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
-        text_layout.addWidget(text_label)
-        
-        # Définir la largeur maximale de la bulle (70% de la largeur du parent)
-        if self.parentWidget():
-             self.setMaximumWidth(int(self.parentWidget().width() * 0.7))
+        self.conv = conv
+        self.network_manager = network_manager
+        self._history_complete = False
 
-        # Style de la bulle
-        if is_sent:
-            bg_color = "#D66853"
-            text_color = "white"
-        else:
-            bg_color = "#6a6a6a" # Un gris foncé pour les messages reçus
-            text_color = "white"
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(0)
+        layout.addWidget(self._build_header(on_show_key))
+
+        # Zone des messages (liste virtualisée : seules les bulles visibles sont dessinées)
+        self._empty_label = QLabel("Aucun message dans cette conversation")
+        self._empty_label.setStyleSheet("color: #999; font-style: italic; background: white; padding: 18px;")
+        self._empty_label.setAlignment(Qt.AlignCenter)
+        self._empty_label.hide()
+        layout.addWidget(self._empty_label)
+        self.message_list = MessageListView(cached_pixmap)
+        self.message_list.older_requested.connect(self._load_older)
+        layout.addWidget(self.message_list, stretch=1)
+
+        layout.addWidget(self._build_input(on_send))
+        self._load_history()
+
+    def _build_header(self, on_show_key):
+        conv = self.conv
+        header = QFrame()
+        header.setStyleSheet("background: #f5f5f5;")
+        header_layout = QHBoxLayout(header)
+        header_layout.setContentsMargins(24, 12, 24, 12)
+        header_layout.setSpacing(18)
 
-        text_widget.setStyleSheet(f"""
-            QFrame {{
-                background-color: {bg_color};
-                border-radius: 12px;
-            }}
-            QLabel {{
-                background-color: transparent;
-                color: {text_color};
+        # Avatar/Initiales
+        initials = 'G' if conv['type'] == 'group' else ''.join([x[0] for x in conv['name'].split()][:2]).upper()
+        circle = QLabel(initials)
+        circle.setFixedSize(44, 44)
+        circle.setAlignment(Qt.AlignCenter)
+        circle.setStyleSheet("background-color: #d3d3d3; color: #222; font-size: 20px; font-weight: bold; border-radius: 22px;")
+        header_layout.addWidget(circle)
+
+        # Nom et statut
+        label_nom = QLabel(f"<b>{conv['name']}</b>")
+        label_nom.setStyleSheet("font-size: 18px; color: #222;")
+        header_layout.addWidget(label_nom)
+        header_layout.addStretch(1)
+
+        # Icônes de droite
+        logos_layout = QHBoxLayout()
+        logos_layout.setSpacing(12)
+        logos_layout.setContentsMargins(0, 0, 0, 4)
+
+        # Icône de clé cliquable
+        key_icon_path = os.path.join("resources/img", "door-key.png")
+        if os.path.exists(key_icon_path):
+            key_icon_label = QLabel()
+            key_icon_label.setPixmap(cached_pixmap(key_icon_path, 28))
+            key_icon_label.setAlignment(Qt.AlignCenter)
+            key_icon_label.setCursor(Qt.PointingHandCursor)
+            if conv['type'] == 'contact':
+                key_icon_label.mousePressEvent = lambda event, ip=conv['ip']: on_show_key(ip)
+            logos_layout.addWidget(key_icon_label)
+
+        # Icône de cloche (non cliquable pour l'instant)
+        bell_icon_path = os.path.join("resources/img", "bell.png")
+        if os.path.exists(bell_icon_path):
+            bell_icon_label = QLabel()
+            bell_icon_label.setPixmap(cached_pixmap(bell_icon_path, 28))
+            bell_icon_label.setAlignment(Qt.AlignCenter)
+            logos_layout.addWidget(bell_icon_label)
+
+        header_layout.addLayout(logos_layout)
+        return header
+
+    def _build_input(self, on_send):
+        input_frame = QFrame()
+        input_frame.setStyleSheet("background: #f5f5f5; border-top: 1px solid #d3d3d3;")
+        input_layout = QHBoxLayout(input_frame)
+        input_layout.setContentsMargins(18, 10, 18, 10)
+        input_layout.setSpacing(8)
+
+        # Chaque conversation garde son propre champ : le texte en cours de saisie est conservé
+        self.message_input = QLineEdit()
+        self.message_input.setPlaceholderText("Saisissez votre message…")
+        self.message_input.setStyleSheet("""
+            QLineEdit {
                 font-size: 15px;
-            }}
+                padding: 8px;
+                border-radius: 6px;
+                border: 1px solid #ccc;
+                background: white;
+            }
         """)
-        
-        main_layout.addWidget(text_widget)
+        self.message_input.returnPressed.connect(on_send)
+        input_layout.addWidget(self.message_input)
+
+        send_btn = QPushButton()
+        send_btn.setIcon(QIcon(os.path.join("resources/img", "plane.png")))
+        send_btn.setFixedSize(40, 40)
+        send_btn.setIconSize(QSize(22, 22))
+        send_btn.setCursor(Qt.PointingHandCursor)
+        send_btn.setStyleSheet("""
+            QPushButton {
+                background: #D66853;
+                border-radius: 20px;
+                padding: 0px;
+            }
+            QPushButton:hover { background: #c55a47; }
+        """)
+        send_btn.clicked.connect(on_send)
+        input_layout.addWidget(send_btn)
+        return input_frame
+
+    def _fetch_page(self, before_id=None):
+        """Lit une page de l'historique (requête indexée) ; retourne les messages dans l'ordre chronologique."""
+        if self.conv['type'] == 'contact':
+            messages = self.network_manager.get_conversation_page(self.conv['ip'], before_id=before_id)
+        else:
+            messages = self.network_manager.get_group_page(self.conv['name'], before_id=before_id)
+        # Une page incomplète signifie que le début de la conversation est atteint
+        self._history_complete = len(messages) < PAGE_SIZE
+        known_peers = self.network_manager.get_known_peers() if self.conv['type'] == 'group' else None
+        return [self._to_chat_message(message.sender, message.content, message.id, known_peers)
+                for message in messages]
+
+    def _load_history(self):
+        """Affiche la dernière page de l'historique."""
+        messages = self._fetch_page()
+        print(f"[DEBUG] {len(messages)} messages chargés pour {self.conv['name']}")
+        for message in messages:
+            self.message_list.append_message(message)
+        if not messages and self.conv['type'] == 'contact':
+            self._empty_label.show()
+
+    def _load_older(self):
+        """Insère la page précédant le plus ancien message chargé."""
+        oldest_id = self.message_list.model().oldest_id()
+        if self._history_complete or oldest_id is None:
+            return
+        messages = self._fetch_page(before_id=oldest_id)
+        print(f"[DEBUG] {len(messages)} messages plus anciens chargés pour {self.conv['name']}")
+        self.message_list.prepend_messages(messages)
+
+    def _is_sent_by_me(self, sender):
+        if self.conv['type'] == 'contact':
+            return sender != self.conv['ip']
+        # Les messages envoyés depuis ce poste sont enregistrés avec l'expéditeur "Moi"
+        return sender in ("Moi", self.network_manager._get_local_ip())
+
+    def _sent_icon(self):
+        """Icône de statut d'un message remis (contacts uniquement)."""
+        icon_path = os.path.join("resources/img", "check-mark.png")
+        if self.conv['type'] == 'contact' and os.path.exists(icon_path):
+            return icon_path
+        return None
+
+    def _to_chat_message(self, sender, content, message_id=None, known_peers=None):
+        is_sent = self._is_sent_by_me(sender)
+        sender_name = None
+        status_icon = None
+        if is_sent:
+            # Icône de statut pour les messages envoyés
+            status_icon = self._sent_icon()
+        elif self.conv['type'] == 'group':
+            # Ajouter le nom de l'expéditeur pour les groupes
+            if known_peers is None:
+                known_peers = self.network_manager.get_known_peers()
+            sender_name = known_peers.get(sender, {}).get('nom', 'Inconnu')
+        return ChatMessage(message_id, content, is_sent, sender_name, status_icon)
+
+    def _latest_stored_id(self, content):
+        """
+        Identifiant en base d'un message qui vient d'être enregistré (dernier de la conversation),
+        pour pouvoir relire l'historique qui le précède s'il devient le plus ancien message chargé.
+        """
+        if self.conv['type'] == 'contact':
+            latest = self.network_manager.get_conversation_page(self.conv['ip'], limit=1)
+        else:
+            latest = self.network_manager.get_group_page(self.conv['name'], limit=1)
+        return latest[0].id if latest and latest[0].content == content else None
+
+    def append_message(self, sender, content):
+        """Ajoute un message en fin de conversation (coût constant, quelle que soit la longueur de l'historique)."""
+        self._empty_label.hide()
+        message_id = self._latest_stored_id(content)
+        self._append(self._to_chat_message(sender, content, message_id))
+
+    def append_pending(self, pending_id, content):
+        """Ajoute un message en cours d'envoi (horloge jusqu'à sa remise)."""
+        self._empty_label.hide()
+        icon_path = os.path.join("resources/img", "clock.png")
+        self._append(ChatMessage(None, content, True, None, icon_path if os.path.exists(icon_path) else None,
+                                 pending_id))
+
+    def set_pending_status(self, pending_id, delivered):
+        """Met à jour l'icône d'un message envoyé : remis, ou échec de l'envoi."""
+        icon_path = os.path.join("resources/img", "closerouge.png")
+        failed_icon = icon_path if os.path.exists(icon_path) else None
+        self.message_list.model().update_status(pending_id, self._sent_icon() if delivered else failed_icon)
+
+    def _append(self, message):
+        if self.message_list.append_message(message):
+            # Des messages ont été déchargés : ils seront relus dans le stockage en remontant
+            self._history_complete = False
 
 class PublicKeyWindow(QDialog):
     def __init__(self, peer_name, public_key, parent=None):
@@ -449,7 +633,7 @@ class Dashboard(QWidget):
         self.selected_widget = None
         self.conversations = []  # Liste des contacts/conversations actifs
         self.selected_conversation = None
-        self.network_manager = NetworkManager(username or "User")
+        self.network_manager = NetworkManager(username or "User", engine=NETWORK_ENGINE)
         self._connect_network_signals()
 
         # --- INTERFACE GRAPHIQUE ---
@@ -572,6 +756,15 @@ class Dashboard(QWidget):
         self.chat_layout = QVBoxLayout(self.chat_col)
         self.chat_layout.setContentsMargins(0, 0, 0, 0)
         self.chat_layout.setSpacing(0)
+        # Une zone de chat par conversation ouverte, conservée entre deux sélections
+        self.chat_stack = QStackedWidget()
+        self.chat_accueil = QLabel("<span style='color:#bbb;font-size:18px;'>Sélectionnez un contact pour commencer à discuter.</span>")
+        self.chat_accueil.setAlignment(Qt.AlignCenter)
+        self.chat_stack.addWidget(self.chat_accueil)
+        self.chat_layout.addWidget(self.chat_stack)
+        self.chat_views = OrderedDict()  # (type, ip ou nom du groupe) -> ChatView, du moins au plus récent
+        self.pending_messages = {}  # identifiant d'envoi -> (type, ip ou nom du groupe) en attente de remise
+        self.message_input = None
         main_hlayout.addWidget(self.chat_col, stretch=2)
 
         main_vlayout.addLayout(main_hlayout)
@@ -599,6 +792,9 @@ class Dashboard(QWidget):
         self.network_manager.peer_lost.connect(self._on_peer_lost)
         self.network_manager.message_received.connect(self._on_message_received)
         self.network_manager.group_message_received.connect(self._on_group_message_received)
+        self.network_manager.message_queued.connect(self._on_message_queued)
+        self.network_manager.message_sent.connect(self._on_message_sent)
+        self.network_manager.message_failed.connect(self._on_message_failed)
         self.network_manager.log_message.connect(self._on_log_message)
 
     def _on_peer_discovered(self, ip: str, nom: str):
@@ -653,28 +849,36 @@ class Dashboard(QWidget):
     def _on_message_received(self, sender_ip: str, message: str):
         """Callback quand un message direct est reçu"""
         print(f"[DEBUG] Message reçu de {sender_ip}: {message}")
-        # Rafraîchir l'affichage si la conversation actuelle correspond à l'expéditeur
-        if (self.selected_conversation and 
-            self.selected_conversation.get('type') == 'contact' and 
-            self.selected_conversation.get('ip') == sender_ip):
-            print(f"[DEBUG] Rafraîchissement de l'affichage du chat pour {sender_ip}")
-            # Utiliser QTimer pour éviter les problèmes de thread
-            QTimer.singleShot(100, lambda: self.afficher_chat(self.selected_conversation))
-        else:
-            print(f"[DEBUG] Message ignoré car conversation non sélectionnée ou différente")
+        # Le signal est livré dans le thread de l'interface : la bulle est ajoutée directement
+        if not self._ajouter_message_affiche(('contact', sender_ip), sender_ip, message):
+            print(f"[DEBUG] Message non affiché car la conversation n'est pas ouverte")
 
     def _on_group_message_received(self, group_name: str, sender_ip: str, message: str):
         """Callback quand un message de groupe est reçu"""
         print(f"[DEBUG] Message de groupe reçu dans '{group_name}' de {sender_ip}: {message}")
-        # Rafraîchir l'affichage si la conversation actuelle correspond au groupe
-        if (self.selected_conversation and 
-            self.selected_conversation.get('type') == 'group' and 
-            self.selected_conversation.get('name') == group_name):
-            print(f"[DEBUG] Rafraîchissement de l'affichage du chat de groupe pour {group_name}")
-            # Utiliser QTimer pour éviter les problèmes de thread
-            QTimer.singleShot(100, lambda: self.afficher_chat(self.selected_conversation))
-        else:
-            print(f"[DEBUG] Message de groupe ignoré car conversation non sélectionnée ou différente")
+        if not self._ajouter_message_affiche(('group', group_name), sender_ip, message):
+            print(f"[DEBUG] Message de groupe non affiché car le groupe n'est pas ouvert")
+
+    def _on_message_queued(self, message_id: str, conv_type: str, target: str, message: str):
+        """Message confié à l'envoi en arrière-plan : affiché tout de suite, avec une horloge."""
+        key = (conv_type, target)
+        self.pending_messages[message_id] = key
+        view = self.chat_views.get(key)
+        if view is not None:
+            view.append_pending(message_id, message)
+
+    def _on_message_sent(self, message_id: str):
+        key = self.pending_messages.pop(message_id, None)
+        view = self.chat_views.get(key) if key else None
+        if view is not None:
+            view.set_pending_status(message_id, True)
+
+    def _on_message_failed(self, message_id: str, error: str):
+        print(f"[ERROR] Échec de l'envoi du message {message_id}: {error}")
+        key = self.pending_messages.pop(message_id, None)
+        view = self.chat_views.get(key) if key else None
+        if view is not None:
+            view.set_pending_status(message_id, False)
 
     def _on_log_message(self, log_entry: str):
         """Callback pour les messages de log"""
@@ -826,255 +1030,68 @@ class Dashboard(QWidget):
         self.afficher_conversations()
         self.afficher_chat(self.selected_conversation)
 
-    def afficher_chat(self, conv):
-        # Sauvegarder le texte en cours de saisie s'il existe
-        current_text = ""
-        if hasattr(self, 'message_input') and self.message_input is not None:
-            current_text = self.message_input.text()
-        # Nettoyer la zone de chat
-        for i in reversed(range(self.chat_layout.count())):
-            widget = self.chat_layout.itemAt(i).widget()
-            if widget:
-                widget.setParent(None)
+    @staticmethod
+    def _conversation_key(conv):
+        return ('group', conv['name']) if conv['type'] == 'group' else ('contact', conv['ip'])
 
+    def afficher_chat(self, conv):
+        """Affiche la zone de chat de la conversation, construite à la première ouverture puis réutilisée."""
         self.selected_conversation = conv
 
         if conv is None:
             # Message d'accueil
-            accueil = QLabel("<span style='color:#bbb;font-size:18px;'>Sélectionnez un contact pour commencer à discuter.</span>")
-            accueil.setAlignment(Qt.AlignCenter)
-            self.chat_layout.addWidget(accueil)
+            self.message_input = None
+            self.chat_stack.setCurrentWidget(self.chat_accueil)
             return
 
-        # En-tête du chat
-        header = QFrame()
-        header.setStyleSheet("background: #f5f5f5;")
-        header_layout = QHBoxLayout(header)
-        header_layout.setContentsMargins(24, 12, 24, 12)
-        header_layout.setSpacing(18)
-
-        # Avatar/Initiales
-        initials = 'G' if conv['type'] == 'group' else ''.join([x[0] for x in conv['name'].split()][:2]).upper()
-        circle = QLabel(initials)
-        circle.setFixedSize(44, 44)
-        circle.setAlignment(Qt.AlignCenter)
-        circle.setStyleSheet("background-color: #d3d3d3; color: #222; font-size: 20px; font-weight: bold; border-radius: 22px;")
-        header_layout.addWidget(circle)
-
-        # Nom et statut
-        label_nom = QLabel(f"<b>{conv['name']}</b>")
-        label_nom.setStyleSheet("font-size: 18px; color: #222;")
-        header_layout.addWidget(label_nom)
-        header_layout.addStretch(1)
-
-        # Icônes de droite
-        logos_layout = QHBoxLayout()
-        logos_layout.setSpacing(12)
-        logos_layout.setContentsMargins(0, 0, 0, 4) 
-        
-        # Icône de clé cliquable
-        key_icon_path = os.path.join("resources/img", "door-key.png")
-        if os.path.exists(key_icon_path):
-            key_icon_label = QLabel()
-            pixmap = QPixmap(key_icon_path)
-            key_icon_label.setPixmap(pixmap.scaled(28, 28, Qt.KeepAspectRatio, Qt.SmoothTransformation))
-            key_icon_label.setAlignment(Qt.AlignCenter)
-            key_icon_label.setCursor(Qt.PointingHandCursor)
-            if conv['type'] == 'contact':
-                key_icon_label.mousePressEvent = lambda event, ip=conv['ip']: self._show_peer_public_key(ip)
-            logos_layout.addWidget(key_icon_label)
-
-        # Icône de cloche (non cliquable pour l'instant)
-        bell_icon_path = os.path.join("resources/img", "bell.png")
-        if os.path.exists(bell_icon_path):
-            bell_icon_label = QLabel()
-            pixmap = QPixmap(bell_icon_path)
-            bell_icon_label.setPixmap(pixmap.scaled(28, 28, Qt.KeepAspectRatio, Qt.SmoothTransformation))
-            bell_icon_label.setAlignment(Qt.AlignCenter)
-            logos_layout.addWidget(bell_icon_label)
-            
-        header_layout.addLayout(logos_layout)
-        self.chat_layout.addWidget(header)
-
-        # Zone des messages
-        messages_area = QScrollArea()
-        messages_area.setWidgetResizable(True)
-        messages_area.setStyleSheet("QScrollArea { border: none; background: white; }")
-        messages_widget = QWidget()
-        messages_layout = QVBoxLayout(messages_widget)
-        messages_layout.setContentsMargins(24, 18, 24, 18)
-        messages_layout.setSpacing(12)
-
-        # Afficher les messages
-        if conv['type'] == 'contact':
-            messages = self.network_manager.get_messages()
-            
-            # Filtrer les messages pour cette conversation spécifique
-            contact_messages = []
-            my_ip = self.network_manager._get_local_ip()
-            contact_ip = conv['ip']
-            
-            for msg_data in messages:
-                # Gérer l'ancien et le nouveau format de message pour la compatibilité
-                if len(msg_data) == 3:
-                    sender_ip, recipient_ip, message_content = msg_data
-                    # Message envoyé par moi à ce contact
-                    if sender_ip == my_ip and recipient_ip == contact_ip:
-                        contact_messages.append(('sent', message_content))
-                    # Message reçu de ce contact par moi
-                    elif sender_ip == contact_ip and recipient_ip == my_ip:
-                        contact_messages.append(('received', message_content))
-                elif len(msg_data) == 2:
-                    # Logique de secours pour l'ancien format (peut être supprimée plus tard)
-                    sender_ip, message_content = msg_data
-                    if sender_ip == contact_ip:
-                        contact_messages.append(('received', message_content))
-                    elif sender_ip == my_ip: # Affiche tous les messages envoyés
-                        contact_messages.append(('sent', message_content))
-
-            
-            print(f"[DEBUG] Messages filtrés pour {conv['ip']}: {contact_messages}")
-            
-            if not contact_messages:
-                # Ajouter un message d'information
-                info_label = QLabel("Aucun message dans cette conversation")
-                info_label.setStyleSheet("color: #999; font-style: italic;")
-                info_label.setAlignment(Qt.AlignCenter)
-                messages_layout.addWidget(info_label)
-            
-            for msg_type, message_content in contact_messages:
-                
-                bubble = MessageBubble(message_content, msg_type == 'sent', parent=messages_widget)
-                
-                row_layout = QHBoxLayout()
-                
-                if msg_type == 'sent':
-                    # Icône de statut pour les messages envoyés
-                    status_icon = QLabel()
-                    icon_path = os.path.join("resources/img", "check-mark.png")
-                    if os.path.exists(icon_path):
-                        pixmap = QPixmap(icon_path).scaled(16, 16, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-                        status_icon.setPixmap(pixmap)
-                    
-                    row_layout.addStretch()
-                    row_layout.addWidget(bubble)
-                    row_layout.addWidget(status_icon)
-                    row_layout.setAlignment(status_icon, Qt.AlignBottom)
-                
-                else:  # received
-                    row_layout.addWidget(bubble)
-                    row_layout.addStretch()
-                
-                messages_layout.addLayout(row_layout)
-                print(f"[DEBUG] Message ajouté au layout - Type: {msg_type}, Message: {message_content}")
-        else:  # groupe
-            group_messages = self.network_manager.get_group_messages(conv['name'])
-            print(f"[DEBUG] Messages de groupe récupérés pour {conv['name']}: {group_messages}")
-            
-            for sender_ip, message_content in group_messages:
-                
-                is_sent_by_me = sender_ip == self.network_manager._get_local_ip()
-                bubble = MessageBubble(f"{message_content}", is_sent_by_me, parent=messages_widget)
-                
-                row_layout = QHBoxLayout()
-                
-                if is_sent_by_me:
-                    row_layout.addStretch()
-                    row_layout.addWidget(bubble)
-                else:
-                    # Ajouter le nom de l'expéditeur pour les groupes
-                    sender_name = self.network_manager.get_known_peers().get(sender_ip, {}).get('nom', 'Inconnu')
-                    sender_label = QLabel(f"<b>{sender_name}</b>")
-                    sender_label.setStyleSheet("font-size: 13px; color: #666; margin-left: 5px;")
-                    
-                    bubble_with_name_layout = QVBoxLayout()
-                    bubble_with_name_layout.setSpacing(4)
-                    bubble_with_name_layout.addWidget(sender_label, alignment=Qt.AlignLeft)
-                    bubble_with_name_layout.addWidget(bubble)
-                    
-                    row_layout.addLayout(bubble_with_name_layout)
-                    row_layout.addStretch()
-
-                messages_layout.addLayout(row_layout)
-
-        messages_layout.addStretch(1)
-        messages_area.setWidget(messages_widget)
-        self.chat_layout.addWidget(messages_area, stretch=1)
-
-        # Correction finale : double scroll, puis forcer update et scroll à nouveau
-        def scroll_to_last_message():
-            count = messages_layout.count()
-            if count > 1:
-                last_msg_item = messages_layout.itemAt(count - 2)
-                last_msg_widget = last_msg_item.widget()
-                if last_msg_widget:
-                    messages_area.ensureWidgetVisible(last_msg_widget)
-            messages_area.verticalScrollBar().setValue(messages_area.verticalScrollBar().maximum())
-            # Forcer un update puis rescroll après l'event loop
-            def rescroll():
-                messages_area.verticalScrollBar().setValue(messages_area.verticalScrollBar().maximum())
-            QTimer.singleShot(50, rescroll)
-        QTimer.singleShot(0, scroll_to_last_message)
-
-        # Zone de saisie
-        input_frame = QFrame()
-        input_frame.setStyleSheet("background: #f5f5f5; border-top: 1px solid #d3d3d3;")
-        input_layout = QHBoxLayout(input_frame)
-        input_layout.setContentsMargins(18, 10, 18, 10)
-        input_layout.setSpacing(8)
-
-        self.message_input = QLineEdit()
-        self.message_input.setPlaceholderText("Saisissez votre message…")
-        self.message_input.setStyleSheet("""
-            QLineEdit {
-                font-size: 15px;
-                padding: 8px;
-                border-radius: 6px;
-                border: 1px solid #ccc;
-                background: white;
-            }
-        """)
-        # Restaurer le texte précédemment saisi
-        self.message_input.setText(current_text)
-        self.message_input.returnPressed.connect(
-            lambda: self.envoyer_message_groupe(conv['name']) if conv['type'] == 'group' 
-            else self.envoyer_message(conv['ip'])
-        )
-        input_layout.addWidget(self.message_input)
-
-        send_btn = QPushButton()
-        send_btn.setIcon(QIcon(os.path.join("resources/img", "plane.png")))
-        send_btn.setFixedSize(40, 40)
-        send_btn.setIconSize(QSize(22, 22))
-        send_btn.setCursor(Qt.PointingHandCursor)
-        send_btn.setStyleSheet("""
-            QPushButton {
-                background: #D66853;
-                border-radius: 20px;
-                padding: 0px;
-            }
-            QPushButton:hover { background: #c55a47; }
-        """)
-        send_btn.clicked.connect(
-            lambda: self.envoyer_message_groupe(conv['name']) if conv['type'] == 'group'
-            else self.envoyer_message(conv['ip'])
-        )
-        input_layout.addWidget(send_btn)
-
-        self.chat_layout.addWidget(input_frame)
+        key = self._conversation_key(conv)
+        view = self.chat_views.get(key)
+        if view is None:
+            view = ChatView(
+                conv,
+                self.network_manager,
+                on_send=lambda c=conv: self.envoyer_message_groupe(c['name']) if c['type'] == 'group'
+                else self.envoyer_message(c['ip']),
+                on_show_key=self._show_peer_public_key
+            )
+            self.chat_stack.addWidget(view)
+            self.chat_views[key] = view
+            self._limiter_chat_views()
+        else:
+            self.chat_views.move_to_end(key)
+        self.message_input = view.message_input
+        self.chat_stack.setCurrentWidget(view)
+
+    def _limiter_chat_views(self):
+        """Libère les zones de chat les moins récemment ouvertes au-delà de CHAT_VIEW_CACHE_SIZE."""
+        while len(self.chat_views) > CHAT_VIEW_CACHE_SIZE:
+            _, view = self.chat_views.popitem(last=False)
+            self.chat_stack.removeWidget(view)
+            view.deleteLater()
+
+    def _vider_chat_views(self):
+        """Supprime toutes les zones de chat (elles seront reconstruites depuis le stockage)."""
+        for view in self.chat_views.values():
+            self.chat_stack.removeWidget(view)
+            view.deleteLater()
+        self.chat_views.clear()
+        self.message_input = None
+
+    def _ajouter_message_affiche(self, key, sender, message):
+        """Ajoute le message à la zone de chat de la conversation si elle est construite."""
+        view = self.chat_views.get(key)
+        if view is not None:
+            view.append_message(sender, message)
+        return view is not None
 
     def envoyer_message(self, target_ip: str):
         """Envoie un message à un contact"""
         try:
-            if hasattr(self, 'message_input') and self.message_input.text().strip():
+            if self.message_input is not None and self.message_input.text().strip():
                 message = self.message_input.text().strip()
-                success = self.network_manager.send_message(target_ip, message)
-                if success:
-                    self.message_input.clear()
-                    # Rafraîchir l'affichage après un court délai pour laisser le temps au message d'être traité
-                    QTimer.singleShot(100, lambda: self.afficher_chat(self.selected_conversation))
-                else:
-                    QMessageBox.warning(self, "Erreur", "Impossible d'envoyer le message")
+                # Envoi en arrière-plan : la bulle est ajoutée par _on_message_queued
+                self.network_manager.send_message_async(target_ip, message)
+                self.message_input.clear()
         except Exception as e:
             print(f"[ERROR] Erreur lors de l'envoi du message: {str(e)}")
             QMessageBox.warning(self, "Erreur", f"Une erreur est survenue lors de l'envoi du message: {str(e)}")
@@ -1082,15 +1099,11 @@ class Dashboard(QWidget):
     def envoyer_message_groupe(self, group_name: str):
         """Envoie un message à un groupe"""
         try:
-            if hasattr(self, 'message_input') and self.message_input.text().strip():
+            if self.message_input is not None and self.message_input.text().strip():
                 message = self.message_input.text().strip()
-                success = self.network_manager.send_group_message(group_name, message)
-                if success:
-                    self.message_input.clear()
-                    # Rafraîchir l'affichage après un court délai pour laisser le temps au message d'être traité
-                    QTimer.singleShot(100, lambda: self.afficher_chat(self.selected_conversation))
-                else:
-                    QMessageBox.warning(self, "Erreur", "Impossible d'envoyer le message de groupe")
+                # Envoi en arrière-plan ; les membres injoignables sont relancés par le GroupManager
+                self.network_manager.send_group_message_async(group_name, message)
+                self.message_input.clear()
         except Exception as e:
             print(f"[ERROR] Erreur lors de l'envoi du message de groupe: {str(e)}")
             QMessageBox.warning(self, "Erreur", f"Une erreur est survenue lors de l'envoi du message de groupe: {str(e)}")
@@ -1120,6 +1133,7 @@ class Dashboard(QWidget):
         if reply == QMessageBox.Yes:
             # Effacer les messages dans le NetworkManager
             self.network_manager.clear_messages()
+            self._vider_chat_views()
             
             # Rafraîchir l'affichage si une conversation est sélectionnée
             if self.selected_conversation:
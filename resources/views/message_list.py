@@ -0,0 +1,261 @@
+from typing import List, NamedTuple, Optional
+
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QSize, pyqtSignal
+from PyQt5.QtGui import QColor, QFont, QFontMetrics, QPainter
+from PyQt5.QtWidgets import QAbstractItemView, QListView, QStyledItemDelegate
+
+MAX_WIDTH_RATIO = 0.7  # Largeur maximale d'une bulle (part de la zone visible)
+SIDE_MARGIN = 24
+ROW_SPACING = 12
+PADDING_H = 12
+PADDING_V = 10
+RADIUS = 12
+NAME_SPACING = 4
+STATUS_ICON_SIZE = 16
+STATUS_ICON_SPACING = 6
+SENT_COLOR = "#D66853"
+RECEIVED_COLOR = "#6a6a6a"
+NAME_COLOR = "#666"
+LOAD_MORE_THRESHOLD = 40  # Distance (pixels) au haut de la liste qui déclenche le chargement de la page précédente
+STICK_THRESHOLD = 20  # Distance (pixels) au bas de la liste en dessous de laquelle la vue suit les nouveaux messages
+# QListView recalcule la hauteur de toutes les lignes à chaque insertion : au-delà de MAX_LOADED_ROWS,
+# les plus anciennes sont retirées du modèle (elles restent dans le stockage) pour revenir à KEPT_ROWS
+MAX_LOADED_ROWS = 300
+KEPT_ROWS = 200
+
+
+class ChatMessage(NamedTuple):
+    id: Optional[int]  # Identifiant en base (None pour un message ajouté en direct)
+    content: str
+    is_sent: bool
+    sender_name: Optional[str] = None  # Affiché au-dessus des bulles reçues dans un groupe
+    status_icon: Optional[str] = None  # Chemin de l'icône de statut des messages envoyés
+    pending_id: Optional[str] = None  # Identifiant d'envoi (send_message_async) pour suivre son statut
+
+
+class MessageListModel(QAbstractListModel):
+    """
+    Messages chargés d'une conversation, dans l'ordre chronologique.
+    Seules les pages lues dans le stockage sont en mémoire : les plus anciennes sont
+    insérées en tête à la demande, les nouveaux messages ajoutés en fin.
+    """
+
+    MessageRole = Qt.UserRole + 1
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._messages: List[ChatMessage] = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._messages)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        message = self._messages[index.row()]
+        if role == Qt.DisplayRole:
+            return message.content
+        if role == self.MessageRole:
+            return message
+        return None
+
+    def append_message(self, message: ChatMessage):
+        row = len(self._messages)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._messages.append(message)
+        self.endInsertRows()
+
+    def prepend_messages(self, messages: List[ChatMessage]):
+        """Insère une page de messages plus anciens en tête de liste."""
+        if not messages:
+            return
+        self.beginInsertRows(QModelIndex(), 0, len(messages) - 1)
+        self._messages[:0] = messages
+        self.endInsertRows()
+
+    def remove_oldest(self, count: int):
+        """
+        Retire les `count` plus anciens messages chargés, ainsi que les messages ajoutés en direct
+        (sans identifiant) qui précéderaient alors le premier message lu dans le stockage : la page
+        précédente est lue avant ce message (oldest_id) et contiendrait déjà leurs copies enregistrées.
+        """
+        count = min(count, len(self._messages))
+        if count <= 0:
+            return
+        first_stored = next((row for row in range(count, len(self._messages))
+                             if self._messages[row].id is not None), None)
+        if first_stored is not None:
+            count = first_stored
+        self.beginRemoveRows(QModelIndex(), 0, count - 1)
+        del self._messages[:count]
+        self.endRemoveRows()
+
+    def update_status(self, pending_id: str, status_icon: Optional[str]) -> bool:
+        """Change l'icône de statut d'un message envoyé ; les plus récents sont examinés en premier."""
+        for row in range(len(self._messages) - 1, -1, -1):
+            message = self._messages[row]
+            if message.pending_id == pending_id:
+                self._messages[row] = message._replace(status_icon=status_icon)
+                index = self.index(row)
+                self.dataChanged.emit(index, index)
+                return True
+        return False
+
+    def oldest_id(self) -> Optional[int]:
+        """Identifiant du plus ancien message chargé depuis le stockage."""
+        for message in self._messages:
+            if message.id is not None:
+                return message.id
+        return None
+
+
+class MessageBubbleDelegate(QStyledItemDelegate):
+    """
+    Dessine les messages sous forme de bulles ; seules les lignes visibles sont peintes.
+    Les hauteurs sont mises en cache par (texte, nom, largeur) : la mise en page de la liste
+    ne mesure chaque texte qu'une fois tant que la largeur de la vue ne change pas.
+    """
+
+    def __init__(self, view, pixmap_loader, parent=None):
+        super().__init__(parent)
+        self.view = view
+        self.pixmap_loader = pixmap_loader
+        self.text_font = QFont()
+        self.text_font.setPixelSize(15)
+        self.name_font = QFont()
+        self.name_font.setPixelSize(13)
+        self.name_font.setBold(True)
+        self._text_metrics = QFontMetrics(self.text_font)
+        self._name_metrics = QFontMetrics(self.name_font)
+        self._size_cache = {}
+        self._cache_width = None
+
+    def _max_text_width(self, width):
+        return max(40, int((width - 2 * SIDE_MARGIN) * MAX_WIDTH_RATIO) - 2 * PADDING_H)
+
+    def _text_rect(self, message, width):
+        return self._text_metrics.boundingRect(QRect(0, 0, self._max_text_width(width), 1_000_000),
+                                               Qt.TextWordWrap, message.content)
+
+    def sizeHint(self, option, index):
+        message = index.data(MessageListModel.MessageRole)
+        width = self.view.viewport().width()
+        if width != self._cache_width:
+            self._size_cache.clear()
+            self._cache_width = width
+        key = (message.content, message.sender_name)
+        height = self._size_cache.get(key)
+        if height is None:
+            height = self._text_rect(message, width).height() + 2 * PADDING_V + ROW_SPACING
+            if message.sender_name:
+                height += self._name_metrics.height() + NAME_SPACING
+            self._size_cache[key] = height
+        return QSize(width, height)
+
+    def paint(self, painter, option, index):
+        message = index.data(MessageListModel.MessageRole)
+        rect = option.rect
+        text_rect = self._text_rect(message, rect.width())
+        bubble_width = text_rect.width() + 2 * PADDING_H
+        bubble_height = text_rect.height() + 2 * PADDING_V
+        top = rect.top() + ROW_SPACING // 2
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+
+        if message.sender_name:
+            painter.setFont(self.name_font)
+            painter.setPen(QColor(NAME_COLOR))
+            name_rect = QRect(rect.left() + SIDE_MARGIN + 5, top, rect.width() - 2 * SIDE_MARGIN,
+                              self._name_metrics.height())
+            painter.drawText(name_rect, Qt.AlignLeft | Qt.AlignVCenter, message.sender_name)
+            top += self._name_metrics.height() + NAME_SPACING
+
+        right = rect.right() - SIDE_MARGIN
+        if message.is_sent:
+            if message.status_icon:
+                pixmap = self.pixmap_loader(message.status_icon, STATUS_ICON_SIZE)
+                painter.drawPixmap(right - STATUS_ICON_SIZE, top + bubble_height - STATUS_ICON_SIZE, pixmap)
+                right -= STATUS_ICON_SIZE + STATUS_ICON_SPACING
+            bubble = QRect(right - bubble_width, top, bubble_width, bubble_height)
+            color = SENT_COLOR
+        else:
+            bubble = QRect(rect.left() + SIDE_MARGIN, top, bubble_width, bubble_height)
+            color = RECEIVED_COLOR
+
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor(color))
+        painter.drawRoundedRect(bubble, RADIUS, RADIUS)
+        painter.setFont(self.text_font)
+        painter.setPen(QColor("white"))
+        painter.drawText(bubble.adjusted(PADDING_H, PADDING_V, -PADDING_H, -PADDING_V),
+                         Qt.TextWordWrap, message.content)
+        painter.restore()
+
+
+class MessageListView(QListView):
+    """
+    Liste de messages virtualisée.
+    Suit le dernier message tant que l'utilisateur est en bas de la liste, émet
+    `older_requested` quand il atteint le haut et conserve sa position quand une
+    page plus ancienne est insérée au-dessus. Le nombre de lignes chargées reste
+    borné tant que l'utilisateur suit la conversation.
+    """
+
+    older_requested = pyqtSignal()
+
+    def __init__(self, pixmap_loader, parent=None):
+        super().__init__(parent)
+        self.setModel(MessageListModel(self))
+        self.setItemDelegate(MessageBubbleDelegate(self, pixmap_loader, self))
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setFocusPolicy(Qt.NoFocus)
+        self.setResizeMode(QListView.Adjust)
+        self.setStyleSheet("QListView { border: none; background: white; }")
+        self.verticalScrollBar().setSingleStep(20)
+        # Distance au bas de la liste à conserver quand le contenu change (0 : suivre le dernier message)
+        self._anchor_from_bottom: Optional[int] = 0
+        self._adjusting = False
+        self.verticalScrollBar().rangeChanged.connect(self._on_range_changed)
+        self.verticalScrollBar().valueChanged.connect(self._on_scrolled)
+
+    def append_message(self, message: ChatMessage) -> bool:
+        """Ajoute un message en fin de liste. Retourne True si des messages anciens ont été déchargés."""
+        if message.is_sent:
+            # Un message envoyé ramène toujours la vue en bas
+            self._anchor_from_bottom = 0
+        model = self.model()
+        model.append_message(message)
+        # Le modèle n'est réduit que si l'utilisateur suit la fin de la conversation
+        if self._anchor_from_bottom == 0 and model.rowCount() > MAX_LOADED_ROWS:
+            model.remove_oldest(model.rowCount() - KEPT_ROWS)
+            return True
+        return False
+
+    def prepend_messages(self, messages: List[ChatMessage]):
+        scrollbar = self.verticalScrollBar()
+        if self._anchor_from_bottom is None:
+            self._anchor_from_bottom = scrollbar.maximum() - scrollbar.value()
+        self.model().prepend_messages(messages)
+
+    def _on_scrolled(self, value):
+        if self._adjusting:
+            return
+        scrollbar = self.verticalScrollBar()
+        self._anchor_from_bottom = 0 if value >= scrollbar.maximum() - STICK_THRESHOLD else None
+        if value <= scrollbar.minimum() + LOAD_MORE_THRESHOLD and scrollbar.maximum() > 0:
+            self.older_requested.emit()
+
+    def _on_range_changed(self, minimum, maximum):
+        if self._anchor_from_bottom is None:
+            return
+        self._adjusting = True
+        try:
+            self.verticalScrollBar().setValue(maximum - self._anchor_from_bottom)
+        finally:
+            self._adjusting = False
+        if self._anchor_from_bottom:
+            # Position rétablie après l'insertion d'une page : l'utilisateur reprend la main
+            self._anchor_from_bottom = None
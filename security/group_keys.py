@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+from app.crypto_manager import CryptoManager
+from network.envelope import GROUP_KEY_ID_SIZE
+from network.group_relay import signed_key_data
+
+MAX_INCOMING_KEYS_PER_SENDER = 2  # Garde l'ancienne clé le temps que les messages en vol (et relancés) arrivent
+
+
+class OutgoingGroupKey:
+    def __init__(self, group_name: str, key_id: bytes, key: bytes, members: FrozenSet[str]):
+        self.group_name = group_name
+        self.key_id = key_id
+        self.key = key
+        self.members = members  # Membres du groupe au moment de la création de la clé
+        self.created = time.monotonic()
+        self._wrapped: Dict[str, Tuple[bytes, bytes]] = {}  # ip -> (certificat, clé chiffrée pour ce certificat)
+        self._announced = set()  # Membres à qui la clé a été transmise (trame FRAME_GROUPKEY)
+        self._signature: Optional[bytes] = None
+        self._lock = threading.Lock()
+
+    def wrapped_for(self, ip: str, cert_pem: bytes) -> bytes:
+        """Clé chiffrée avec le certificat du membre ; RSA n'est calculé qu'une fois par membre et par clé."""
+        with self._lock:
+            entry = self._wrapped.get(ip)
+            if entry and entry[0] == cert_pem:
+                return entry[1]
+        encrypted_key = CryptoManager.encrypt_with_cert(cert_pem, self.key)
+        with self._lock:
+            self._wrapped[ip] = (cert_pem, encrypted_key)
+            # Nouveau certificat (clé du membre renouvelée) : l'annonce précédente n'est plus lisible
+            self._announced.discard(ip)
+        return encrypted_key
+
+    def signature(self) -> bytes:
+        """Signature de la clé par l'émetteur, jointe aux trames de relais ; calculée une fois par clé."""
+        with self._lock:
+            if self._signature is None:
+                self._signature = CryptoManager.sign(signed_key_data(self.key_id, self.group_name, self.key))
+            return self._signature
+
+    def is_announced(self, ip: str) -> bool:
+        with self._lock:
+            return ip in self._announced
+
+    def mark_announced(self, ip: str) -> None:
+        with self._lock:
+            self._announced.add(ip)
+
+
+class GroupKeyCache:
+    """
+    Clés de groupe AES ("clés d'expéditeur").
+    Chaque membre chiffre ses messages de groupe avec sa propre clé pour ce groupe : le message
+    est chiffré une seule fois et le même chiffré est envoyé à tous les membres. La clé est
+    transmise à chaque membre chiffrée avec RSA (une opération par membre et par clé, pas par
+    message) et renouvelée dès que la liste des membres change, pour qu'un membre retiré ne
+    puisse pas lire les messages suivants.
+    """
+
+    def __init__(self):
+        self._outgoing: Dict[str, OutgoingGroupKey] = {}  # nom du groupe -> clé d'envoi
+        self._incoming: Dict[str, Dict[bytes, Tuple[str, bytes, float]]] = {}  # ip -> {id: (groupe, clé, réception)}
+        self._lock = threading.Lock()
+
+    def get_outgoing(self, group_name: str, members: Iterable[str]) -> OutgoingGroupKey:
+        """Retourne la clé d'envoi du groupe, renouvelée si les membres ont changé depuis sa création."""
+        members = frozenset(members)
+        with self._lock:
+            group_key = self._outgoing.get(group_name)
+            if group_key is None or group_key.members != members:
+                group_key = OutgoingGroupKey(group_name, os.urandom(GROUP_KEY_ID_SIZE), os.urandom(32), members)
+                self._outgoing[group_name] = group_key
+            return group_key
+
+    def rotate(self, group_name: str) -> None:
+        """Oublie la clé d'envoi du groupe : une nouvelle clé sera créée au prochain message."""
+        with self._lock:
+            self._outgoing.pop(group_name, None)
+
+    def store_incoming(self, ip: str, group_name: str, key_id: bytes, key: bytes) -> None:
+        """Enregistre la clé de groupe annoncée par un membre."""
+        with self._lock:
+            keys = self._incoming.setdefault(ip, {})
+            keys[key_id] = (group_name, key, time.monotonic())
+            same_group = [kid for kid, entry in keys.items() if entry[0] == group_name]
+            while len(same_group) > MAX_INCOMING_KEYS_PER_SENDER:
+                oldest = min(same_group, key=lambda kid: keys[kid][2])
+                del keys[oldest]
+                same_group.remove(oldest)
+
+    def get_incoming(self, ip: str, key_id: bytes) -> Optional[Tuple[str, bytes]]:
+        """Retourne (nom du groupe, clé) pour une clé annoncée par ce membre, ou None si elle est inconnue."""
+        with self._lock:
+            entry = self._incoming.get(ip, {}).get(key_id)
+            return (entry[0], entry[1]) if entry else None
+
+    def clear(self) -> None:
+        """Oublie toutes les clés (rotation des clés locales)."""
+        with self._lock:
+            self._outgoing.clear()
+            self._incoming.clear()
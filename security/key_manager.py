@@ -1,61 +1,63 @@
 from datetime import datetime, timedelta
-import json
 import os
+import threading
 from app.crypto_manager import CryptoManager
-from typing import Optional, Dict, List
+from security.key_store import KeyStore, get_key_store
+from utils.journal import AppendOnlyJournal
+from cryptography.hazmat.primitives import serialization
+from typing import Optional, Dict, List, Set
 
 STORAGE_DIR = os.path.join(os.path.dirname(__file__), '..', 'storage')
-PUBLIC_KEYS_FILE = os.path.join(STORAGE_DIR, 'public_keys.json')
 SECURITY_LOG_FILE = os.path.join(STORAGE_DIR, 'security_log.enc')
 
 class KeyManager:
-    def __init__(self, log_func=None):
+    def __init__(self, log_func=None, key_store: Optional[KeyStore] = None):
         self._log = log_func if log_func else lambda msg, _: None
         os.makedirs(STORAGE_DIR, exist_ok=True)
-        self.public_keys = self._load_public_keys()
-        self.revoked_certs_file = os.path.join(STORAGE_DIR, 'revoked_certs.json')
+        # Clés publiques des pairs, partagées avec MessageManager
+        self.key_store = key_store if key_store is not None else get_key_store()
+        # Certificats révoqués : index par numéro de série, tenu à jour avec un journal en ajout seul
+        self.revoked_certs_file = os.path.join(STORAGE_DIR, 'revoked_certs.json')  # Ancien format, migré au démarrage
+        self.revocation_journal = AppendOnlyJournal(os.path.join(STORAGE_DIR, 'revoked_certs.jsonl'),
+                                                    log_func=lambda msg: self._log(msg, "KEY_MANAGER"))
+        self._revoked: Dict[str, Dict] = {}  # numéro de série -> {serial, revocation_date, reason}
+        # Pairs ayant présenté un certificat révoqué, et empreintes de ces certificats : le rejet est
+        # définitif, même si le pair annonce ensuite une autre empreinte ou si sa clé n'est plus en cache
+        self._revoked_ips: Set[str] = set()
+        self._revoked_fingerprints: Set[bytes] = set()
+        self._revoked_lock = threading.Lock()
         self.security_log_file = SECURITY_LOG_FILE
         self.key_rotation_interval = timedelta(days=30)  # Rotation des clés tous les 30 jours
         self._load_revoked_certs()
 
     def _load_revoked_certs(self) -> None:
-        """Charge la liste des certificats révoqués"""
-        if os.path.exists(self.revoked_certs_file):
-            with open(self.revoked_certs_file, 'r') as f:
-                self.revoked_certs = json.load(f)
-        else:
-            self.revoked_certs = []
-
-    def _save_revoked_certs(self) -> None:
-        """Sauvegarde la liste des certificats révoqués"""
-        os.makedirs(STORAGE_DIR, exist_ok=True)
-        with open(self.revoked_certs_file, 'w') as f:
-            json.dump(self.revoked_certs, f)
-
-    def _load_public_keys(self) -> Dict:
-        if os.path.exists(PUBLIC_KEYS_FILE):
-            try:
-                with open(PUBLIC_KEYS_FILE, 'r') as f:
-                    return json.load(f)
-            except (IOError, json.JSONDecodeError) as e:
-                self._log(f"Erreur de chargement de public_keys.json: {e}", "KEY_MANAGER")
-                return {}
-        return {}
-
-    def _save_public_keys(self):
-        try:
-            with open(PUBLIC_KEYS_FILE, 'w') as f:
-                json.dump(self.public_keys, f, indent=4)
-        except IOError as e:
-            self._log(f"Erreur de sauvegarde de public_keys.json: {e}", "KEY_MANAGER")
+        """Charge l'index des certificats révoqués depuis le journal (après migration de revoked_certs.json)"""
+        self.revocation_journal.import_legacy(
+            self.revoked_certs_file,
+            lambda certs: [dict(cert, op='revoke', serial=str(cert['serial'])) for cert in certs]
+        )
+        for record in self.revocation_journal.replay():
+            if record.pop('op', None) == 'revoke':
+                self._revoked[str(record['serial'])] = record
+        for serial in self._revoked:
+            self._mark_serial_revoked(serial)
+
+    @property
+    def revoked_certs(self) -> List[Dict]:
+        """Certificats révoqués, dans l'ordre de révocation"""
+        with self._revoked_lock:
+            return list(self._revoked.values())
 
-    def add_public_key(self, ip: str, key_pem: str):
+    def add_public_key(self, ip: str, key_pem: str) -> bool:
+        if self.is_key_revoked(key_pem, ip):
+            self._log(f"Clé publique de {ip} refusée : certificat révoqué", "KEY_MANAGER")
+            return False
         self._log(f"Ajout de la clé publique pour {ip}", "KEY_MANAGER")
-        self.public_keys[ip] = key_pem
-        self._save_public_keys()
+        self.key_store.set(ip, key_pem)
+        return True
 
     def get_public_key(self, ip: str) -> Optional[str]:
-        return self.public_keys.get(ip)
+        return self.key_store.get(ip)
 
     def check_key_rotation(self) -> bool:
         """Vérifie si une rotation des clés est nécessaire"""
@@ -78,10 +80,12 @@ class KeyManager:
         try:
             self._log(f"Rotation des clés demandée pour {username}", "KEY_MANAGER")
             CryptoManager.generate_key_and_cert(username)
+            # L'ancienne clé privée ne doit plus être servie depuis le cache
+            CryptoManager.invalidate_key_cache()
             self._log(f"Nouvelle paire de clés générée pour {username}", "KEY_MANAGER")
             
             # Recharger la clé publique pour le broadcast
-            cert = CryptoManager.load_certificate(username)
+            cert = CryptoManager.load_certificate()
             if cert:
                 public_key_pem = cert.public_bytes(serialization.Encoding.PEM).decode()
                 # Cette information devra peut-être remonter au NetworkManager pour être diffusée
@@ -95,12 +99,19 @@ class KeyManager:
     def revoke_certificate(self, serial_number: str, reason: str) -> bool:
         """Révoque un certificat"""
         try:
-            self.revoked_certs.append({
+            serial_number = str(serial_number)
+            record = {
                 'serial': serial_number,
                 'revocation_date': datetime.utcnow().isoformat(),
                 'reason': reason
-            })
-            self._save_revoked_certs()
+            }
+            with self._revoked_lock:
+                if serial_number in self._revoked:
+                    return True
+                # Une ligne ajoutée au journal au lieu de réécrire toute la liste
+                self.revocation_journal.append(dict(record, op='revoke'))
+                self._revoked[serial_number] = record
+            self._mark_serial_revoked(serial_number)
             self.log_security_event(f"Certificat {serial_number} révoqué pour raison: {reason}")
             return True
         except Exception as e:
@@ -108,17 +119,67 @@ class KeyManager:
             return False
 
     def is_certificate_revoked(self, serial_number: str) -> bool:
-        """Vérifie si un certificat est révoqué"""
-        return any(cert['serial'] == str(serial_number) for cert in self.revoked_certs)
+        """Vérifie si un certificat est révoqué (recherche dans l'index, O(1))"""
+        return str(serial_number) in self._revoked
+
+    def is_peer_revoked(self, ip: str, fingerprint: Optional[bytes] = None) -> bool:
+        """
+        Vérifie si ce pair a présenté un certificat révoqué, sans relire le certificat.
+        Le rejet est définitif, quelle que soit la clé en cache ; `fingerprint` (empreinte annoncée
+        dans la balise) permet de reconnaître un certificat révoqué sous une nouvelle adresse.
+        """
+        with self._revoked_lock:
+            if ip in self._revoked_ips:
+                return True
+            if fingerprint is not None and fingerprint in self._revoked_fingerprints:
+                self._revoked_ips.add(ip)
+                return True
+        serial = self.key_store.serial(ip)
+        if serial is None or serial not in self._revoked:
+            return False
+        self._mark_peer_revoked(ip, self.key_store.fingerprint(ip))
+        return True
+
+    def is_key_revoked(self, key_pem: str, ip: Optional[str] = None) -> bool:
+        """
+        Vérifie si le certificat PEM présenté par un pair est révoqué.
+        Si `ip` est fourni, le pair est retenu comme révoqué, et une clé présentée par un pair
+        déjà révoqué est refusée même si son certificat ne l'est pas.
+        """
+        if ip is not None and self.is_peer_revoked(ip):
+            return True
+        try:
+            cert_pem = key_pem.encode()
+            if CryptoManager.certificate_serial(cert_pem) not in self._revoked:
+                return False
+            fingerprint = CryptoManager.key_fingerprint(cert_pem)
+        except Exception:
+            return False
+        if ip is not None:
+            self._mark_peer_revoked(ip, fingerprint)
+        return True
+
+    def _mark_peer_revoked(self, ip: str, fingerprint: Optional[bytes]) -> None:
+        with self._revoked_lock:
+            if ip not in self._revoked_ips:
+                self._log(f"Pair {ip} rejeté : certificat révoqué", "KEY_MANAGER")
+            self._revoked_ips.add(ip)
+            if fingerprint is not None:
+                self._revoked_fingerprints.add(fingerprint)
+
+    def _mark_serial_revoked(self, serial: str) -> None:
+        """Retient comme révoqués les pairs dont le certificat en cache a ce numéro de série."""
+        for ip in self.key_store.find_by_serial(serial):
+            self._mark_peer_revoked(ip, self.key_store.fingerprint(ip))
 
-    def log_security_event(self, event_message: str, username: str):
+    def log_security_event(self, event_message: str, username: Optional[str] = None):
         """
         Chiffre et enregistre un événement de sécurité.
         """
         try:
             # Pour chiffrer, il faudrait une clé. Utiliser la clé publique de l'utilisateur
             # pour qu'il puisse déchiffrer avec sa clé privée est une option.
-            cert = CryptoManager.load_certificate(username)
+            cert = CryptoManager.load_certificate()
             if not cert:
                 self._log("Impossible de logger l'événement, certificat non trouvé.", "KEY_MANAGER")
                 return
@@ -0,0 +1,195 @@
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+from app.crypto_manager import CryptoManager
+
+STORAGE_DIR = os.path.join(os.path.dirname(__file__), '..', 'storage')
+PUBLIC_KEYS_FILE = os.path.join(STORAGE_DIR, 'public_keys.json')
+SAVE_DELAY = 1.0  # Secondes entre une modification et l'écriture du fichier (modifications regroupées)
+
+
+class KeyStore:
+    """
+    Clés publiques des pairs (certificats PEM), partagées par KeyManager et MessageManager.
+    La table en mémoire est protégée par un verrou et indexée par IP et par empreinte de clé
+    (`CryptoManager.key_fingerprint`) ; le numéro de série du certificat de chaque pair est
+    gardé pour vérifier sa révocation sans relire le certificat.
+    Le fichier n'est pas réécrit à chaque modification : les modifications faites pendant
+    SAVE_DELAY secondes sont écrites ensemble, dans un fichier temporaire substitué
+    atomiquement au fichier de clés (os.replace).
+    """
+
+    def __init__(self, path: str = PUBLIC_KEYS_FILE, save_delay: float = SAVE_DELAY, log_func=None):
+        self.path = path
+        self.save_delay = save_delay
+        self.log = log_func if log_func else lambda msg: None
+        self._keys: Dict[str, str] = {}  # ip -> certificat PEM
+        self._fingerprints: Dict[str, bytes] = {}  # ip -> empreinte de la clé
+        self._by_fingerprint: Dict[bytes, Set[str]] = {}  # empreinte -> ip
+        self._serials: Dict[str, str] = {}  # ip -> numéro de série du certificat
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # Une seule écriture du fichier à la fois
+        self._dirty = False
+        self._save_timer: Optional[threading.Timer] = None
+        self._load()
+
+    # === LECTURE ===
+
+    def get(self, ip: str) -> Optional[str]:
+        with self._lock:
+            return self._keys.get(ip)
+
+    def __contains__(self, ip: str) -> bool:
+        with self._lock:
+            return ip in self._keys
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._keys)
+
+    def snapshot(self) -> Dict[str, str]:
+        """Copie de la table : ip -> certificat PEM."""
+        with self._lock:
+            return dict(self._keys)
+
+    def fingerprint(self, ip: str) -> Optional[bytes]:
+        with self._lock:
+            return self._fingerprints.get(ip)
+
+    def serial(self, ip: str) -> Optional[str]:
+        """Numéro de série du certificat connu pour ce pair."""
+        with self._lock:
+            return self._serials.get(ip)
+
+    def find_by_fingerprint(self, fingerprint: bytes) -> List[str]:
+        """Adresses dont la clé connue a cette empreinte."""
+        with self._lock:
+            return sorted(self._by_fingerprint.get(fingerprint, ()))
+
+    def find_by_serial(self, serial: str) -> List[str]:
+        """Adresses dont le certificat connu a ce numéro de série (parcours complet : révocations seulement)."""
+        with self._lock:
+            return sorted(ip for ip, known in self._serials.items() if known == serial)
+
+    # === MODIFICATION ===
+
+    def set(self, ip: str, key_pem: str) -> bool:
+        """Enregistre la clé d'un pair. Retourne False si elle était déjà connue."""
+        identity = self._identify(ip, key_pem)
+        with self._lock:
+            if self._keys.get(ip) == key_pem:
+                return False
+            self._unindex(ip)
+            self._keys[ip] = key_pem
+            self._index(ip, identity)
+            self._schedule_save()
+        return True
+
+    def remove(self, ip: str, key_pem: Optional[str] = None) -> bool:
+        """Oublie la clé d'un pair (seulement si c'est encore `key_pem`, s'il est fourni)."""
+        with self._lock:
+            current = self._keys.get(ip)
+            if current is None or (key_pem is not None and current != key_pem):
+                return False
+            self._unindex(ip)
+            del self._keys[ip]
+            self._schedule_save()
+        return True
+
+    # === PERSISTANCE ===
+
+    def flush(self) -> None:
+        """Écrit tout de suite les modifications en attente."""
+        with self._write_lock:
+            with self._lock:
+                if self._save_timer is not None:
+                    self._save_timer.cancel()
+                    self._save_timer = None
+                if not self._dirty:
+                    return
+                keys = dict(self._keys)
+                self._dirty = False
+            # Écriture hors du verrou de la table : les lectures ne sont pas bloquées par le fsync
+            try:
+                self._write(keys)
+            except OSError as e:
+                with self._lock:
+                    self._dirty = True
+                self.log(f"[ERREUR] Sauvegarde des clés publiques impossible : {e}")
+
+    def close(self) -> None:
+        self.flush()
+
+    def _schedule_save(self) -> None:
+        """Planifie l'écriture du fichier (verrou tenu)."""
+        self._dirty = True
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(self.save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _write(self, keys: Dict[str, str]) -> None:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(keys, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                keys = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            self.log(f"[ERREUR] Lecture de {self.path} impossible : {e}")
+            return
+        for ip, key_pem in keys.items():
+            self._keys[ip] = key_pem
+            self._index(ip, self._identify(ip, key_pem))
+
+    # === INDEX DES EMPREINTES ET NUMÉROS DE SÉRIE ===
+
+    def _identify(self, ip: str, key_pem: str) -> Optional[Tuple[bytes, str]]:
+        """(empreinte de la clé, numéro de série du certificat), ou None si le PEM est illisible."""
+        try:
+            cert_pem = key_pem.encode()
+            return CryptoManager.key_fingerprint(cert_pem), CryptoManager.certificate_serial(cert_pem)
+        except Exception as e:
+            self.log(f"[AVERTISSEMENT] Clé publique illisible pour {ip} : {e}")
+            return None
+
+    def _index(self, ip: str, identity: Optional[Tuple[bytes, str]]) -> None:
+        if identity is None:
+            return
+        fingerprint, serial = identity
+        self._fingerprints[ip] = fingerprint
+        self._by_fingerprint.setdefault(fingerprint, set()).add(ip)
+        self._serials[ip] = serial
+
+    def _unindex(self, ip: str) -> None:
+        self._serials.pop(ip, None)
+        fingerprint = self._fingerprints.pop(ip, None)
+        if fingerprint is None:
+            return
+        ips = self._by_fingerprint.get(fingerprint)
+        if ips is not None:
+            ips.discard(ip)
+            if not ips:
+                del self._by_fingerprint[fingerprint]
+
+
+_store: Optional[KeyStore] = None
+_store_lock = threading.Lock()
+
+
+def get_key_store() -> KeyStore:
+    """Table des clés publiques partagée par toute l'application."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = KeyStore()
+        return _store
@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from app.crypto_manager import CryptoManager
+from network.envelope import SESSION_ID_SIZE
+
+SESSION_LIFETIME = 600  # Secondes avant renouvellement de la clé de session
+SESSION_MAX_MESSAGES = 1000  # Nombre de messages avant renouvellement
+MAX_INCOMING_SESSIONS_PER_PEER = 2  # Garde l'ancienne session le temps que les messages en vol arrivent
+
+
+class OutgoingSession:
+    def __init__(self, session_id: bytes, key: bytes, encrypted_key: bytes):
+        self.session_id = session_id
+        self.key = key
+        self.encrypted_key = encrypted_key  # Clé AES chiffrée avec le certificat du pair
+        self.created = time.monotonic()
+        self.messages_sent = 0
+        self.announced = False  # True une fois la clé transmise au pair (trame FRAME_SESSION_KEY)
+
+
+class SessionKeyCache:
+    """
+    Clés de session AES par pair.
+    La clé est chiffrée une fois avec RSA et annoncée au pair avant le premier message de la session
+    (et au début de chaque nouvelle connexion) ; les messages ne coûtent ensuite qu'un chiffrement AES.
+    """
+
+    def __init__(self, lifetime: float = SESSION_LIFETIME, max_messages: int = SESSION_MAX_MESSAGES):
+        self.lifetime = lifetime
+        self.max_messages = max_messages
+        self._outgoing: Dict[str, OutgoingSession] = {}  # ip -> session d'envoi
+        self._incoming: Dict[str, Dict[bytes, Tuple[bytes, float]]] = {}  # ip -> {id: (clé, création)}
+        self._lock = threading.Lock()
+
+    def get_outgoing(self, ip: str, cert_pem: bytes) -> OutgoingSession:
+        """Retourne la session d'envoi vers un pair, en la (re)créant si elle a expiré."""
+        with self._lock:
+            session = self._outgoing.get(ip)
+            if session and not self._is_expired(session):
+                session.messages_sent += 1
+                return session
+        # Chiffrement RSA hors verrou : c'est l'opération coûteuse
+        key = os.urandom(32)  # AES-256
+        session = OutgoingSession(os.urandom(SESSION_ID_SIZE), key, CryptoManager.encrypt_with_cert(cert_pem, key))
+        session.messages_sent = 1
+        with self._lock:
+            self._outgoing[ip] = session
+        return session
+
+    def drop_outgoing(self, ip: str) -> None:
+        """Oublie la session d'envoi (échec d'envoi, clé du pair changée, pair perdu)."""
+        with self._lock:
+            self._outgoing.pop(ip, None)
+
+    def store_incoming(self, ip: str, session_id: bytes, key: bytes) -> None:
+        """Enregistre une clé de session reçue d'un pair."""
+        with self._lock:
+            sessions = self._incoming.setdefault(ip, {})
+            sessions[session_id] = (key, time.monotonic())
+            while len(sessions) > MAX_INCOMING_SESSIONS_PER_PEER:
+                oldest = min(sessions, key=lambda sid: sessions[sid][1])
+                del sessions[oldest]
+
+    def get_incoming(self, ip: str, session_id: bytes) -> Optional[bytes]:
+        """Retourne la clé d'une session reçue, ou None si elle est inconnue ou expirée."""
+        with self._lock:
+            entry = self._incoming.get(ip, {}).get(session_id)
+            if entry is None:
+                return None
+            key, created = entry
+            # Marge sur la durée de vie : l'émetteur peut encore utiliser la session juste avant son expiration
+            if time.monotonic() - created > self.lifetime * 2:
+                del self._incoming[ip][session_id]
+                return None
+            return key
+
+    def clear_outgoing(self) -> None:
+        """
+        Oublie toutes les sessions d'envoi (rotation des clés locales).
+        Les sessions reçues restent valides : leurs clés AES sont déjà déchiffrées.
+        """
+        with self._lock:
+            self._outgoing.clear()
+
+    def clear(self) -> None:
+        """Oublie toutes les sessions, d'envoi et reçues."""
+        with self._lock:
+            self._outgoing.clear()
+            self._incoming.clear()
+
+    def _is_expired(self, session: OutgoingSession) -> bool:
+        return (time.monotonic() - session.created > self.lifetime
+                or session.messages_sent >= self.max_messages)
@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+FSYNC_BATCH = 32  # Enregistrements écrits avant un fsync forcé
+FSYNC_INTERVAL = 1.0  # Délai maximal (secondes) entre une écriture et son fsync
+COMPACT_MIN_RECORDS = 1000  # Pas de compaction en dessous de ce nombre d'enregistrements
+COMPACT_RATIO = 2  # Compaction quand le journal dépasse ce multiple de l'état vivant
+
+
+class AppendOnlyJournal:
+    """
+    Journal en ajout seul : un enregistrement JSON par ligne.
+    Chaque ajout est écrit et vidé immédiatement vers le système ; le fsync est groupé
+    (tous les FSYNC_BATCH enregistrements ou au plus FSYNC_INTERVAL secondes après l'écriture).
+    Une ligne tronquée par un arrêt brutal est ignorée à la relecture.
+    La compaction réécrit l'état courant dans un fichier temporaire puis le substitue
+    atomiquement au journal (os.replace).
+    """
+
+    def __init__(self, path: str, fsync_batch: int = FSYNC_BATCH, fsync_interval: float = FSYNC_INTERVAL,
+                 log_func=None):
+        self.path = path
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.log = log_func if log_func else lambda msg: None
+        self.record_count = 0  # Lignes présentes dans le fichier
+        self._lock = threading.Lock()
+        self._file = None
+        self._unsynced = 0
+        self._sync_timer: Optional[threading.Timer] = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def replay(self) -> Iterator[Dict]:
+        """Relit tous les enregistrements du journal dans l'ordre d'écriture."""
+        self.record_count = 0
+        if not self.exists():
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Dernière ligne interrompue par un arrêt brutal
+                    self.log(f"[AVERTISSEMENT] Ligne {line_number} illisible ignorée dans {self.path}")
+                    continue
+                self.record_count += 1
+                yield record
+
+    def append(self, record: Dict) -> None:
+        """Ajoute un enregistrement en fin de journal."""
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self._lock:
+            f = self._open()
+            f.write(line)
+            f.flush()
+            self.record_count += 1
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_batch:
+                self._sync_locked()
+            elif self._sync_timer is None:
+                self._sync_timer = threading.Timer(self.fsync_interval, self.sync)
+                self._sync_timer.daemon = True
+                self._sync_timer.start()
+
+    def sync(self) -> None:
+        """Force l'écriture sur disque des enregistrements en attente."""
+        with self._lock:
+            self._sync_locked()
+
+    def needs_compaction(self, live_records: int) -> bool:
+        """Indique si le journal contient assez d'enregistrements obsolètes pour être compacté."""
+        return self.record_count > max(COMPACT_MIN_RECORDS, live_records * COMPACT_RATIO)
+
+    def compact(self, records: Iterable[Dict]) -> None:
+        """Remplace le journal par les enregistrements donnés (état courant), de façon atomique."""
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with self._lock:
+            count = 0
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+                    count += 1
+                f.flush()
+                os.fsync(f.fileno())
+            self._close_locked()
+            os.replace(tmp_path, self.path)
+            self._fsync_directory(directory)
+            self.record_count = count
+        self.log(f"[DEBUG] Journal {os.path.basename(self.path)} compacté ({count} enregistrements)")
+
+    def import_legacy(self, json_path: str, to_records: Callable[[object], List[Dict]]) -> bool:
+        """
+        Migration depuis un ancien fichier JSON réécrit en entier à chaque sauvegarde.
+        Si le journal n'existe pas encore, son contenu est converti en enregistrements,
+        puis le fichier JSON est renommé en .bak. Retourne True si une migration a eu lieu.
+        """
+        if self.exists() or not os.path.exists(json_path):
+            return False
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        records = to_records(data)
+        self.compact(records)
+        os.replace(json_path, json_path + '.bak')
+        self.log(f"[INFO] {os.path.basename(json_path)} migré vers {os.path.basename(self.path)} "
+                 f"({len(records)} enregistrements)")
+        return True
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_locked()
+
+    def _open(self):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            truncated = False
+            if self.exists() and os.path.getsize(self.path):
+                with open(self.path, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    truncated = f.read(1) != b'\n'
+            self._file = open(self.path, 'a', encoding='utf-8')
+            if truncated:
+                # Termine la ligne interrompue pour ne pas corrompre le prochain enregistrement
+                self._file.write('\n')
+        return self._file
+
+    def _sync_locked(self) -> None:
+        if self._sync_timer is not None:
+            self._sync_timer.cancel()
+            self._sync_timer = None
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def _close_locked(self) -> None:
+        self._sync_locked()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @staticmethod
+    def _fsync_directory(directory: str) -> None:
+        """Rend le renommage durable (sans effet sur les systèmes qui ne le permettent pas)."""
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)